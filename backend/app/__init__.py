@@ -1,27 +1,37 @@
-import logging
-
 from flask import Flask
 from flask_appbuilder import AppBuilder, SQLA
 from flask_cors import CORS
+from werkzeug.middleware.proxy_fix import ProxyFix
 
 # 匯入自訂的安全管理器
 from .auth import JWTSecurityManager
-
-"""
- Logging configuration
-"""
-
-logging.basicConfig(format="%(asctime)s:%(levelname)s:%(name)s:%(message)s")
-logging.getLogger().setLevel(logging.DEBUG)
+from .logging_config import configure_logging
+from .password_hashing import configure_password_hashing
 
 app = Flask(__name__)
 
 app.config.from_object("config")
 
+# 反向代理後方以 X-Forwarded-* 取得客戶端位址（見 config.py 的 TRUSTED_PROXIES）
+if app.config.get('TRUSTED_PROXIES'):
+    proxies = app.config['TRUSTED_PROXIES']
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=proxies, x_proto=proxies)
+
+"""
+ Logging configuration（等級、格式與取樣見 config.py 的 LOG_* 設定）
+"""
+configure_logging(app.config)
+
+# 密碼雜湊工作池（見 config.py 的 PASSWORD_HASH_* 設定）
+configure_password_hashing(app.config)
+
 db = SQLA(app)
 
 appbuilder = AppBuilder(app, db.session, security_manager_class=JWTSecurityManager)
 
+# 無狀態的 JWT API 請求不把預設語系寫入 session（JWT_STATELESS_API）
+appbuilder.bm.babel.locale_selector_func = appbuilder.sm.locale_selector(appbuilder.bm.get_locale)
+
 CORS(
     app,
     resources=r"/api/*",                          # 只針對 /api/ 路徑
@@ -53,3 +63,12 @@ from . import views, socketio_server
 # 🔄 初始化資料庫 Hook
 from .hooks import setup_database_hooks
 setup_database_hooks()
+
+# 🔑 預先載入角色權限索引
+if appbuilder.sm.permission_index is not None:
+    with app.app_context():
+        appbuilder.sm.permission_index.load()
+
+# 🚫 載入已撤銷的 token
+with app.app_context():
+    appbuilder.sm.load_revoked_tokens()
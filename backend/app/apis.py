@@ -1,4 +1,4 @@
-from flask_appbuilder.api import ModelRestApi
+from flask_appbuilder.api import ModelRestApi, BaseApi
 from flask_appbuilder.models.sqla.interface import SQLAInterface
 from flask import request, jsonify, g
 # from flask_appbuilder.security.decorators import has_access
@@ -7,10 +7,14 @@ from flask_appbuilder import expose
 import datetime
 from datetime import timezone
 from .time_utils import to_iso_utc
+from .logging_config import get_logger
+from .password_hashing import PasswordHashingBusy, password_busy_response
 
 
 from .models import ChatMessage, UserProfile, ChatChannel
 
+logger = get_logger(__name__)
+
 
 class ChatMessageApi(ModelRestApi):
     """
@@ -81,7 +85,7 @@ class ChatMessageApi(ModelRestApi):
     
     def _is_admin(self):
         """檢查當前用戶是否為管理員"""
-        return hasattr(g.user, 'roles') and any(role.name == 'Admin' for role in g.user.roles)
+        return self.appbuilder.sm.is_admin()
 
     @expose('/recent/<int:limit>')
     @jwt_required
@@ -96,8 +100,9 @@ class ChatMessageApi(ModelRestApi):
         # 從查詢參數獲取 channel_id，預設為 1
         channel_id = request.args.get('channel_id', 1, type=int)
 
+        # 發送者欄位在同一個查詢中取得，不逐筆載入 sender
         messages = (
-            self.datamodel.session.query(ChatMessage)
+            ChatMessage.query_dicts(self.datamodel.session)
             .filter(ChatMessage.is_deleted == False)
             .filter(ChatMessage.channel_id == channel_id)
             .order_by(ChatMessage.created_on.desc())
@@ -109,7 +114,7 @@ class ChatMessageApi(ModelRestApi):
         messages = list(reversed(messages))
 
         return jsonify({
-            'result': [msg.to_dict() for msg in messages],
+            'result': [ChatMessage.row_to_dict(msg) for msg in messages],
             'count': len(messages)
         })
 
@@ -147,6 +152,12 @@ class ChatMessageApi(ModelRestApi):
                 changed_on = datetime.now()
             )
 
+            # 啟用批次寫入時，訊息 id 必須與 Socket 寫入路徑共用同一個配號器
+            from .socketio_server import ensure_message_writer
+            writer = ensure_message_writer()
+            if writer:
+                message.id = writer.next_id()
+
             # 儲存到資料庫
             self.datamodel.add(message)
 
@@ -172,8 +183,9 @@ class ChatMessageApi(ModelRestApi):
         before_id = request.args.get('before_id', type=int)
         channel_id = request.args.get('channel_id', 1, type=int)
 
+        # 發送者欄位在同一個查詢中取得，不逐筆載入 sender
         q = (
-            self.datamodel.session.query(ChatMessage)
+            ChatMessage.query_dicts(self.datamodel.session)
             .filter(ChatMessage.is_deleted.is_(False))
             .filter(ChatMessage.channel_id == channel_id)
         )
@@ -195,7 +207,7 @@ class ChatMessageApi(ModelRestApi):
         next_before_id = rows[0].id if has_next and rows else None
 
         return jsonify({
-            'result': [r.to_dict() for r in rows],
+            'result': [ChatMessage.row_to_dict(r) for r in rows],
             'pagination': {
                 'per_page': per_page,
                 'has_next': has_next,
@@ -216,12 +228,17 @@ class ChatMessageApi(ModelRestApi):
             return jsonify({'error': '訊息不存在'}), 404
 
         # 權限檢查：只有發送者或管理員可以刪除
-        if message.sender_id != g.user.id and not g.user.is_admin():
+        if message.sender_id != g.user.id and not self._is_admin():
             return jsonify({'error': '沒有權限刪除此訊息'}), 403
 
         # 軟刪除
         message.is_deleted = True
-        self.datamodel.edit(message)
+        if not self.datamodel.edit(message):
+            return jsonify({'error': '刪除訊息失敗'}), 500
+
+        # 斷線續傳的緩衝區不再補送此訊息（與資料庫查詢的結果一致）
+        from .socketio_server import replay_buffer
+        replay_buffer.mark_deleted(message.channel_id, message_id)
 
         return jsonify({'message': '訊息已刪除'})
 
@@ -277,7 +294,7 @@ class UserProfileApi(ModelRestApi):
     
     def _is_admin(self):
         """檢查當前用戶是否為管理員"""
-        return hasattr(g.user, 'roles') and any(role.name == 'Admin' for role in g.user.roles)
+        return self.appbuilder.sm.is_admin()
 
     @expose('/me')
     @jwt_required
@@ -466,7 +483,7 @@ class ChatChannelApi(ModelRestApi):
     
     def _is_admin(self):
         """檢查當前用戶是否為管理員"""
-        return hasattr(g.user, 'roles') and any(role.name == 'Admin' for role in g.user.roles)
+        return self.appbuilder.sm.is_admin()
 
     @expose('/public-channels')
     @jwt_required
@@ -528,20 +545,21 @@ class ChatChannelApi(ModelRestApi):
         try:
             # 詳細的認證檢查
             if not hasattr(g, 'user') or not g.user:
-                print("認證失敗: g.user 不存在")
+                logger.info('認證失敗: g.user 不存在', sample='api.auth_failed', path=request.path)
                 return jsonify({'error': '未登入或認證失敗'}), 401
             
             # 檢查是否為匿名使用者
             if g.user.__class__.__name__ == 'AnonymousUserMixin':
-                print("認證失敗: 使用者為 AnonymousUserMixin")
+                logger.info('認證失敗: 使用者為 AnonymousUserMixin', sample='api.auth_failed', path=request.path)
                 return jsonify({'error': '未認證使用者'}), 401
             
             # 檢查使用者是否有 id 屬性
             if not hasattr(g.user, 'id'):
-                print(f"認證失敗: 使用者物件沒有 id 屬性, 類型: {type(g.user)}")
+                logger.info('認證失敗: 使用者物件沒有 id 屬性', sample='api.auth_failed', path=request.path,
+                            user_type=type(g.user).__name__)
                 return jsonify({'error': '使用者物件無效'}), 401
                 
-            print(f"認證成功: user_id={g.user.id}, username={getattr(g.user, 'username', 'N/A')}")
+            logger.debug('認證成功', sample='http.request', path=request.path, user_id=g.user.id)
             data = request.get_json()
 
             # 驗證必要欄位
@@ -559,11 +577,9 @@ class ChatChannelApi(ModelRestApi):
                 password_required=data.get('password_required', False)
             )
 
-            # 處理密碼設定
+            # 處理密碼設定（由 hash_password hook 雜湊）
             if data.get('password_required') and data.get('join_password'):
-                from flask_bcrypt import Bcrypt
-                bcrypt = Bcrypt()
-                channel.join_password = bcrypt.generate_password_hash(data.get('join_password')).decode('utf-8')
+                channel.join_password = data.get('join_password')
 
             # 使用直接的資料庫操作
             self.datamodel.session.add(channel)
@@ -590,13 +606,13 @@ class ChatChannelApi(ModelRestApi):
                 'data': channel.to_dict()
             }), 201
 
+        except PasswordHashingBusy as e:
+            self.datamodel.session.rollback()
+            return password_busy_response(e)
         except Exception as e:
             # 回滾資料庫變更
             self.datamodel.session.rollback()
-            # 印出詳細錯誤供調試
-            import traceback
-            print(f"建立頻道時發生錯誤: {str(e)}")
-            print(f"錯誤堆疊: {traceback.format_exc()}")
+            logger.exception('建立頻道時發生錯誤', user_id=getattr(g.user, 'id', None))
             return jsonify({'error': f'建立失敗: {str(e)}'}), 500
 
     @expose('/my-channels')
@@ -612,15 +628,16 @@ class ChatChannelApi(ModelRestApi):
         
         # 檢查是否為匿名使用者
         if g.user.__class__.__name__ == 'AnonymousUserMixin':
-            print("認證失敗: 使用者為 AnonymousUserMixin")
+            logger.info('認證失敗: 使用者為 AnonymousUserMixin', sample='api.auth_failed', path=request.path)
             return jsonify({'error': '未認證使用者'}), 401
         
         # 檢查使用者是否有 id 屬性
         if not hasattr(g.user, 'id'):
-            print(f"認證失敗: 使用者物件沒有 id 屬性, 類型: {type(g.user)}")
+            logger.info('認證失敗: 使用者物件沒有 id 屬性', sample='api.auth_failed', path=request.path,
+                        user_type=type(g.user).__name__)
             return jsonify({'error': '使用者物件無效'}), 401
             
-        print(f"取得我的頻道 - 認證成功: user_id={g.user.id}, username={getattr(g.user, 'username', 'N/A')}")
+        logger.debug('取得我的頻道 - 認證成功', sample='http.request', path=request.path, user_id=g.user.id)
             
         channels = (
             self.datamodel.session.query(ChatChannel)
@@ -680,7 +697,7 @@ class ChatChannelApi(ModelRestApi):
             if not hasattr(g.user, "id"):
                 return jsonify({"error": "使用者物件無效"}), 401
                 
-            print(f"刪除頻道請求 - 認證成功: user_id={g.user.id}, username={getattr(g.user, 'username', 'N/A')}")
+            logger.debug('刪除頻道請求 - 認證成功', sample='http.request', path=request.path, user_id=g.user.id)
             
             # 查詢頻道
             channel = self.datamodel.get(channel_id)
@@ -692,7 +709,7 @@ class ChatChannelApi(ModelRestApi):
                 return jsonify({"error": "頻道已被刪除"}), 400
             
             # 權限檢查：只有創建者或管理員可以刪除
-            is_admin = hasattr(g.user, "roles") and any(role.name == "Admin" for role in g.user.roles)
+            is_admin = self._is_admin()
             is_creator = channel.creator_id == g.user.id
             
             if not (is_creator or is_admin):
@@ -710,7 +727,7 @@ class ChatChannelApi(ModelRestApi):
             # 儲存變更
             self.datamodel.edit(channel)
             
-            print(f"頻道 {channel.name} (ID: {channel.id}) 已被用戶 {g.user.username} 軟刪除")
+            logger.info('頻道已軟刪除', channel_id=channel.id, channel_name=channel.name, user_id=g.user.id)
             
             return jsonify({
                 "message": f"頻道 \"{channel.name}\" 已成功刪除",
@@ -725,10 +742,7 @@ class ChatChannelApi(ModelRestApi):
         except Exception as e:
             # 回滾資料庫變更
             self.datamodel.session.rollback()
-            # 印出詳細錯誤供調試
-            import traceback
-            print(f"刪除頻道時發生錯誤: {str(e)}")
-            print(f"錯誤堆疊: {traceback.format_exc()}")
+            logger.exception('刪除頻道時發生錯誤', user_id=getattr(g.user, 'id', None))
             return jsonify({"error": f"刪除失敗: {str(e)}"}), 500
 
     @expose("/restore-channel/<int:channel_id>", methods=["POST"])
@@ -751,7 +765,7 @@ class ChatChannelApi(ModelRestApi):
             if not hasattr(g.user, "id"):
                 return jsonify({"error": "使用者物件無效"}), 401
                 
-            print(f"恢復頻道請求 - 認證成功: user_id={g.user.id}, username={getattr(g.user, 'username', 'N/A')}")
+            logger.debug('恢復頻道請求 - 認證成功', sample='http.request', path=request.path, user_id=g.user.id)
             
             # 查詢頻道 (包含已刪除的)
             channel = self.datamodel.session.query(ChatChannel).filter(ChatChannel.id == channel_id).first()
@@ -763,7 +777,7 @@ class ChatChannelApi(ModelRestApi):
                 return jsonify({"error": "頻道並未被刪除"}), 400
             
             # 權限檢查：只有創建者或管理員可以恢復
-            is_admin = hasattr(g.user, "roles") and any(role.name == "Admin" for role in g.user.roles)
+            is_admin = self._is_admin()
             is_creator = channel.creator_id == g.user.id
             
             if not (is_creator or is_admin):
@@ -777,7 +791,7 @@ class ChatChannelApi(ModelRestApi):
             # 儲存變更
             self.datamodel.edit(channel)
             
-            print(f"頻道 {channel.name} (ID: {channel.id}) 已被用戶 {g.user.username} 恢復")
+            logger.info('頻道已恢復', channel_id=channel.id, channel_name=channel.name, user_id=g.user.id)
             
             return jsonify({
                 "message": f"頻道 \"{channel.name}\" 已成功恢復",
@@ -792,10 +806,7 @@ class ChatChannelApi(ModelRestApi):
         except Exception as e:
             # 回滾資料庫變更
             self.datamodel.session.rollback()
-            # 印出詳細錯誤供調試
-            import traceback
-            print(f"恢復頻道時發生錯誤: {str(e)}")
-            print(f"錯誤堆疊: {traceback.format_exc()}")
+            logger.exception('恢復頻道時發生錯誤', user_id=getattr(g.user, 'id', None))
             return jsonify({"error": f"恢復失敗: {str(e)}"}), 500
 
     @expose("/deleted-channels")
@@ -818,10 +829,10 @@ class ChatChannelApi(ModelRestApi):
             if not hasattr(g.user, "id"):
                 return jsonify({"error": "使用者物件無效"}), 401
                 
-            print(f"查詢已刪除頻道 - 認證成功: user_id={g.user.id}, username={getattr(g.user, 'username', 'N/A')}")
+            logger.debug('查詢已刪除頻道 - 認證成功', sample='http.request', path=request.path, user_id=g.user.id)
             
             # 權限檢查：只有管理員或創建者可以查看已刪除的頻道
-            is_admin = hasattr(g.user, "roles") and any(role.name == "Admin" for role in g.user.roles)
+            is_admin = self._is_admin()
             
             if is_admin:
                 # 管理員可以查看所有已刪除的頻道
@@ -855,9 +866,30 @@ class ChatChannelApi(ModelRestApi):
             })
 
         except Exception as e:
-            # 印出詳細錯誤供調試
-            import traceback
-            print(f"查詢已刪除頻道時發生錯誤: {str(e)}")
-            print(f"錯誤堆疊: {traceback.format_exc()}")
+            logger.exception('查詢已刪除頻道時發生錯誤', user_id=getattr(g.user, 'id', None))
             return jsonify({"error": f"查詢失敗: {str(e)}"}), 500
 
+
+class SocketStatsApi(BaseApi):
+    """
+    Socket 伺服器統計（管理員）
+    """
+
+    resource_name = 'socket'
+
+    def _is_admin(self):
+        """檢查當前用戶是否為管理員"""
+        return self.appbuilder.sm.is_admin()
+
+    @expose('/stats')
+    @jwt_required
+    def get_stats(self):
+        """
+        取得本 worker 的連線數、房間數、各事件延遲直方圖（總耗時 / 資料庫 / 送出）與錯誤次數
+        GET /api/v1/socket/stats
+        """
+        if not self._is_admin():
+            return jsonify({'error': '權限不足'}), 403
+
+        from .socketio_server import socket_stats
+        return jsonify({'result': socket_stats()})
@@ -0,0 +1,97 @@
+"""
+Socket.IO 非同步模式與阻塞工作池
+eventlet / gevent 模式下所有 Socket 連線共用少數原生執行緒，
+阻塞的 SQLAlchemy 呼叫必須交給有上限的原生執行緒池執行，避免卡住整個事件迴圈
+"""
+
+import threading
+import time
+
+ASYNC_MODES = ('threading', 'eventlet', 'gevent')
+
+
+class BlockingExecutor:
+    """
+    執行阻塞工作（資料庫存取）的有上限執行緒池
+    - threading: 每個連線本來就有自己的執行緒，直接在目前執行緒執行
+    - eventlet:  交給 eventlet.tpool 的原生執行緒
+    - gevent:    交給 gevent ThreadPool 的原生執行緒
+    原生執行緒中會建立新的 app context，並在完成後釋放 scoped session（app 為 None 時不建立）
+
+    eventlet.tpool 是整個程序共用的，只有 resize_pool 為 True 的執行器（Socket 資料庫執行器）設定其執行緒數；
+    其他執行器（密碼雜湊）共用同一組執行緒，同時進行的工作數需由呼叫端自行限制
+    """
+
+    def __init__(self, app, db, async_mode='threading', max_workers=8, resize_pool=True):
+        self.app = app
+        self.db = db
+        self.async_mode = async_mode
+        self.max_workers = max_workers
+        self.resize_pool = resize_pool
+        self._pool = None
+        self._lock = threading.Lock()
+        if async_mode == 'eventlet' and resize_pool:
+            # tpool 在第一次 execute 時才建立執行緒，需在任何執行器使用前設定執行緒數
+            from eventlet import tpool
+            tpool.set_num_threads(max_workers)
+        self.calls = 0
+        self.seconds = 0.0
+        # 每次呼叫完成後以耗時（秒）呼叫，用於把資料庫耗時歸屬到目前的 Socket 事件
+        self.observer = None
+
+    @property
+    def offloading(self):
+        """是否會把工作交給其他原生執行緒"""
+        return self.async_mode in ('eventlet', 'gevent')
+
+    def _get_pool(self):
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    if self.async_mode == 'eventlet':
+                        from eventlet import tpool
+                        self._pool = tpool
+                    else:
+                        from gevent.threadpool import ThreadPool
+                        self._pool = ThreadPool(self.max_workers)
+        return self._pool
+
+    def _call_in_context(self, fn, args, kwargs):
+        if self.app is None:
+            # 不需要資料庫的工作（例如密碼雜湊）
+            return fn(*args, **kwargs)
+        with self.app.app_context():
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.db.session.remove()
+
+    def run(self, fn, *args, **kwargs):
+        """
+        執行阻塞函式並回傳結果（例外會原樣拋出）
+        交給其他執行緒時 fn 看不到呼叫端的 g，需要的資料請以參數傳入
+        """
+        self.calls += 1
+        start = time.perf_counter()
+        try:
+            if not self.offloading:
+                return fn(*args, **kwargs)
+            pool = self._get_pool()
+            if self.async_mode == 'eventlet':
+                return pool.execute(self._call_in_context, fn, args, kwargs)
+            return pool.apply(self._call_in_context, (fn, args, kwargs))
+        finally:
+            elapsed = time.perf_counter() - start
+            self.seconds += elapsed
+            if self.observer:
+                self.observer(elapsed)
+
+    def stats(self):
+        return {
+            'async_mode': self.async_mode,
+            'max_workers': self.max_workers,
+            'shared_pool': self.async_mode == 'eventlet' and not self.resize_pool,
+            'offloading': self.offloading,
+            'calls': self.calls,
+            'avg_ms': round(self.seconds / self.calls * 1000, 3) if self.calls else 0
+        }
@@ -4,12 +4,22 @@ JWT Bearer Token Authentication for Flask-AppBuilder
 """
 
 import jwt
-from flask import request, g, current_app
+from flask import request, g, current_app, session
 from flask_appbuilder.security.sqla.manager import SecurityManager
 from flask_login import current_user
 from functools import wraps
 import datetime
+import time
+import uuid
 from datetime import timezone
+from sqlalchemy.exc import IntegrityError
+
+from .logging_config import get_logger
+from .token_cache import VerifiedTokenCache, UserSnapshot
+from .permission_index import PermissionIndex
+from .token_revocation import RevocationList
+
+logger = get_logger(__name__)
 
 class JWTSecurityManager(SecurityManager):
     """
@@ -17,28 +27,35 @@ class JWTSecurityManager(SecurityManager):
     """
     
     def __init__(self, appbuilder):
-        print("🔧 初始化 JWTSecurityManager")
+        logger.debug('初始化 JWTSecurityManager')
         super(JWTSecurityManager, self).__init__(appbuilder)
+        # 已驗證 token 的快取（JWT_TOKEN_CACHE_SIZE 為 0 時停用）
+        config = self.appbuilder.app.config
+        self.token_cache = VerifiedTokenCache(
+            maxsize=config.get('JWT_TOKEN_CACHE_SIZE', 10000),
+            ttl=config.get('JWT_TOKEN_CACHE_TTL', 60)
+        )
+        # 已撤銷的 token（以 jti 記錄），啟動時由 load_revoked_tokens() 載入
+        self.revoked_tokens = RevocationList(self._load_revoked_tokens)
+        # 角色權限索引（PERMISSION_INDEX 為 False 時沿用 Flask-AppBuilder 的逐次查詢）
+        self.permission_index = None
+        if config.get('PERMISSION_INDEX', True):
+            self.permission_index = PermissionIndex(self._load_role_permissions, admin_role=self.auth_role_admin)
+        # 無狀態 API：這些路徑的 JWT 請求不寫入 Flask-Login session
+        self.stateless_api = config.get('JWT_STATELESS_API', True)
+        self.stateless_paths = tuple(config.get('JWT_STATELESS_PATHS', ('/api/',)))
         # 註冊 JWT 認證的 before_request
         self.appbuilder.app.before_request(self.jwt_auth_handler)
-        print("🔧 JWTSecurityManager 初始化完成")
+        logger.debug('JWTSecurityManager 初始化完成')
     
     def has_access(self, permission_name, view_name):
         """
         重寫 has_access 方法，加入 JWT token 認證並正確檢查權限
         """
-        print(f"has_access 被調用: {permission_name} on {view_name}")
+        logger.debug('has_access 被調用', sample='auth.has_access', permission=permission_name, view=view_name)
         
-        # 先嘗試 JWT 認證
-        current_user = None
-        if self.jwt_authenticate_user():
-            current_user = g.user
-            print(f"has_access: JWT 認證成功 user_id={current_user.id}")
-        elif (hasattr(g, 'user') and g.user and 
-              g.user.__class__.__name__ != 'AnonymousUserMixin' and 
-              hasattr(g.user, 'id')):
-            current_user = g.user
-            print(f"has_access: 使用已存在的認證用戶 {g.user.id}")
+        # 沿用本次請求已完成的認證結果（jwt_auth_handler 已驗證過 token 時不再重新解碼）
+        current_user = self.request_user()
         
         # 如果沒有認證用戶，對於 API 端點返回 False，對於其他端點使用預設行為
         if not current_user:
@@ -46,10 +63,10 @@ class JWTSecurityManager(SecurityManager):
                 'ChatMessageApi', 'UserProfileApi', 'ChatChannelApi', 'JWTAuthApi', 'RegisterApi', 'ChannelMemberApi'
             ]
             if view_name in api_view_names:
-                print(f"has_access: API 端點未認證 {view_name}.{permission_name}: False")
+                logger.debug('has_access: API 端點未認證', sample='auth.has_access', permission=permission_name, view=view_name)
                 return False
             else:
-                print(f"has_access: 非 API 端點未認證，使用原有機制")
+                logger.debug('has_access: 非 API 端點未認證，使用原有機制', sample='auth.has_access', view=view_name)
                 return super(JWTSecurityManager, self).has_access(permission_name, view_name)
         
         # 🔒 區分管理界面權限和 API 端點權限
@@ -65,90 +82,262 @@ class JWTSecurityManager(SecurityManager):
         
         # 管理界面的權限檢查
         if view_name in admin_view_names:
-            is_admin = (hasattr(current_user, 'roles') and 
-                       any(role.name == 'Admin' for role in current_user.roles))
-            print(f"has_access: 管理界面權限檢查 {view_name}.{permission_name} for user {current_user.id}: {is_admin}")
+            is_admin = self.is_admin(current_user)
+            logger.debug('has_access: 管理界面權限檢查', sample='auth.has_access', permission=permission_name,
+                         view=view_name, user_id=current_user.id, allowed=is_admin)
             return is_admin
         
         # API 端點權限檢查 - 讓 Flask-AppBuilder 處理具體權限檢查
         if view_name in api_view_names:
-            print(f"has_access: API 端點權限 {view_name}.{permission_name} for user {current_user.id}: 委託給 Flask-AppBuilder")
-            # 先設定當前用戶，然後讓 Flask-AppBuilder 處理權限檢查（包括 pre_update 等）
-            from flask_login import login_user
-            login_user(current_user, remember=False)
+            logger.debug('has_access: API 端點權限委託給 Flask-AppBuilder', sample='auth.has_access',
+                         permission=permission_name, view=view_name, user_id=current_user.id)
+            # 認證時已設定 Flask-Login 的 current_user，直接讓 Flask-AppBuilder 處理權限檢查（包括 pre_update 等）
             return super(JWTSecurityManager, self).has_access(permission_name, view_name)
         
         # 對於其他權限，使用預設行為
-        print(f"has_access: 未定義權限類型 {view_name}.{permission_name} for user {current_user.id}: 使用預設")
+        logger.debug('has_access: 未定義權限類型，使用預設', sample='auth.has_access',
+                     permission=permission_name, view=view_name, user_id=current_user.id)
         return super(JWTSecurityManager, self).has_access(permission_name, view_name)
     
+    def _load_role_permissions(self):
+        """載入所有角色的 (權限, 視圖)，供權限索引使用"""
+        return (
+            self.get_session.query(
+                self.role_model.id, self.role_model.name,
+                self.permission_model.name, self.viewmenu_model.name
+            )
+            .outerjoin(self.role_model.permissions)
+            .outerjoin(self.permissionview_model.permission)
+            .outerjoin(self.permissionview_model.view_menu)
+            .all()
+        )
+    
+    def exist_permission_on_roles(self, view_name, permission_name, role_ids):
+        """Flask-AppBuilder 的 has_access 檢查資料庫角色時呼叫，改由權限索引判斷"""
+        if self.permission_index is None:
+            return super().exist_permission_on_roles(view_name, permission_name, role_ids)
+        return self.permission_index.has(role_ids, permission_name, view_name)
+    
+    def _get_user_permission_view_menus(self, user, permission_name, view_menus_name):
+        """頁面選單的權限（menu_access），資料庫角色的部分由權限索引判斷"""
+        if self.permission_index is None:
+            return super()._get_user_permission_view_menus(user, permission_name, view_menus_name)
+        roles = [self.get_public_role()] if user is None else self.get_user_roles(user)
+        roles = [role for role in roles if role is not None]
+        result = {
+            view_menu_name
+            for role in roles
+            if role.name in self.builtin_roles
+            for view_menu_name in view_menus_name
+            if self._has_access_builtin_roles(role, permission_name, view_menu_name)
+        }
+        db_role_ids = [role.id for role in roles if role.name not in self.builtin_roles]
+        if db_role_ids:
+            result.update(self.permission_index.view_menus(db_role_ids, permission_name))
+        return result
+    
+    def is_admin(self, user=None):
+        """
+        使用者是否為管理員（預設為本次請求的使用者）
+        """
+        user = self.request_user() if user is None else user
+        if not user or not hasattr(user, 'roles'):
+            return False
+        if self.permission_index is None:
+            return any(role.name == self.auth_role_admin for role in user.roles)
+        return self.permission_index.is_admin(role.id for role in user.roles)
+    
     def check_authorization(self, perms=None, dag_id=None):
         """Override check_authorization if it exists"""
-        print(f"🔍 check_authorization 被調用: perms={perms}, dag_id={dag_id}")
+        logger.debug('check_authorization 被調用', perms=perms, dag_id=dag_id)
         return super().check_authorization(perms, dag_id) if hasattr(super(), 'check_authorization') else True
     
-    def jwt_authenticate_user(self):
+    def authenticate_token(self, token):
         """
-        JWT 使用者認證，如果成功設定 g.user 並返回 True
+        驗證 Bearer token，優先使用已驗證 token 的快取
+        HTTP 請求與 Socket 連線共用這個驗證流程
+        @return: (UserSnapshot 或 None, 是否命中快取)
         """
-        # 檢查 Authorization header
-        auth_header = request.headers.get('Authorization')
-        print(f"JWT 認證嘗試: {auth_header[:50] if auth_header else 'No header'}...")
+        cached = self.token_cache.get(token)
+        if cached is not None:
+            claims, user = cached
+            if not self.revoked_tokens.is_revoked(claims.get('jti')):
+                return user, True
+            # 快取之後才被撤銷（例如在其他 worker 登出）
+            self.token_cache.invalidate_token(token)
+            logger.info('JWT Token 已撤銷', sample='auth.rejected', user_id=user.id)
+            return None, True
         
-        if auth_header and auth_header.startswith('Bearer '):
-            token = auth_header.split(' ')[1]
+        try:
+            # 解碼 JWT token（refresh token 與已撤銷的 token 回傳 None）
+            payload = self.decode_token(token)
+            if payload is None:
+                return None, False
             
-            try:
-                # 解碼 JWT token
-                payload = jwt.decode(
-                    token, 
-                    current_app.config['SECRET_KEY'], 
-                    algorithms=['HS256']
-                )
-                
-                # 檢查 token 是否過期
-                if 'exp' in payload:
-                    exp_timestamp = payload['exp']
-                    if datetime.datetime.now(timezone.utc).timestamp() > exp_timestamp:
-                        print("JWT Token 已過期")
-                        return False
+            # 檢查 token 是否過期
+            if 'exp' in payload:
+                exp_timestamp = payload['exp']
+                if datetime.datetime.now(timezone.utc).timestamp() > exp_timestamp:
+                    logger.info('JWT Token 已過期', sample='auth.rejected')
+                    return None, False
+            
+            # 根據 token 中的 user_id 找到使用者
+            user_id = payload.get('user_id') or payload.get('sub')
+            if not user_id:
+                logger.info('JWT payload 中沒有 user_id', sample='auth.rejected')
+                return None, False
+            
+            user = self.get_user_by_id(user_id)
+            if not user or not user.is_active:
+                logger.info('使用者不存在或未啟用', sample='auth.rejected', user_id=user_id)
+                return None, False
+            
+            # 保存精簡快照，之後同一個 token 的請求不再查詢 User 與角色
+            snapshot = UserSnapshot.from_user(user)
+            self.token_cache.put(token, payload, snapshot)
+            logger.debug('JWT 認證成功', sample='auth.jwt', user_id=user.id, username=user.username)
+            return snapshot, False
                 
-                # 根據 token 中的 user_id 找到使用者
-                user_id = payload.get('user_id')
-                if user_id:
-                    user = self.get_user_by_id(user_id)
-                    if user and user.is_active:
-                        g.user = user
-                        # 同時設定 Flask-Login 的 current_user
-                        from flask_login import login_user
-                        login_user(user, remember=False)
-                        print(f"JWT 認證成功: user_id={user.id}, username={user.username}, 已設置 current_user")
-                        return True
-                    else:
-                        print(f"使用者不存在或未啟用: user_id={user_id}")
-                        return False
+        except jwt.ExpiredSignatureError:
+            logger.info('JWT Token 已過期', sample='auth.rejected')
+        except jwt.InvalidTokenError as e:
+            logger.info('JWT Token 無效', sample='auth.rejected', error=str(e))
+        except Exception as e:
+            logger.warning('JWT 認證錯誤', sample='auth.error', error=str(e))
+        return None, False
+    
+    def decode_token(self, token, token_type='access'):
+        """
+        解碼並驗證 token 的簽章、期限、種類與撤銷狀態
+        沒有 type 的舊版 token 視為 access token
+        @return: claims，種類不符或已撤銷時回傳 None；簽章錯誤或過期時拋出 jwt.InvalidTokenError
+        """
+        payload = jwt.decode(token, current_app.config['SECRET_KEY'], algorithms=['HS256'])
+        if payload.get('type', 'access') != token_type:
+            logger.info('JWT Token 種類不符', sample='auth.rejected', expected=token_type, type=payload.get('type'))
+            return None
+        if self.revoked_tokens.is_revoked(payload.get('jti')):
+            logger.info('JWT Token 已撤銷', sample='auth.rejected', user_id=payload.get('user_id'))
+            return None
+        return payload
+    
+    def revoke_token(self, claims):
+        """
+        撤銷 token：以 jti 寫入 revoked_tokens，commit 後由資料庫 Hook 加入各 worker 的撤銷清單
+        沒有 jti 的舊版 token 無法撤銷，只能等到期
+        @return: 是否撤銷成功（已撤銷過的 token 回傳 False）
+        """
+        from .models import RevokedToken
+        jti = claims.get('jti')
+        if not jti or not claims.get('exp'):
+            return False
+        session = self.get_session
+        session.add(RevokedToken(
+            jti=jti,
+            token_type=claims.get('type', 'access'),
+            user_id=claims.get('user_id'),
+            expires_at=datetime.datetime.fromtimestamp(claims['exp'], timezone.utc).replace(tzinfo=None)
+        ))
+        try:
+            session.commit()
+        except IntegrityError:
+            # 同一個 token 已被撤銷（例如同一個 refresh token 同時更新兩次）
+            session.rollback()
+            return False
+        logger.info('JWT Token 已撤銷', sample='auth.revoke', user_id=claims.get('user_id'), type=claims.get('type'))
+        return True
+    
+    def _load_revoked_tokens(self):
+        """載入尚未到期的撤銷紀錄，供撤銷清單使用"""
+        from .models import RevokedToken
+        now = datetime.datetime.now(timezone.utc).replace(tzinfo=None)
+        rows = (
+            self.get_session.query(RevokedToken.jti, RevokedToken.expires_at)
+            .filter(RevokedToken.expires_at > now)
+            .all()
+        )
+        return [(jti, expires_at.replace(tzinfo=timezone.utc).timestamp()) for jti, expires_at in rows]
+    
+    def load_revoked_tokens(self):
+        """啟動時刪除已到期的撤銷紀錄，並載入其餘的 jti"""
+        from .models import RevokedToken
+        now = datetime.datetime.now(timezone.utc).replace(tzinfo=None)
+        session = self.get_session
+        expired = session.query(RevokedToken).filter(RevokedToken.expires_at <= now).delete(synchronize_session=False)
+        session.commit()
+        loaded = self.revoked_tokens.load()
+        logger.info('已載入撤銷的 token', revoked=loaded, expired=expired)
+        return loaded
+    
+    def is_stateless_request(self):
+        """本次請求是否以無狀態模式處理 JWT（不寫入 session，回應不附帶 Set-Cookie）"""
+        return self.stateless_api and request.path.startswith(self.stateless_paths)
+    
+    def locale_selector(self, fab_get_locale):
+        """
+        包裝 Flask-AppBuilder 的語系選擇：session 沒有 locale 時它會寫入預設語系，
+        無狀態的 JWT 請求改為直接回傳預設語系，不寫入 session
+        """
+        def select_locale():
+            if g.get('stateless_auth') and 'locale' not in session and '_l_' not in request.args:
+                return self.appbuilder.bm.babel_default_locale
+            return fab_get_locale()
+        return select_locale
+    
+    def _login_bearer_token(self, auth_header):
+        """驗證 Authorization header 的 Bearer token，成功時設定 g.user 與 Flask-Login 的 current_user"""
+        start = time.perf_counter()
+        user, hit = self.authenticate_token(auth_header.split(' ')[1])
+        g.user = user
+        if user:
+            if self.is_stateless_request():
+                # 只設定本次請求的 current_user；login_user 會寫入 session 並讓回應重新發出 session cookie
+                current_app.login_manager._update_request_context_with_user(user)
+                g.stateless_auth = True
+            else:
+                # 管理頁面沿用 session 登入
+                from flask_login import login_user
+                login_user(user, remember=False)
+        self.token_cache.record(time.perf_counter() - start, hit)
+        return user
+    
+    def request_user(self):
+        """
+        取得本次請求的已認證使用者（Bearer token 或 session），沒有時回傳 None
+        每個請求只驗證一次，結果保存在 g 上，jwt_auth_handler、has_access 與 jwt_required 共用
+        """
+        if not g.get('auth_resolved'):
+            g.auth_resolved = True
+            auth_header = request.headers.get('Authorization')
+            logger.debug('檢查 Authorization header', sample='auth.jwt', has_header=bool(auth_header))
+            
+            if auth_header and auth_header.startswith('Bearer '):
+                self._login_bearer_token(auth_header)
+            else:
+                # 沒有 Authorization header，檢查是否有 session 認證
+                if hasattr(current_user, 'is_authenticated') and current_user.is_authenticated:
+                    g.user = current_user
                 else:
-                    print("JWT payload 中沒有 user_id")
-                    return False
-                    
-            except jwt.ExpiredSignatureError:
-                print("JWT Token 已過期")
-                return False
-            except jwt.InvalidTokenError as e:
-                print(f"JWT Token 無效: {str(e)}")
-                return False
-            except Exception as e:
-                print(f"JWT 認證錯誤: {str(e)}")
-                return False
+                    g.user = None
         
-        return False
+        user = g.get('user')
+        if not user or user.__class__.__name__ == 'AnonymousUserMixin' or not hasattr(user, 'id'):
+            return None
+        return user
+    
+    def jwt_authenticate_user(self):
+        """
+        JWT 使用者認證，如果成功設定 g.user 並返回 True
+        """
+        auth_header = request.headers.get('Authorization', '')
+        return auth_header.startswith('Bearer ') and self.request_user() is not None
     
     def jwt_auth_handler(self):
         """
         在每個請求前檢查 JWT token
         如果有效，設定 g.user
         """
-        print(f"JWT 中間件被調用: {request.method} {request.path}")
+        logger.debug('JWT 中間件被調用', sample='http.request', method=request.method, path=request.path)
         
         # 跳過靜態文件和 /api/v1/security/login 等認證端點
         if (request.endpoint and 
@@ -157,64 +346,10 @@ class JWTSecurityManager(SecurityManager):
              request.path == '/api/v1/security/login' or
              request.path == '/api/v1/auth/login' or
              request.path.startswith('/api/v1/register/'))):
-            print(f"跳過認證端點: {request.path}")
+            logger.debug('跳過認證端點', sample='http.request', path=request.path)
             return
         
-        # 檢查 Authorization header
-        auth_header = request.headers.get('Authorization')
-        print(f"Authorization header: {auth_header[:50] if auth_header else 'None'}...")
-        
-        if auth_header and auth_header.startswith('Bearer '):
-            token = auth_header.split(' ')[1]
-            
-            try:
-                # 解碼 JWT token
-                payload = jwt.decode(
-                    token, 
-                    current_app.config['SECRET_KEY'], 
-                    algorithms=['HS256']
-                )
-                
-                # 檢查 token 是否過期
-                if 'exp' in payload:
-                    exp_timestamp = payload['exp']
-                    if datetime.datetime.now(timezone.utc).timestamp() > exp_timestamp:
-                        g.user = None
-                        return
-                
-                # 根據 token 中的 user_id 找到使用者
-                user_id = payload.get('user_id')
-                if user_id:
-                    # 使用正確的參數名稱查詢使用者
-                    user = self.get_user_by_id(user_id)
-                    if user and user.is_active:
-                        g.user = user
-                        # 設定 Flask-Login 的 current_user
-                        from flask_login import login_user
-                        login_user(user, remember=False)
-                        print(f"JWT 認證成功: user_id={user.id}, username={user.username}, 已設置 current_user")
-                    else:
-                        print(f"使用者不存在或未啟用: user_id={user_id}")
-                        g.user = None
-                else:
-                    print("JWT payload 中沒有 user_id")
-                    g.user = None
-                    
-            except jwt.ExpiredSignatureError:
-                print("JWT Token 已過期")
-                g.user = None
-            except jwt.InvalidTokenError as e:
-                print(f"JWT Token 無效: {str(e)}")
-                g.user = None
-            except Exception as e:
-                print(f"JWT 認證錯誤: {str(e)}")
-                g.user = None
-        else:
-            # 沒有 Authorization header，檢查是否有 session 認證
-            if hasattr(current_user, 'is_authenticated') and current_user.is_authenticated:
-                g.user = current_user
-            else:
-                g.user = None
+        self.request_user()
 
 def jwt_required(f):
     """
@@ -222,7 +357,8 @@ def jwt_required(f):
     """
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        if not hasattr(g, 'user') or not g.user:
+        # 使用本次請求已完成的認證結果（尚未認證時才驗證 token）
+        if not current_app.appbuilder.sm.request_user():
             from flask import jsonify
             return jsonify({'error': '需要認證'}), 401
         return f(*args, **kwargs)
@@ -230,19 +366,36 @@ def jwt_required(f):
 
 def create_jwt_token(user, app):
     """
-    為使用者創建 JWT token
+    為使用者創建 access token（JWT_ACCESS_TOKEN_EXPIRES 秒後過期）
     """
+    now = datetime.datetime.now(timezone.utc)
     payload = {
         'user_id': user.id,
         'username': user.username,
         'email': user.email,
-        'iat': datetime.datetime.now(timezone.utc),
-        'exp': datetime.datetime.now(timezone.utc) + datetime.timedelta(days=7)  # 7 天過期
+        'type': 'access',
+        'jti': uuid.uuid4().hex,
+        'iat': now,
+        'exp': now + datetime.timedelta(seconds=app.config.get('JWT_ACCESS_TOKEN_EXPIRES', 15 * 60))
     }
     
     token = jwt.encode(payload, app.config['SECRET_KEY'], algorithm='HS256')
     return token
 
+def create_refresh_token(user, app):
+    """
+    為使用者創建 refresh token（JWT_REFRESH_TOKEN_EXPIRES 秒後過期），只能用來換發新的 token
+    """
+    now = datetime.datetime.now(timezone.utc)
+    payload = {
+        'user_id': user.id,
+        'type': 'refresh',
+        'jti': uuid.uuid4().hex,
+        'iat': now,
+        'exp': now + datetime.timedelta(seconds=app.config.get('JWT_REFRESH_TOKEN_EXPIRES', 7 * 24 * 60 * 60))
+    }
+    return jwt.encode(payload, app.config['SECRET_KEY'], algorithm='HS256')
+
 def verify_jwt_token(token, app):
     """
     驗證 JWT token
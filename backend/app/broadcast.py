@@ -0,0 +1,163 @@
+"""
+預先編碼的房間廣播 (encode-once broadcast)
+每次廣播只把事件編碼成 Socket.IO / Engine.IO 封包一次，房間內所有連線共用同一組封包物件；
+多 worker 時把編碼好的封包本身經由訊息佇列轉送，其他 worker 直接送出，不再解碼 payload 重新編碼。
+同時記錄編碼、寫入（放入各連線發送佇列）與發佈到佇列的耗時，讓扇出成本可以觀察
+"""
+
+import base64
+import threading
+import time
+
+from engineio import packet as eio_packet
+from socketio import packet as sio_packet
+
+
+class FramePacket(eio_packet.Packet):
+    """
+    所有收件者共用的 Engine.IO 封包
+    原本的 Packet.encode() 只有一份快取，二進位封包先被 websocket 取用後，polling 連線會拿到未經 base64 的資料；
+    這裡分別保存兩種編碼結果
+    """
+
+    def __init__(self, data):
+        super().__init__(eio_packet.MESSAGE, data)
+        self._b64 = None
+
+    def encode(self, b64=False):
+        if not self.binary:
+            return super().encode()
+        if not b64:
+            return self.data
+        if self._b64 is None:
+            self._b64 = 'b' + base64.b64encode(self.data).decode('utf-8')
+        return self._b64
+
+
+class EncodedFrame:
+    """
+    一次廣播的預先編碼結果：事件封包，二進位 payload 時另有附件封包
+    @param parts: 已編碼的 Socket.IO 封包（str 或 bytes）
+    """
+
+    def __init__(self, event, parts):
+        self.event = event
+        self.parts = parts
+        self.packets = [FramePacket(part) for part in parts]
+
+    @classmethod
+    def encode(cls, event, payload, namespace='/', packet_class=sio_packet.Packet):
+        encoded = packet_class(sio_packet.EVENT, namespace=namespace, data=[event, payload]).encode()
+        return cls(event, encoded if isinstance(encoded, list) else [encoded])
+
+    def to_message(self):
+        """轉為可經由訊息佇列傳送的 JSON 資料（二進位附件以 base64 表示）"""
+        return [
+            part if isinstance(part, str) else {'b64': base64.b64encode(part).decode('ascii')}
+            for part in self.parts
+        ]
+
+    @classmethod
+    def from_message(cls, event, parts):
+        return cls(event, [
+            part if isinstance(part, str) else base64.b64decode(part['b64'])
+            for part in parts
+        ])
+
+
+class BroadcastStats:
+    """廣播統計：編碼與寫入耗時分開累計，扇出成本應隨收件者數增加的是寫入而不是編碼"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.broadcasts = 0
+        self.relayed = 0
+        self.recipients = 0
+        self.encode_seconds = 0.0
+        self.write_seconds = 0.0
+        self.publish_seconds = 0.0
+        self.events = {}
+
+    def record(self, event, recipients, encode=0.0, write=0.0, publish=0.0, relayed=False):
+        with self._lock:
+            if relayed:
+                self.relayed += 1
+            else:
+                self.broadcasts += 1
+                self.events[event] = self.events.get(event, 0) + 1
+            self.recipients += recipients
+            self.encode_seconds += encode
+            self.write_seconds += write
+            self.publish_seconds += publish
+
+    def snapshot(self):
+        with self._lock:
+            deliveries = self.broadcasts + self.relayed
+            return {
+                'broadcasts': self.broadcasts,
+                'relayed': self.relayed,
+                'recipients': self.recipients,
+                'avg_recipients': round(self.recipients / deliveries, 1) if deliveries else 0,
+                'encode_us': round(self.encode_seconds / self.broadcasts * 1e6, 1) if self.broadcasts else 0,
+                'write_us': round(self.write_seconds / deliveries * 1e6, 1) if deliveries else 0,
+                'publish_us': round(self.publish_seconds / self.broadcasts * 1e6, 1) if self.broadcasts else 0,
+                'encode_seconds': round(self.encode_seconds, 3),
+                'write_seconds': round(self.write_seconds, 3),
+                'events': dict(self.events)
+            }
+
+
+class FrameBroadcaster:
+    """
+    以 EncodedFrame 廣播事件到房間
+    @param server: socketio.Server（Flask-SocketIO 的 socketio.server）
+    @param stats: BroadcastStats
+    訊息佇列管理器支援 publish_frame 時，其他 worker 收到的 frame 交給 handle_relay() 送出
+    """
+
+    def __init__(self, server, stats=None):
+        self.server = server
+        self.stats = stats or BroadcastStats()
+        manager = server.manager
+        self._publish = getattr(manager, 'publish_frame', None)
+        if self._publish:
+            manager.frame_handler = self.handle_relay
+
+    def broadcast(self, event, payload, room, skip_sid=None, namespace='/', ignore_queue=False, encoder=None):
+        """
+        @param encoder: 額外的 payload 編碼（例如 wire_format.encode），計入編碼耗時
+        @return: 本機收件者數
+        """
+        start = time.perf_counter()
+        if encoder:
+            payload = encoder(payload)
+        frame = EncodedFrame.encode(event, payload, namespace, self.server.packet_class)
+        encoded = time.perf_counter()
+        recipients = self.deliver(frame, room, skip_sid, namespace)
+        written = time.perf_counter()
+        if self._publish and not ignore_queue:
+            self._publish(event=event, parts=frame.to_message(), room=room,
+                          skip_sid=skip_sid, namespace=namespace)
+        self.stats.record(event, recipients, encode=encoded - start, write=written - encoded,
+                          publish=time.perf_counter() - written)
+        return recipients
+
+    def deliver(self, frame, room, skip_sid=None, namespace='/'):
+        """把同一組封包放入房間內每個本機連線的發送佇列，回傳收件者數"""
+        skip = set(skip_sid) if isinstance(skip_sid, (list, tuple, set)) else {skip_sid}
+        send = self.server._send_eio_packet
+        count = 0
+        for sid, eio_sid in self.server.manager.get_participants(namespace, room):
+            if sid in skip:
+                continue
+            for pkt in frame.packets:
+                send(eio_sid, pkt)
+            count += 1
+        return count
+
+    def handle_relay(self, message):
+        """其他 worker 發佈的 frame（於 pub/sub 監聽任務中執行）"""
+        start = time.perf_counter()
+        frame = EncodedFrame.from_message(message.get('event'), message.get('parts') or [])
+        recipients = self.deliver(frame, message.get('room'), message.get('skip_sid'), message.get('namespace') or '/')
+        self.stats.record(frame.event, recipients, write=time.perf_counter() - start, relayed=True)
@@ -7,13 +7,14 @@ from flask_appbuilder.api import ModelRestApi
 from flask_appbuilder.models.sqla.interface import SQLAInterface
 from flask_appbuilder import expose
 from datetime import datetime, timezone
-from flask_bcrypt import Bcrypt
 
 from .auth import jwt_required
 from .models import ChannelMember, ChatChannel
 from . import db
+from .logging_config import get_logger
+from .password_hashing import password_hasher, PasswordHashingBusy, password_busy_response
 
-bcrypt = Bcrypt()
+logger = get_logger(__name__)
 
 
 class ChannelMemberApi(ModelRestApi):
@@ -104,7 +105,8 @@ class ChannelMemberApi(ModelRestApi):
             channel_id = data.get('channel_id')
             password = data.get('password', '')
             # 調試：記錄輸入（不輸出密碼）
-            print(f"[join-by-id] user_id={getattr(g.user, 'id', None)} channel_id={channel_id} pw_provided={'yes' if password else 'no'}")
+            logger.debug('[join-by-id]', sample='http.request', user_id=getattr(g.user, 'id', None),
+                         channel_id=channel_id, pw_provided=bool(password))
             
             if not channel_id:
                 return jsonify({'error': '頻道ID不能為空'}), 400
@@ -127,17 +129,23 @@ class ChannelMemberApi(ModelRestApi):
             # 檢查密碼
             if channel.password_required:
                 if not password:
-                    print("[join-by-id] 密碼檢查失敗：缺少密碼（password_required=True）")
+                    logger.info('[join-by-id] 密碼檢查失敗：缺少密碼', sample='api.join_failed', channel_id=channel_id)
                     return jsonify({'error': '此頻道需要密碼'}), 403
                 try:
-                    ok = bcrypt.check_password_hash(channel.join_password, password)
+                    ok = password_hasher.verify_channel_password(channel.join_password, password)
+                except PasswordHashingBusy:
+                    raise
                 except Exception as e:
                     # 若資料不一致（例如未正確設定雜湊），視為驗證失敗
-                    print(f"[join-by-id] 密碼檢查異常：{e}")
+                    logger.warning('[join-by-id] 密碼檢查異常', channel_id=channel_id, error=str(e))
                     ok = False
                 if not ok:
-                    print("[join-by-id] 密碼檢查失敗：密碼不正確")
+                    logger.info('[join-by-id] 密碼檢查失敗：密碼不正確', sample='api.join_failed', channel_id=channel_id)
                     return jsonify({'error': '密碼錯誤'}), 403
+                # 雜湊成本已變更（CHANNEL_PASSWORD_BCRYPT_ROUNDS）時，以新參數重新雜湊，隨加入一起 commit
+                new_hash = password_hasher.rehash_channel_password(channel.join_password, password)
+                if new_hash:
+                    channel.join_password = new_hash
 
             # 🛡️ 防重入：檢查是否已經是 active 成員
             existing_member = db.session.query(ChannelMember).filter_by(
@@ -198,6 +206,9 @@ class ChannelMemberApi(ModelRestApi):
                 }
             })
             
+        except PasswordHashingBusy as e:
+            db.session.rollback()
+            return password_busy_response(e)
         except Exception as e:
             db.session.rollback()
             return jsonify({'error': f'加入頻道失敗: {str(e)}'}), 500
@@ -458,6 +469,9 @@ class ChannelMemberApi(ModelRestApi):
                 }
             })
             
+        except PasswordHashingBusy as e:
+            db.session.rollback()
+            return password_busy_response(e)
         except Exception as e:
             db.session.rollback()
             return jsonify({'error': f'重置密碼失敗: {str(e)}'}), 500
@@ -1,22 +1,25 @@
 """
 資料庫 Hook 系統
-處理成員數量同步和密碼加密等自動化任務
+處理成員數量同步、密碼加密、訊息序號配發、Socket session 失效、權限索引更新和 token 撤銷等自動化任務
 """
+from datetime import timezone
+
 from sqlalchemy import event, text
-try:
-    from flask_bcrypt import Bcrypt
-    # 初始化 bcrypt
-    bcrypt = Bcrypt()
-    HAS_BCRYPT = True
-except ImportError:
-    print("⚠️ Flask-Bcrypt not installed, password hashing disabled")
-    HAS_BCRYPT = False
-    bcrypt = None
+from sqlalchemy.orm import Session, object_session
+
+from .logging_config import get_logger
+from .password_hashing import HAS_BCRYPT, password_hasher
+
+logger = get_logger(__name__)
+
+if not HAS_BCRYPT:
+    logger.warning('bcrypt not installed, password hashing disabled')
 
 
 def setup_database_hooks():
     """設置所有資料庫 Hook"""
-    from .models import ChannelMember, ChatChannel
+    from .models import ChannelMember, ChatChannel, ChatMessage, RevokedToken
+    from .message_replay import allocate_channel_seq
     
     # 🔄 成員變更時自動更新數量
     @event.listens_for(ChannelMember, 'after_insert')
@@ -46,13 +49,107 @@ def setup_database_hooks():
                 {'count': result, 'channel_id': target.channel_id}
             )
 
+    # 🔢 新訊息寫入時配發頻道序號（批次寫入器以 Core 寫入，自行配發）
+    @event.listens_for(ChatMessage, 'before_insert')
+    def assign_channel_seq(mapper, connection, target):
+        """在同一交易中遞增頻道的訊息序號"""
+        if target.channel_seq is None:
+            target.channel_seq = allocate_channel_seq(connection, target.channel_id)
+
     # 密碼加密 Hook
     if HAS_BCRYPT:
         @event.listens_for(ChatChannel.join_password, 'set', retval=True)
         def hash_password(target, value, oldvalue, initiator):
-            """密碼設定時自動加密"""
-            if value and value != oldvalue:
-                return bcrypt.generate_password_hash(value).decode('utf-8')
+            """密碼設定時自動加密（在密碼雜湊工作池執行；已是 bcrypt 雜湊的值原樣保存，例如重新雜湊的結果）"""
+            if value and value != oldvalue and not password_hasher.is_channel_hash(value):
+                return password_hasher.hash_channel_password(value)
             return value
 
-    print("✅ Database hooks initialized")
\ No newline at end of file
+    # 🔌 使用者停用或角色變更時，讓其 Socket session 失效
+    from flask_appbuilder.security.sqla.models import User
+
+    def _mark_user_sessions_invalid(target):
+        """記錄需要失效的使用者，待交易 commit 後再處理"""
+        session = object_session(target)
+        if session is not None and target.id:
+            session.info.setdefault('invalidated_user_ids', set()).add(target.id)
+
+    @event.listens_for(User.active, 'set', active_history=True)
+    def track_user_deactivation(target, value, oldvalue, initiator):
+        """
+        使用者被停用
+        active_history 讓已過期（例如先前 commit 過）的 active 在設定前載入舊值；
+        無法取得舊值（NO_VALUE）時也視為停用，多中斷一次連線無妨
+        """
+        if not value and oldvalue is not False:
+            _mark_user_sessions_invalid(target)
+
+    @event.listens_for(User.roles, 'append')
+    @event.listens_for(User.roles, 'remove')
+    def track_user_role_change(target, value, initiator):
+        """使用者角色變更"""
+        _mark_user_sessions_invalid(target)
+
+    @event.listens_for(Session, 'after_commit')
+    def invalidate_socket_sessions(session):
+        """交易 commit 後，於背景中斷相關使用者的 Socket 連線"""
+        user_ids = session.info.pop('invalidated_user_ids', None)
+        if not user_ids:
+            return
+        from .socketio_server import socketio, invalidate_user_sessions
+        for user_id in user_ids:
+            socketio.start_background_task(invalidate_user_sessions, user_id, '(使用者停用或角色變更)')
+
+    @event.listens_for(Session, 'after_rollback')
+    def discard_socket_session_invalidations(session):
+        session.info.pop('invalidated_user_ids', None)
+        session.info.pop('permissions_changed', None)
+        session.info.pop('revoked_tokens', None)
+
+    # 🔑 角色或權限變更時，讓權限索引重新載入
+    from flask_appbuilder.security.sqla.models import Role, PermissionView
+
+    def _mark_permissions_changed(target):
+        session = object_session(target)
+        if session is not None:
+            session.info['permissions_changed'] = True
+
+    @event.listens_for(Role.permissions, 'append')
+    @event.listens_for(Role.permissions, 'remove')
+    def track_role_permission_change(target, value, initiator):
+        """角色的權限變更"""
+        _mark_permissions_changed(target)
+
+    @event.listens_for(Role, 'after_insert')
+    @event.listens_for(Role, 'after_update')
+    @event.listens_for(Role, 'after_delete')
+    @event.listens_for(PermissionView, 'after_insert')
+    @event.listens_for(PermissionView, 'after_delete')
+    def track_role_change(mapper, connection, target):
+        """角色新增、改名、刪除或權限項目新增、刪除"""
+        _mark_permissions_changed(target)
+
+    @event.listens_for(Session, 'after_commit')
+    def invalidate_permission_index(session):
+        """交易 commit 後重新載入權限索引"""
+        if session.info.pop('permissions_changed', None):
+            from .socketio_server import invalidate_permissions
+            invalidate_permissions()
+
+    # 🚫 token 撤銷後加入各 worker 的撤銷清單
+    @event.listens_for(RevokedToken, 'after_insert')
+    def track_token_revocation(mapper, connection, target):
+        session = object_session(target)
+        if session is not None:
+            expires_at = target.expires_at.replace(tzinfo=timezone.utc).timestamp()
+            session.info.setdefault('revoked_tokens', []).append((target.jti, expires_at))
+
+    @event.listens_for(Session, 'after_commit')
+    def apply_token_revocations(session):
+        """交易 commit 後加入撤銷清單並通知其他 worker"""
+        tokens = session.info.pop('revoked_tokens', None)
+        if tokens:
+            from .socketio_server import revoke_tokens
+            revoke_tokens(tokens)
+
+    logger.debug('Database hooks initialized')
\ No newline at end of file
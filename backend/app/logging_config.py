@@ -0,0 +1,221 @@
+"""
+應用程式日誌設定
+- 各模組分別設定等級（LOG_LEVELS），未達等級的呼叫只做一次 isEnabledFor 判斷
+- 結構化欄位：logger.info('訊息已送出', user_id=1, channel_id=2)，輸出為 key=value 或 JSON（LOG_FORMAT）
+- 取樣：每個請求 / 每個事件都會出現的日誌加上 sample='<鍵>'，依 LOG_SAMPLING 的速率限制輸出，
+  被略過的筆數在下一筆輸出時以 suppressed 欄位補上
+- 非同步輸出（LOG_ASYNC）：呼叫端只把 record 放入佇列，格式化與寫入 stdout / 檔案由背景執行緒完成；
+  佇列滿時丟棄並計數，不會阻塞請求
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+import time
+
+LOG_FORMAT_TEXT = 'text'
+LOG_FORMAT_JSON = 'json'
+
+# 沿用原本 basicConfig 的格式
+TEXT_FORMAT = '%(asctime)s:%(levelname)s:%(name)s:%(message)s'
+
+# LoggerAdapter.log 保留的關鍵字參數，其餘視為結構化欄位
+_LOG_KWARGS = ('exc_info', 'stack_info', 'stacklevel')
+
+
+class LogSampler:
+    """
+    依取樣鍵限制輸出速率（token bucket）
+    @param rules: {取樣鍵: (每秒筆數, 突發筆數)}，未列出的鍵使用 default
+    """
+
+    def __init__(self, rules=None, default=(1.0, 10)):
+        self._lock = threading.Lock()
+        self._buckets = {}
+        self.configure(rules, default)
+
+    def configure(self, rules=None, default=(1.0, 10)):
+        with self._lock:
+            self.rules = dict(rules or {})
+            self.default = default
+            self._buckets = {}
+            self.suppressed_total = 0
+
+    def acquire(self, key, now=None):
+        """
+        @return: None 表示本筆應略過，否則為上次輸出後被略過的筆數
+        """
+        now = time.monotonic() if now is None else now
+        rate, burst = self.rules.get(key, self.default)
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [burst, now, 0]
+            else:
+                bucket[0] = min(burst, bucket[0] + (now - bucket[1]) * rate)
+                bucket[1] = now
+            if bucket[0] < 1:
+                bucket[2] += 1
+                self.suppressed_total += 1
+                return None
+            bucket[0] -= 1
+            suppressed, bucket[2] = bucket[2], 0
+            return suppressed
+
+
+sampler = LogSampler()
+
+
+class StructuredLogger(logging.LoggerAdapter):
+    """
+    接受結構化欄位與 sample 參數的 logger
+    logger.debug('新訊息', sample='socket.send_message', user_id=1)
+    """
+
+    def __init__(self, logger):
+        super().__init__(logger, {})
+
+    def log(self, level, msg, *args, sample=None, **kwargs):
+        if not self.logger.isEnabledFor(level):
+            return
+        if sample is not None:
+            suppressed = sampler.acquire(sample)
+            if suppressed is None:
+                return
+            if suppressed:
+                kwargs['suppressed'] = suppressed
+        options = {key: kwargs.pop(key) for key in _LOG_KWARGS if key in kwargs}
+        self.logger.log(level, msg, *args, extra={'fields': kwargs}, **options)
+
+
+def get_logger(name):
+    return StructuredLogger(logging.getLogger(name))
+
+
+def _format_value(value):
+    if isinstance(value, str):
+        if value and not any(char in value for char in ' ="\n'):
+            return value
+        return json.dumps(value, ensure_ascii=False)
+    return str(value)
+
+
+class StructuredFormatter(logging.Formatter):
+    """輸出 record 的結構化欄位：text 附加在訊息後（key=value），json 為單行 JSON"""
+
+    def __init__(self, output=LOG_FORMAT_TEXT):
+        super().__init__(TEXT_FORMAT)
+        self.output = output
+
+    def format(self, record):
+        fields = getattr(record, 'fields', None)
+        if self.output != LOG_FORMAT_JSON:
+            line = super().format(record)
+            if fields:
+                line += ' ' + ' '.join(f'{key}={_format_value(value)}' for key, value in fields.items())
+            return line
+        entry = {
+            'ts': record.created,
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage()
+        }
+        if fields:
+            entry.update(fields)
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _RecordQueueHandler(logging.handlers.QueueHandler):
+    """
+    只把 record 放入佇列，格式化交給背景執行緒
+    （標準的 QueueHandler 會在呼叫端先格式化整行訊息）
+    """
+
+    def __init__(self, record_queue):
+        super().__init__(record_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # 先套用 % 參數，避免參數物件在背景格式化前被修改
+        if record.args:
+            record.msg = record.getMessage()
+            record.args = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+_installed = []
+_listener = None
+_queue_handler = None
+
+
+def _stop_listener():
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(_stop_listener)
+
+
+def configure_logging(config):
+    """
+    依 config 設定 root logger（可重複呼叫，會先移除上一次安裝的 handler）
+    @param config: app.config 或任何有 get() 的對應
+    """
+    global _listener, _queue_handler
+    root = logging.getLogger()
+    _stop_listener()
+    for handler in _installed:
+        root.removeHandler(handler)
+        handler.close()
+    _installed.clear()
+    _queue_handler = None
+
+    log_file = config.get('LOG_FILE')
+    output = logging.FileHandler(log_file, encoding='utf-8') if log_file else logging.StreamHandler(sys.stdout)
+    output.setFormatter(StructuredFormatter(config.get('LOG_FORMAT', LOG_FORMAT_TEXT)))
+
+    if config.get('LOG_ASYNC', True):
+        _queue_handler = _RecordQueueHandler(queue.Queue(config.get('LOG_QUEUE_SIZE', 10000)))
+        _listener = logging.handlers.QueueListener(_queue_handler.queue, output, respect_handler_level=True)
+        _listener.start()
+        _installed.append(_queue_handler)
+    else:
+        _installed.append(output)
+    root.addHandler(_installed[0])
+
+    root.setLevel(config.get('LOG_LEVEL', 'INFO'))
+    for name, level in (config.get('LOG_LEVELS') or {}).items():
+        logging.getLogger(name).setLevel(level)
+
+    sampler.configure(config.get('LOG_SAMPLING'), config.get('LOG_SAMPLING_DEFAULT', (1.0, 10)))
+
+
+def flush_logging():
+    """等待佇列中的日誌寫出（重新啟動背景執行緒）"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener.start()
+
+
+def logging_stats():
+    return {
+        'async': _queue_handler is not None,
+        'queued': _queue_handler.queue.qsize() if _queue_handler else 0,
+        'dropped': _queue_handler.dropped if _queue_handler else 0,
+        'sampled_out': sampler.suppressed_total
+    }
@@ -0,0 +1,141 @@
+"""
+繁忙頻道的 new_message 合併廣播
+頻道安靜時每則訊息照常立即以 new_message 廣播；
+同一房間的訊息速率超過門檻後改為累積，最多每 window 秒以一筆 new_messages 陣列送出，
+減少大量小封包與每個封包的固定開銷。增加的延遲上限為 window，實際延遲會被量測並列入統計
+"""
+
+import threading
+import time
+
+from .logging_config import get_logger
+
+logger = get_logger(__name__)
+
+
+class _RoomState:
+    """單一房間的訊息速率（前後兩個時間桶的滑動估計）與待送出的訊息"""
+    __slots__ = ('bucket', 'count', 'previous', 'pending', 'last_seen')
+
+    def __init__(self):
+        self.bucket = None
+        self.count = 0
+        self.previous = 0
+        self.pending = []
+        self.last_seen = 0.0
+
+    def observe(self, now, rate_window):
+        """記錄一則訊息並回傳目前的估計速率（則/秒）"""
+        bucket = int(now // rate_window)
+        if bucket != self.bucket:
+            self.previous = self.count if self.bucket is not None and bucket == self.bucket + 1 else 0
+            self.count = 0
+            self.bucket = bucket
+        self.count += 1
+        self.last_seen = now
+        elapsed = (now % rate_window) / rate_window
+        return (self.previous * (1 - elapsed) + self.count) / rate_window
+
+
+class MessageBatcher:
+    """
+    依房間流量自動切換單筆 / 批次廣播
+    @param emit_single: 單筆廣播 emit_single(key, message)
+    @param emit_batch: 批次廣播 emit_batch(key, messages)
+    @param window: 批次模式下最多延後的秒數（由 flush() 的呼叫間隔保證）
+    @param threshold: 房間訊息速率（則/秒）達到此值時開始合併
+    @param max_batch: 單一批次的訊息上限，達到時立即送出
+    """
+
+    def __init__(self, emit_single, emit_batch, window=0.025, threshold=20, max_batch=200, rate_window=1.0):
+        self.emit_single = emit_single
+        self.emit_batch = emit_batch
+        self.window = window
+        self.threshold = threshold
+        self.max_batch = max_batch
+        self.rate_window = rate_window
+        # 判斷與送出在同一把鎖內完成，單筆廣播不會超前正在送出的批次
+        self._lock = threading.RLock()
+        self._rooms = {}
+        self._last_prune = 0.0
+        # 統計
+        self.single = 0
+        self.batches = 0
+        self.batched_messages = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+
+    def submit(self, key, message, now=None):
+        """
+        廣播一則訊息
+        @param key: 批次的分組，例如 (房間, channel_id)
+        @return: True 表示已排入批次，稍後由 flush() 送出
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            state = self._rooms.get(key)
+            if state is None:
+                state = self._rooms[key] = _RoomState()
+            rate = state.observe(now, self.rate_window)
+            # 已有待送出的訊息時必須排在後面，保持訊息順序
+            if not state.pending and rate < self.threshold:
+                self.single += 1
+                self.emit_single(key, message)
+                return False
+            state.pending.append((message, now))
+            if len(state.pending) >= self.max_batch:
+                batch, state.pending = state.pending, []
+                self._emit_batch(key, batch, now)
+            return True
+
+    def flush(self, now=None):
+        """送出所有房間累積的訊息，回傳送出的批次數"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            batches = [(key, state.pending) for key, state in self._rooms.items() if state.pending]
+            for key, pending in batches:
+                self._rooms[key].pending = []
+                self._emit_batch(key, pending, now)
+            if now - self._last_prune > self.rate_window * 10:
+                self._last_prune = now
+                self._prune(now)
+        return len(batches)
+
+    def _prune(self, now):
+        """移除長時間沒有訊息的房間狀態"""
+        idle = [key for key, state in self._rooms.items()
+                if not state.pending and now - state.last_seen > self.rate_window * 2]
+        for key in idle:
+            del self._rooms[key]
+
+    def _emit_batch(self, key, pending, now):
+        messages = [message for message, _ in pending]
+        try:
+            if len(messages) == 1:
+                self.emit_single(key, messages[0])
+            else:
+                self.emit_batch(key, messages)
+        except Exception:
+            logger.exception('批次廣播訊息失敗', sample='socket.background_error', key=key, messages=len(messages))
+        self.batches += 1
+        self.batched_messages += len(messages)
+        for _, queued_at in pending:
+            delay = now - queued_at
+            self.latency_total += delay
+            if delay > self.latency_max:
+                self.latency_max = delay
+
+    def stats(self):
+        with self._lock:
+            return {
+                'rooms': len(self._rooms),
+                'pending': sum(len(state.pending) for state in self._rooms.values()),
+                'single': self.single,
+                'batches': self.batches,
+                'batched_messages': self.batched_messages,
+                'avg_batch': round(self.batched_messages / self.batches, 1) if self.batches else 0,
+                'added_latency_avg_ms': round(self.latency_total / self.batched_messages * 1000, 2)
+                if self.batched_messages else 0,
+                'added_latency_max_ms': round(self.latency_max * 1000, 2),
+                'window_ms': self.window * 1000
+            }
@@ -0,0 +1,301 @@
+"""
+多程序 Socket.IO 訊息佇列
+多個 worker 程序透過同一個 pub/sub 後端共享房間與廣播，前方需有 sticky 負載平衡器
+
+支援的 SOCKETIO_MESSAGE_QUEUE：
+- '':                   單一程序（不使用訊息佇列）
+- 'sqlite:///<路徑>':   內建的 SQLite pub/sub，同一台主機上的 worker 共用一個檔案，不需額外服務
+- 'redis://...':        本機或遠端 Redis（需安裝 redis 套件）
+
+線上列表同步：
+每個 worker 只知道自己的連線，透過佇列中的 'presence' 訊息交換本機線上使用者，
+PresenceRegistry 合併所有 worker 的資料後產生全域的快照與增量
+
+預先編碼的廣播：
+FrameBroadcaster 以 'frame' 訊息轉送已編碼的封包，其他 worker 直接送給本機連線（見 broadcast.py）
+"""
+
+import os
+import sqlite3
+import threading
+import time
+
+from socketio.pubsub_manager import PubSubManager
+
+from .logging_config import get_logger
+
+logger = get_logger(__name__)
+
+# presence 訊息種類
+PRESENCE_HELLO = 'hello'            # worker 啟動，請其他 worker 立即送出完整狀態
+PRESENCE_STATE = 'state'            # 完整的本機線上使用者（心跳）
+PRESENCE_DELTA = 'delta'            # 本機上線/離線變更
+PRESENCE_BYE = 'bye'                # worker 正常結束
+PRESENCE_INVALIDATE = 'invalidate'  # 中斷某使用者在所有 worker 上的連線
+PRESENCE_PERMISSIONS = 'permissions'  # 角色權限已變更，重新載入權限索引
+PRESENCE_REVOKE = 'revoke'          # token 已撤銷，加入撤銷清單
+
+
+class PresenceSyncMixin:
+    """
+    在 pub/sub 管理器上攔截 method 為 'presence' 與 'frame' 的訊息
+    這類訊息不是一般的 Socket.IO emit，交給 presence_handler / frame_handler 處理後不再往下傳
+    """
+    presence_handler = None
+    frame_handler = None
+
+    def publish_presence(self, op, **payload):
+        self._publish({'method': 'presence', 'host_id': self.host_id, 'op': op, **payload})
+
+    def publish_frame(self, **payload):
+        self._publish({'method': 'frame', 'host_id': self.host_id, **payload})
+
+    def _listen(self):
+        for message in super()._listen():
+            data = message
+            if not isinstance(data, dict):
+                try:
+                    data = self.json.loads(message)
+                except Exception:
+                    continue
+            method = data.get('method') if isinstance(data, dict) else None
+            if method in ('presence', 'frame'):
+                handler = self.presence_handler if method == 'presence' else self.frame_handler
+                if data.get('host_id') != self.host_id and handler:
+                    try:
+                        handler(data)
+                    except Exception:
+                        logger.exception('處理 worker 間的訊息失敗', sample='message_queue.handler_error', method=method)
+                continue
+            # 已解碼的字典直接交給 PubSubManager，避免重複解析
+            yield data
+
+
+class SQLitePubSubManager(PubSubManager):
+    """
+    以 SQLite 檔案作為 pub/sub 的內建訊息佇列
+    發佈即寫入一列，各 worker 以遞增 id 輪詢新訊息；舊訊息超過保留時間後清除
+    適合單機多 worker，不需額外安裝任何服務
+    sqlite3 的呼叫會阻塞（鎖定時最多等待 10 秒），eventlet / gevent 模式下以 run_blocking 交給原生執行緒，
+    輪詢與發佈都不會卡住事件迴圈
+    @param run_blocking: 執行阻塞 sqlite3 呼叫的函式 run_blocking(fn, *args)，預設在目前執行緒執行
+    """
+    name = 'sqlite'
+
+    def __init__(self, url='sqlite:///socketio_queue.db', channel='socketio', write_only=False,
+                 logger=None, json=None, poll_interval=0.02, retention=60, run_blocking=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger, json=json)
+        self.path = url[len('sqlite:///'):] if url.startswith('sqlite:///') else url
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self._run_blocking = run_blocking or (lambda fn, *args: fn(*args))
+        self._publish_lock = threading.Lock()
+        self._publish_conn = None
+        self._last_prune = 0
+        self._setup()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    def _setup(self):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        conn = self._connect()
+        try:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS socketio_queue ('
+                'id INTEGER PRIMARY KEY AUTOINCREMENT, '
+                'channel TEXT NOT NULL, '
+                'payload TEXT NOT NULL, '
+                'created REAL NOT NULL)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_socketio_queue_created ON socketio_queue (created)')
+            # 只接收建立管理器之後發佈的訊息；監聽任務稍後才開始執行時也不會漏掉這段期間的訊息
+            self._start_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM socketio_queue').fetchone()[0]
+        finally:
+            conn.close()
+
+    def _publish(self, data):
+        payload = self.json.dumps(data)
+        with self._publish_lock:
+            self._run_blocking(self._insert, payload)
+
+    def _insert(self, payload):
+        now = time.time()
+        if self._publish_conn is None:
+            self._publish_conn = self._connect()
+        self._publish_conn.execute(
+            'INSERT INTO socketio_queue (channel, payload, created) VALUES (?, ?, ?)',
+            (self.channel, payload, now)
+        )
+        # 定期清除超過保留時間的訊息
+        if now - self._last_prune > self.retention:
+            self._last_prune = now
+            self._publish_conn.execute(
+                'DELETE FROM socketio_queue WHERE created < ?', (now - self.retention,)
+            )
+
+    def _poll(self, conn, last_id):
+        return conn.execute(
+            'SELECT id, payload FROM socketio_queue WHERE id > ? AND channel = ? ORDER BY id',
+            (last_id, self.channel)
+        ).fetchall()
+
+    def _listen(self):
+        conn = self._run_blocking(self._connect)
+        last_id = self._start_id
+        while True:
+            rows = self._run_blocking(self._poll, conn, last_id)
+            for row_id, payload in rows:
+                last_id = row_id
+                yield payload
+            if not rows:
+                self.server.sleep(self.poll_interval)
+
+
+try:
+    from socketio.redis_manager import RedisManager
+except ImportError:  # pragma: no cover
+    RedisManager = None
+
+
+class SQLitePresenceManager(PresenceSyncMixin, SQLitePubSubManager):
+    pass
+
+
+if RedisManager is not None:
+    class RedisPresenceManager(PresenceSyncMixin, RedisManager):
+        pass
+else:  # pragma: no cover
+    RedisPresenceManager = None
+
+
+def create_client_manager(url, channel='flask-socketio', run_blocking=None):
+    """
+    依 SOCKETIO_MESSAGE_QUEUE 建立 Socket.IO client manager
+    @param run_blocking: SQLite 佇列執行阻塞呼叫的函式（eventlet / gevent 模式下交給原生執行緒）
+    @return: 支援 publish_presence 的管理器，url 為空時回傳 None（單一程序）
+    """
+    if not url:
+        return None
+    if url.startswith('sqlite:'):
+        return SQLitePresenceManager(url, channel=channel, run_blocking=run_blocking)
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        if RedisPresenceManager is None:
+            raise RuntimeError('使用 Redis 訊息佇列需要安裝 redis 套件')
+        return RedisPresenceManager(url, channel=channel)
+    raise ValueError(f'不支援的 SOCKETIO_MESSAGE_QUEUE: {url}')
+
+
+class PresenceSync:
+    """
+    跨 worker 的線上列表同步
+    - 本機連線變更以 delta 發佈，並定期以 state 心跳發佈完整狀態修正遺失的訊息
+    - 超過 host_timeout 沒有心跳的 worker 視為已終止，其使用者全部離線
+    @param registry: PresenceRegistry
+    @param manager: create_client_manager() 建立的管理器
+    @param on_invalidate: 收到其他 worker 要求中斷某使用者連線時的回呼 on_invalidate(user_id, reason)
+    @param on_permissions_changed: 收到其他 worker 角色權限變更通知時的回呼 on_permissions_changed()
+    @param on_tokens_revoked: 收到其他 worker 撤銷 token 的通知時的回呼 on_tokens_revoked([(jti, 到期 UNIX 時間)])
+    """
+
+    def __init__(self, registry, manager, heartbeat_interval=5.0, host_timeout=15.0, on_invalidate=None,
+                 on_permissions_changed=None, on_tokens_revoked=None):
+        self.registry = registry
+        self.manager = manager
+        self.heartbeat_interval = heartbeat_interval
+        self.host_timeout = host_timeout
+        self.on_invalidate = on_invalidate
+        self.on_permissions_changed = on_permissions_changed
+        self.on_tokens_revoked = on_tokens_revoked
+        self._host_seen = {}
+        self._last_heartbeat = 0
+        self._lock = threading.Lock()
+        registry.track_local_changes = True
+        manager.presence_handler = self.handle
+
+    @property
+    def host_id(self):
+        return self.manager.host_id
+
+    def start(self):
+        """發佈 hello，其他 worker 收到後立即回應完整狀態"""
+        self.manager.publish_presence(PRESENCE_HELLO)
+        self.publish_state()
+
+    def stop(self):
+        try:
+            self.manager.publish_presence(PRESENCE_BYE)
+        except Exception as e:
+            logger.warning('發佈 worker 結束訊息失敗', error=str(e))
+
+    def publish_state(self):
+        self._last_heartbeat = time.monotonic()
+        self.manager.publish_presence(PRESENCE_STATE, users=self.registry.local_state())
+
+    def invalidate_user(self, user_id, reason=''):
+        """要求其他 worker 中斷該使用者的連線"""
+        self.manager.publish_presence(PRESENCE_INVALIDATE, user_id=user_id, reason=reason)
+
+    def invalidate_permissions(self):
+        """通知其他 worker 角色權限已變更"""
+        self.manager.publish_presence(PRESENCE_PERMISSIONS)
+
+    def revoke_tokens(self, tokens):
+        """通知其他 worker 這些 token 已撤銷（[(jti, 到期 UNIX 時間)]）"""
+        self.manager.publish_presence(PRESENCE_REVOKE, tokens=[list(token) for token in tokens])
+
+    def tick(self):
+        """由線上列表背景任務定期呼叫：發佈本機變更、心跳與清除失聯的 worker"""
+        changes = self.registry.drain_local_changes()
+        if changes:
+            joined, left = changes
+            self.manager.publish_presence(PRESENCE_DELTA, joined=joined, left=left)
+        now = time.monotonic()
+        if now - self._last_heartbeat >= self.heartbeat_interval:
+            self.publish_state()
+        with self._lock:
+            expired = [host for host, seen in self._host_seen.items() if now - seen > self.host_timeout]
+            for host in expired:
+                del self._host_seen[host]
+        for host in expired:
+            logger.warning('worker 已失聯，移除其線上使用者', host=host)
+            self.registry.drop_remote(host)
+
+    def handle(self, message):
+        """處理其他 worker 發佈的 presence 訊息（於 pub/sub 監聽執行緒中執行）"""
+        host = message.get('host_id')
+        op = message.get('op')
+        if op == PRESENCE_BYE:
+            with self._lock:
+                self._host_seen.pop(host, None)
+            self.registry.drop_remote(host)
+            return
+        if op == PRESENCE_INVALIDATE:
+            if self.on_invalidate:
+                self.on_invalidate(message.get('user_id'), message.get('reason', ''))
+            return
+        if op == PRESENCE_PERMISSIONS:
+            if self.on_permissions_changed:
+                self.on_permissions_changed()
+            return
+        if op == PRESENCE_REVOKE:
+            if self.on_tokens_revoked:
+                self.on_tokens_revoked([tuple(token) for token in message.get('tokens') or []])
+            return
+        with self._lock:
+            self._host_seen[host] = time.monotonic()
+        if op == PRESENCE_HELLO:
+            self.publish_state()
+        elif op == PRESENCE_STATE:
+            self.registry.replace_remote(host, message.get('users') or [])
+        elif op == PRESENCE_DELTA:
+            self.registry.apply_remote(host, message.get('joined') or [], message.get('left') or [])
+
+    def stats(self):
+        with self._lock:
+            hosts = len(self._host_seen)
+        return {'host_id': self.host_id, 'remote_hosts': hosts}
@@ -0,0 +1,114 @@
+"""
+可續傳的訊息遞送
+每則訊息在寫入時取得頻道內單調遞增的序號 (channel_seq)，
+客戶端重新連線後以 resume 事件帶上各頻道最後收到的序號，伺服器只補送缺少的訊息：
+先查記憶體中的最近訊息緩衝，緩衝涵蓋不到時改以 channel_seq 範圍查詢資料庫
+"""
+
+import threading
+from collections import deque
+
+from sqlalchemy import text
+
+
+def allocate_channel_seq(connection, channel_id, count=1):
+    """
+    在目前的交易中配發頻道序號（計數器存放於 chat_channels.message_seq）
+    UPDATE 取得寫入鎖直到 commit，多個程序同時寫入同一頻道時序號也不會重複
+    @return: 配發的第一個序號，頻道不存在時回傳 None
+    """
+    if not channel_id:
+        return None
+    result = connection.execute(
+        text("UPDATE chat_channels SET message_seq = COALESCE(message_seq, 0) + :count WHERE id = :channel_id"),
+        {'count': count, 'channel_id': channel_id}
+    )
+    if not result.rowcount:
+        return None
+    last_seq = connection.execute(
+        text("SELECT message_seq FROM chat_channels WHERE id = :channel_id"),
+        {'channel_id': channel_id}
+    ).scalar()
+    return last_seq - count + 1
+
+
+def assign_channel_seqs(connection, rows):
+    """為批次寫入的訊息列配發序號（每個頻道一次 UPDATE），依列的順序遞增"""
+    by_channel = {}
+    for row in rows:
+        by_channel.setdefault(row.get('channel_id'), []).append(row)
+    for channel_id, channel_rows in by_channel.items():
+        first_seq = allocate_channel_seq(connection, channel_id, len(channel_rows))
+        for offset, row in enumerate(channel_rows):
+            row['channel_seq'] = None if first_seq is None else first_seq + offset
+
+
+class RecentMessageBuffer:
+    """
+    每個頻道保留最近 size 則已寫入的訊息（廣播格式的字典，依 seq 遞增）
+    刪除的訊息保留位置並標記，讓序號保持連續，補送時略過
+    """
+
+    def __init__(self, size=200):
+        self.size = size
+        self._lock = threading.Lock()
+        self._channels = {}
+        # 統計
+        self.hits = 0
+        self.misses = 0
+
+    def add(self, message):
+        """加入一則帶有 seq 的訊息；訊息可能因並行寫入而稍微亂序抵達"""
+        channel_id = message.get('channel_id')
+        seq = message.get('seq')
+        if not channel_id or seq is None:
+            return
+        with self._lock:
+            messages = self._channels.get(channel_id)
+            if messages is None:
+                messages = self._channels[channel_id] = deque(maxlen=self.size)
+            if not messages or messages[-1]['seq'] < seq:
+                messages.append(message)
+                return
+            # 亂序抵達：插入正確位置（僅發生在極少數並行寫入時）
+            items = sorted([*messages, message], key=lambda m: m['seq'])
+            messages.clear()
+            messages.extend(items[-self.size:])
+
+    def mark_deleted(self, channel_id, message_id):
+        with self._lock:
+            for index, message in enumerate(self._channels.get(channel_id, ())):
+                if message['id'] == message_id:
+                    self._channels[channel_id][index] = dict(message, deleted=True)
+                    return
+
+    def since(self, channel_id, after_seq, head_seq, limit):
+        """
+        取得 after_seq 之後到 head_seq 為止的訊息
+        @return: 訊息列表；緩衝未完整涵蓋 (after_seq, head_seq] 時回傳 None，需改查資料庫
+        """
+        with self._lock:
+            messages = list(self._channels.get(channel_id, ()))
+        if head_seq <= after_seq:
+            self.hits += 1
+            return []
+        if not messages or messages[0]['seq'] > after_seq + 1 or messages[-1]['seq'] < head_seq:
+            self.misses += 1
+            return None
+        missed = [m for m in messages if after_seq < m['seq'] <= head_seq]
+        # 序號必須連續，否則有其他程序寫入的訊息不在緩衝中
+        if len(missed) != head_seq - after_seq or len(missed) > limit:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return [m for m in missed if not m.get('deleted')]
+
+    def stats(self):
+        with self._lock:
+            buffered = sum(len(messages) for messages in self._channels.values())
+        return {
+            'channels': len(self._channels),
+            'buffered': buffered,
+            'hits': self.hits,
+            'misses': self.misses
+        }
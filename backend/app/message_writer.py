@@ -0,0 +1,191 @@
+"""
+聊天訊息寫入佇列 (write-behind)
+訊息在送出前先取得 id，由專用的寫入執行緒批次寫入 chat_messages，
+每批只做一次 commit（依批次大小與最大延遲觸發），避免每則訊息都等待一次 fsync
+
+耐久性模式：
+- batched: 發送端等待所在批次 commit 後才廣播，仍保證已廣播的訊息已寫入
+- async:   發送端放入佇列後立即廣播，程序異常終止時可能遺失最後一批
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from sqlalchemy import func, select
+
+from .logging_config import get_logger
+
+logger = get_logger(__name__)
+
+DURABILITY_BATCHED = 'batched'
+DURABILITY_ASYNC = 'async'
+
+# 佇列結束標記
+_STOP = object()
+
+
+class MessageWriter:
+    """
+    批次寫入 chat_messages 的背景寫入器
+    @param table: chat_messages 的 SQLAlchemy Table
+    @param batch_size: 單批最多寫入的訊息數
+    @param max_latency: 批次第一則訊息最多等待的秒數
+    @param durability: DURABILITY_BATCHED 或 DURABILITY_ASYNC
+    @param run_blocking: 執行阻塞資料庫呼叫的函式 run_blocking(fn, *args)，
+                         eventlet/gevent 模式下用來把 commit 交給原生執行緒
+    @param id_offset, id_stride: 多個程序共用資料表時，只配發 id % id_stride == id_offset 的 id
+    @param prepare_rows: 寫入前在同一交易中處理訊息列的函式 prepare_rows(connection, rows)，
+                         例如配發頻道序號；寫入完成後呼叫端可從 row 字典讀回
+    """
+
+    def __init__(self, table, batch_size=100, max_latency=0.05, durability=DURABILITY_BATCHED,
+                 run_blocking=None, id_offset=0, id_stride=1, prepare_rows=None):
+        self.table = table
+        self.batch_size = batch_size
+        self.max_latency = max_latency
+        self.durability = durability
+        self._run_blocking = run_blocking or (lambda fn, *args: fn(*args))
+        self.id_offset = id_offset
+        self.prepare_rows = prepare_rows
+        self.id_stride = max(id_stride, 1)
+        self._engine = None
+        self._queue = queue.Queue()
+        self._thread = None
+        self._id_lock = threading.Lock()
+        self._last_id = 0
+        self._start_lock = threading.Lock()
+        self._idle = threading.Condition()
+        self._in_flight = 0
+        # 統計
+        self.batches = 0
+        self.rows = 0
+        self.failed_rows = 0
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, engine):
+        """以資料庫中最大的訊息 id 初始化 id 配號，並啟動寫入執行緒"""
+        with self._start_lock:
+            if self.running:
+                return
+            self._engine = engine
+            with engine.connect() as conn:
+                max_id = conn.execute(select(func.max(self.table.c.id))).scalar()
+            with self._id_lock:
+                self._last_id = max(self._last_id, max_id or 0)
+            self._thread = threading.Thread(target=self._run, name='message-writer', daemon=True)
+            self._thread.start()
+
+    def next_id(self):
+        """配發下一個訊息 id（所有寫入 chat_messages 的路徑都必須經由此處配號）"""
+        with self._id_lock:
+            next_id = self._last_id + 1
+            if self.id_stride > 1:
+                next_id += (self.id_offset - next_id) % self.id_stride
+            self._last_id = next_id
+            return next_id
+
+    def submit(self, row):
+        """
+        將一筆訊息放入寫入佇列
+        @param row: chat_messages 欄位字典，必須已包含 id
+        @return: Future，該批 commit 後完成（失敗時帶有例外）
+        """
+        future = Future()
+        with self._idle:
+            self._in_flight += 1
+        self._queue.put((row, future))
+        return future
+
+    def flush(self, timeout=None):
+        """等待目前佇列中的訊息全部寫入，回傳是否在時限內完成"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._idle:
+            while self._in_flight:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._idle.wait(remaining)
+        return True
+
+    def stop(self, flush=True, timeout=5.0):
+        """停止寫入執行緒；flush=True 時先寫完佇列中的訊息"""
+        if not self.running:
+            return True
+        flushed = self.flush(timeout) if flush else False
+        self._queue.put((_STOP, None))
+        self._thread.join(timeout)
+        return flushed
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item[0] is _STOP:
+                return
+            batch = [item]
+            # 第一則訊息到達後，最多再等 max_latency 湊滿一批
+            deadline = time.monotonic() + self.max_latency
+            stop = False
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item[0] is _STOP:
+                    stop = True
+                    break
+                batch.append(item)
+            self._write(batch)
+            if stop:
+                return
+
+    def _write(self, batch):
+        rows = [row for row, _ in batch]
+        try:
+            self._run_blocking(self._insert, rows)
+            self.batches += 1
+            self.rows += len(rows)
+            for _, future in batch:
+                future.set_result(True)
+        except Exception as e:
+            logger.warning('批次寫入訊息失敗，改為逐筆寫入', sample='message_writer.failed', rows=len(rows), error=str(e))
+            self._write_one_by_one(batch)
+        finally:
+            with self._idle:
+                self._in_flight -= len(batch)
+                if not self._in_flight:
+                    self._idle.notify_all()
+
+    def _insert(self, rows):
+        """單一交易寫入多筆訊息"""
+        with self._engine.begin() as conn:
+            if self.prepare_rows:
+                self.prepare_rows(conn, rows)
+            conn.execute(self.table.insert(), rows)
+
+    def _write_one_by_one(self, batch):
+        """批次失敗時逐筆重試，只讓有問題的訊息失敗"""
+        for row, future in batch:
+            try:
+                self._run_blocking(self._insert, [row])
+                self.rows += 1
+                future.set_result(True)
+            except Exception as e:
+                self.failed_rows += 1
+                logger.exception('寫入訊息失敗', sample='message_writer.failed', message_id=row.get('id'))
+                future.set_exception(e)
+
+    def stats(self):
+        return {
+            'durability': self.durability,
+            'queued': self._in_flight,
+            'batches': self.batches,
+            'rows': self.rows,
+            'failed_rows': self.failed_rows,
+            'avg_batch_size': round(self.rows / self.batches, 2) if self.batches else 0
+        }
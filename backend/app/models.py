@@ -40,6 +40,9 @@ class ChatMessage(AuditMixin, Model):
     # 頻道/房間 ID (未來擴充多房間功能)
     channel_id = Column(Integer, default=1, comment='頻道ID')
 
+    # 頻道內的訊息序號（寫入時由 chat_channels.message_seq 配發，供斷線續傳使用）
+    channel_seq = Column(Integer, nullable=True, comment='頻道內訊息序號')
+
     # 資料庫索引優化
     __table_args__ = (
         # 依建立時間排序的索引 (最常用的查詢)
@@ -50,11 +53,52 @@ class ChatMessage(AuditMixin, Model):
         Index('idx_chat_messages_channel_id', 'channel_id'),
         # 複合索引：頻道 + 建立時間
         Index('idx_chat_messages_channel_created', 'channel_id', 'created_on'),
+        # 複合索引：頻道 + 訊息序號（斷線續傳的範圍查詢）
+        Index('idx_chat_messages_channel_seq', 'channel_id', 'channel_seq'),
     )
 
     def __repr__(self):
         return f'<ChatMessage {self.id}: {self.content[:50]}>'
 
+    @classmethod
+    def query_dicts(cls, session):
+        """
+        訊息列表用的查詢：只取 to_dict() 需要的欄位，發送者欄位以 outer join 在同一個查詢中取得，
+        不再逐筆延遲載入 sender；結果以 row_to_dict() 轉換，格式與 to_dict() 相同
+        """
+        return (
+            session.query(
+                cls.id, cls.content, cls.sender_id,
+                User.username.label('sender_name'),
+                User.first_name.label('sender_first_name'),
+                User.last_name.label('sender_last_name'),
+                cls.message_type, cls.attachment_path, cls.is_deleted, cls.reply_to_id,
+                cls.channel_id, cls.channel_seq, cls.created_on, cls.changed_on
+            )
+            .outerjoin(User, User.id == cls.sender_id)
+        )
+
+    @staticmethod
+    def row_to_dict(row):
+        """query_dicts() 的結果列轉換為字典格式"""
+        has_sender = row.sender_name is not None
+        return {
+            'id': row.id,
+            'content': row.content,
+            'sender_id': row.sender_id,
+            'sender_name': row.sender_name if has_sender else 'Unknown',
+            'sender_first_name': row.sender_first_name if has_sender else '',
+            'sender_last_name': row.sender_last_name if has_sender else '',
+            'message_type': row.message_type,
+            'attachment_path': row.attachment_path,
+            'is_deleted': row.is_deleted,
+            'reply_to_id': row.reply_to_id,
+            'channel_id': row.channel_id,
+            'seq': row.channel_seq,
+            'created_on': to_iso_utc(row.created_on),
+            'changed_on': to_iso_utc(row.changed_on)
+        }
+
     def to_dict(self):
         """轉換為字典格式，供 API 回傳使用"""
         try:
@@ -79,6 +123,7 @@ class ChatMessage(AuditMixin, Model):
                 'is_deleted': self.is_deleted,
                 'reply_to_id': self.reply_to_id,
                 'channel_id': self.channel_id,
+                'seq': self.channel_seq,
                 'created_on': to_iso_utc(self.created_on),
                 'changed_on': to_iso_utc(self.changed_on)
             }
@@ -292,6 +337,9 @@ class ChatChannel(AuditMixin, Model):
     password_required = Column(Boolean, default=False, comment='是否需要密碼才能加入')
     allow_join_by_id = Column(Boolean, default=False, comment='是否允許通過頻道ID直接加入')
 
+    # 最後配發的訊息序號（見 ChatMessage.channel_seq）
+    message_seq = Column(Integer, default=0, nullable=False, server_default='0', comment='最後配發的訊息序號')
+
     def __repr__(self):
         return f'<ChatChannel {self.id}: {self.name}>'
 
@@ -340,3 +388,33 @@ class ChatChannel(AuditMixin, Model):
             .filter_by(channel_id=self.id, status='active').scalar()
         db.session.commit()
 
+
+
+class RevokedToken(Model):
+    """
+    已撤銷的 JWT（登出、refresh token 更新）
+    各 worker 啟動時載入尚未到期的 jti（見 token_revocation.RevocationList），到期後的資料可刪除
+    """
+    __tablename__ = 'revoked_tokens'
+
+    id = Column(Integer, primary_key=True)
+
+    # token 的 jti
+    jti = Column(String(64), nullable=False, unique=True, comment='token 的 jti')
+
+    # token 種類 (access, refresh)
+    token_type = Column(String(20), nullable=False, default='access', comment='token 種類')
+
+    user_id = Column(Integer, ForeignKey('ab_user.id'), nullable=True)
+
+    # token 的到期時間 (UTC)，之後不需要再保存
+    expires_at = Column(DateTime, nullable=False, comment='token 到期時間')
+
+    revoked_on = Column(DateTime, default=datetime.datetime.utcnow, comment='撤銷時間')
+
+    __table_args__ = (
+        Index('idx_revoked_tokens_expires_at', 'expires_at'),
+    )
+
+    def __repr__(self):
+        return f'<RevokedToken {self.jti} ({self.token_type})>'
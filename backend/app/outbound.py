@@ -0,0 +1,264 @@
+"""
+每個連線的有上限發送佇列（慢速客戶端背壓）
+Engine.IO 為每個連線建立一個無上限的發送佇列，網路很慢的客戶端會讓伺服器無限制地累積封包。
+這裡以 OutboundQueue 包裝該佇列：
+- 佇列深度低於 soft_limit 時直接放入，不做任何解析
+- 超過 soft_limit 時依事件的策略處理低優先事件：
+  'coalesce' 同一 key 只保留最新一筆，待佇列消化後再送出（完整狀態類事件，例如 typing_state）
+  'drop'     直接丟棄（可由客戶端自行修復的事件，例如 presence_delta 有序號缺口偵測）
+- 超過 hard_limit 時依 overflow 策略中斷該連線（'disconnect'）或丟棄封包（'drop'）
+二進位事件（msgpack 連線）由事件封包與其後的附件封包組成，附件一律跟隨事件封包一起放入、丟棄或合併
+"""
+
+import json
+import threading
+import weakref
+
+from engineio import packet as eio_packet
+
+from . import wire_format
+from .logging_config import get_logger
+
+logger = get_logger(__name__)
+
+POLICY_COALESCE = 'coalesce'
+POLICY_DROP = 'drop'
+OVERFLOW_DISCONNECT = 'disconnect'
+OVERFLOW_DROP = 'drop'
+
+
+def event_name(pkt):
+    """
+    取得 Socket.IO EVENT / BINARY_EVENT 封包的事件名稱
+    （例如 '2["new_message",{...}]' 或 '51-["new_message",{"_placeholder":true,"num":0}]'），其他封包回傳 None
+    """
+    if pkt is None or pkt.packet_type != eio_packet.MESSAGE:
+        return None
+    data = pkt.data
+    if not isinstance(data, str) or data[:1] not in ('2', '5'):
+        return None
+    start = data.find('["')
+    if start < 0:
+        return None
+    end = data.find('"', start + 2)
+    return data[start + 2:end] if end > 0 else None
+
+
+def binary_attachments(pkt):
+    """二進位事件封包之後跟著的附件封包數，其他封包回傳 0"""
+    if pkt is None:
+        return 0
+    data = pkt.data
+    if not isinstance(data, str) or not data.startswith('5'):
+        return 0
+    try:
+        return int(data[1:data.index('-')])
+    except ValueError:
+        return 0
+
+
+def coalesce_key(event, pkt, attachments=()):
+    """同一 key 的事件只保留最新一筆；頻道類事件以頻道區分"""
+    try:
+        payload = json.loads(pkt.data[pkt.data.index('['):])[1]
+        if isinstance(payload, dict) and payload.get('_placeholder') and attachments:
+            payload = wire_format.decode(attachments[payload.get('num', 0)].data)
+        channel_id = payload.get('channel_id') if isinstance(payload, dict) else None
+    except Exception:
+        channel_id = None
+    return event, channel_id
+
+
+class OutboundStats:
+    """所有發送佇列共用的統計"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._queues = weakref.WeakSet()
+        self.dropped = {}
+        self.coalesced = 0
+        self.overflows = 0
+        self.max_depth = 0
+
+    def register(self, queue):
+        with self._lock:
+            self._queues.add(queue)
+
+    def record_drop(self, event):
+        with self._lock:
+            self.dropped[event] = self.dropped.get(event, 0) + 1
+
+    def record_coalesce(self):
+        with self._lock:
+            self.coalesced += 1
+
+    def record_overflow(self):
+        with self._lock:
+            self.overflows += 1
+
+    def record_depth(self, depth):
+        if depth > self.max_depth:
+            self.max_depth = depth
+
+    def snapshot(self):
+        with self._lock:
+            queues = list(self._queues)
+            dropped = dict(self.dropped)
+        depths = sorted(q.depth for q in queues)
+        return {
+            'queues': len(depths),
+            'depth_max': depths[-1] if depths else 0,
+            'depth_p50': depths[len(depths) // 2] if depths else 0,
+            'depth_p99': depths[int(len(depths) * 0.99)] if depths else 0,
+            'congested': sum(1 for q in queues if q.congested),
+            'max_depth_seen': self.max_depth,
+            'dropped': dropped,
+            'dropped_total': sum(dropped.values()),
+            'coalesced': self.coalesced,
+            'overflows': self.overflows
+        }
+
+
+class OutboundQueue:
+    """
+    包裝 Engine.IO 連線的發送佇列，提供與原佇列相同的 put/get/task_done/join 介面
+    @param queue: 原本的佇列（依 async_mode 為 queue.Queue / eventlet / gevent 佇列）
+    @param on_overflow: 超過 hard_limit 且策略為 'disconnect' 時的回呼 on_overflow(queue)
+    """
+
+    def __init__(self, queue, soft_limit, hard_limit, policies, overflow, stats, on_overflow=None):
+        self._queue = queue
+        self.soft_limit = soft_limit
+        self.hard_limit = hard_limit
+        self.policies = policies
+        self.overflow = overflow
+        self.stats = stats
+        self.on_overflow = on_overflow
+        self._lock = threading.Lock()
+        self._deferred = {}
+        self._overflowed = False
+        # 尚未放入的二進位附件數，與其處理方式（None 直接放入、POLICY_DROP 丟棄、list 收集後合併）
+        self._attachments = 0
+        self._attachment_action = None
+        self._attachment_event = None
+
+    @property
+    def depth(self):
+        return self._queue.qsize()
+
+    @property
+    def congested(self):
+        return bool(self._deferred) or self.depth >= self.soft_limit
+
+    def put(self, item, *args, **kwargs):
+        if self._attachments:
+            return self._put_attachment(item, *args, **kwargs)
+        self._attachments = binary_attachments(item)
+        self._attachment_action = None
+        depth = self._queue.qsize()
+        if item is None or depth < self.soft_limit:
+            return self._queue.put(item, *args, **kwargs)
+        self.stats.record_depth(depth)
+        # 只有非 EVENT 的控制封包（PING/NOOP/CLOSE）不受限制
+        event = event_name(item)
+        if event is None and item.packet_type != eio_packet.MESSAGE:
+            return self._queue.put(item, *args, **kwargs)
+        policy = self.policies.get(event)
+        if policy == POLICY_DROP:
+            self.stats.record_drop(event)
+            self._attachment_action = POLICY_DROP
+            return
+        if policy == POLICY_COALESCE:
+            if self._attachments:
+                self._attachment_action = [item]
+                self._attachment_event = event
+            else:
+                self._defer(event, [item])
+            return
+        if depth >= self.hard_limit:
+            self.stats.record_drop(event)
+            self._attachment_action = POLICY_DROP
+            if self.overflow == OVERFLOW_DISCONNECT and not self._overflowed:
+                self._overflowed = True
+                self.stats.record_overflow()
+                if self.on_overflow:
+                    self.on_overflow(self)
+            return
+        return self._queue.put(item, *args, **kwargs)
+
+    def _put_attachment(self, item, *args, **kwargs):
+        """二進位附件跟隨其事件封包的處理方式"""
+        self._attachments -= 1
+        action = self._attachment_action
+        if action is None:
+            return self._queue.put(item, *args, **kwargs)
+        if action is POLICY_DROP:
+            return
+        action.append(item)
+        if not self._attachments:
+            self._defer(self._attachment_event, action)
+
+    def _defer(self, event, packets):
+        with self._lock:
+            key = coalesce_key(event, packets[0], packets[1:])
+            if key in self._deferred:
+                self.stats.record_coalesce()
+            self._deferred[key] = packets
+
+    def get(self, *args, **kwargs):
+        item = self._queue.get(*args, **kwargs)
+        # 佇列消化到 soft_limit 的一半以下時送出延後的完整狀態事件
+        if self._deferred and self._queue.qsize() <= self.soft_limit // 2:
+            with self._lock:
+                deferred, self._deferred = self._deferred, {}
+            for packets in deferred.values():
+                for pkt in packets:
+                    self._queue.put(pkt)
+        return item
+
+    def task_done(self):
+        return self._queue.task_done()
+
+    def join(self):
+        return self._queue.join()
+
+    def qsize(self):
+        return self._queue.qsize()
+
+    def empty(self):
+        return self._queue.empty()
+
+
+def install_outbound_queues(eio, soft_limit=100, hard_limit=1000, policies=None,
+                            overflow=OVERFLOW_DISCONNECT):
+    """
+    讓 Engine.IO 伺服器之後建立的每個連線都使用 OutboundQueue
+    @param eio: engineio.Server（socketio.server.eio）
+    @return: OutboundStats
+    """
+    stats = OutboundStats()
+    create_queue = eio.create_queue
+
+    def disconnect_slow_consumer(queue):
+        # 由發送端執行緒呼叫，實際中斷交給背景任務，避免在 emit 中同步關閉連線
+        for eio_sid, eio_socket in list(eio.sockets.items()):
+            if eio_socket.queue is queue:
+                logger.warning('發送佇列已滿，中斷慢速客戶端', sample='socket.slow_consumer', eio_sid=eio_sid, depth=queue.depth)
+                eio.start_background_task(eio.disconnect, eio_sid)
+                return
+
+    def create_outbound_queue(*args, **kwargs):
+        queue = OutboundQueue(
+            create_queue(*args, **kwargs),
+            soft_limit=soft_limit,
+            hard_limit=hard_limit,
+            policies=policies or {},
+            overflow=overflow,
+            stats=stats,
+            on_overflow=disconnect_slow_consumer
+        )
+        stats.register(queue)
+        return queue
+
+    eio.create_queue = create_outbound_queue
+    return stats
@@ -0,0 +1,231 @@
+"""
+密碼雜湊服務
+使用者密碼（werkzeug，與 Flask-AppBuilder 相同的格式）與頻道密碼（bcrypt）的雜湊與驗證都經過這裡：
+
+- 同時進行的雜湊數有上限（PASSWORD_HASH_WORKERS），eventlet / gevent 模式下交給原生執行緒，
+  登入高峰不會卡住同一程序中的 Socket 事件
+- 等待中的工作數（PASSWORD_HASH_MAX_PENDING）與每個來源 IP 同時進行的工作數（PASSWORD_HASH_PER_CLIENT）有上限，
+  超過時拋出 PasswordHashingBusy，API 以 429 回應並附上 Retry-After
+- 成本參數可設定（FAB_PASSWORD_HASH_METHOD、CHANNEL_PASSWORD_BCRYPT_ROUNDS），
+  驗證成功時 needs_rehash() 判斷既有雜湊是否使用舊參數，呼叫端以新參數重新雜湊
+"""
+
+import re
+import threading
+import time
+
+from flask import has_request_context, jsonify, request
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from .async_workers import BlockingExecutor
+from .logging_config import get_logger
+
+logger = get_logger(__name__)
+
+try:
+    import bcrypt
+    HAS_BCRYPT = True
+except ImportError:
+    bcrypt = None
+    HAS_BCRYPT = False
+
+# bcrypt 雜湊：$2b$<rounds>$<22 字元 salt><31 字元雜湊>
+BCRYPT_HASH = re.compile(r'^\$2[abxy]?\$(\d{2})\$[./A-Za-z0-9]{53}$')
+
+
+class PasswordHashingBusy(Exception):
+    """雜湊工作已滿（整體或同一來源），稍後再試"""
+
+    def __init__(self, message, retry_after=1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def password_busy_response(error):
+    """PasswordHashingBusy 的 API 回應"""
+    response = jsonify({'message': str(error), 'retry_after': error.retry_after})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response
+
+
+class PasswordHasher:
+    """
+    @param executor: 執行雜湊的 BlockingExecutor（threading 模式下在呼叫端執行緒執行）
+    @param max_workers: 同時進行的雜湊數
+    @param max_pending: 等待中的雜湊數上限
+    @param per_client: 每個來源 IP 同時進行（含等待）的雜湊數上限，0 表示不限制
+    @param method: werkzeug 的雜湊方法與參數，例如 'scrypt' 或 'pbkdf2:sha256:600000'
+    @param bcrypt_rounds: 頻道密碼的 bcrypt 成本
+    """
+
+    def __init__(self, executor=None, max_workers=2, max_pending=32, per_client=2,
+                 method='scrypt', salt_length=16, bcrypt_rounds=12):
+        self._lock = threading.Lock()
+        self.configure(executor, max_workers, max_pending, per_client, method, salt_length, bcrypt_rounds)
+
+    def configure(self, executor=None, max_workers=2, max_pending=32, per_client=2,
+                  method='scrypt', salt_length=16, bcrypt_rounds=12):
+        self.executor = executor
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.per_client = per_client
+        self.method = method
+        self.salt_length = salt_length
+        self.bcrypt_rounds = bcrypt_rounds
+        self._method_prefix = None
+        self._slots = threading.BoundedSemaphore(max_workers)
+        self._in_flight = 0
+        self._clients = {}
+        # 統計
+        self.hashes = 0
+        self.verifies = 0
+        self.rehashes = 0
+        self.rejected = 0
+        self.rejected_client = 0
+        self.seconds = 0.0
+        self.wait_seconds = 0.0
+
+    def _client(self):
+        # 反向代理後方須設定 TRUSTED_PROXIES，remote_addr 才是實際的客戶端（見 app/__init__.py 的 ProxyFix）
+        if has_request_context():
+            return request.remote_addr
+        return None
+
+    def _run(self, fn, *args):
+        client = self._client()
+        with self._lock:
+            if self._in_flight >= self.max_workers + self.max_pending:
+                self.rejected += 1
+                logger.warning('密碼雜湊工作已滿', sample='password.busy', in_flight=self._in_flight)
+                raise PasswordHashingBusy('伺服器忙碌中，請稍後再試', self._retry_after())
+            if client is not None and self.per_client and self._clients.get(client, 0) >= self.per_client:
+                self.rejected_client += 1
+                logger.info('來源的密碼雜湊請求過多', sample='password.client_busy', client=client)
+                raise PasswordHashingBusy('請求過於頻繁，請稍後再試', self._retry_after())
+            self._in_flight += 1
+            if client is not None:
+                self._clients[client] = self._clients.get(client, 0) + 1
+
+        queued = time.perf_counter()
+        try:
+            with self._slots:
+                start = time.perf_counter()
+                result = self.executor.run(fn, *args) if self.executor else fn(*args)
+                with self._lock:
+                    self.wait_seconds += start - queued
+                    self.seconds += time.perf_counter() - start
+                return result
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+                if client is not None:
+                    remaining = self._clients[client] - 1
+                    if remaining:
+                        self._clients[client] = remaining
+                    else:
+                        del self._clients[client]
+
+    def _retry_after(self):
+        """依目前的佇列長度與平均耗時估計重試秒數（至少 1 秒）"""
+        calls = self.hashes + self.verifies
+        average = self.seconds / calls if calls else 0.1
+        return max(1, round(average * self._in_flight / self.max_workers))
+
+    # 使用者密碼（werkzeug）
+
+    def hash_password(self, password):
+        self.hashes += 1
+        return self._run(generate_password_hash, password, self.method, self.salt_length)
+
+    def verify_password(self, pwhash, password):
+        self.verifies += 1
+        return self._run(check_password_hash, pwhash, password)
+
+    def needs_rehash(self, pwhash):
+        """雜湊的方法或成本參數與目前設定不同"""
+        if self._method_prefix is None:
+            # 'scrypt' 之類未指定參數的設定，以實際產生的前綴（例如 'scrypt:32768:8:1'）比較
+            self._method_prefix = generate_password_hash('', self.method, 1).split('$', 1)[0]
+        return pwhash.split('$', 1)[0] != self._method_prefix
+
+    def rehash_password(self, pwhash, password):
+        """驗證成功後呼叫：既有雜湊使用舊參數時回傳以目前設定產生的新雜湊，否則回傳 None"""
+        if not self.needs_rehash(pwhash):
+            return None
+        self.rehashes += 1
+        return self.hash_password(password)
+
+    # 頻道密碼（bcrypt）
+
+    def hash_channel_password(self, password):
+        self.hashes += 1
+        return self._run(_bcrypt_hash, password, self.bcrypt_rounds)
+
+    def verify_channel_password(self, pwhash, password):
+        self.verifies += 1
+        return self._run(_bcrypt_check, pwhash, password)
+
+    def channel_password_needs_rehash(self, pwhash):
+        match = BCRYPT_HASH.match(pwhash or '')
+        return bool(match) and int(match.group(1)) != self.bcrypt_rounds
+
+    def rehash_channel_password(self, pwhash, password):
+        """同 rehash_password，用於頻道密碼"""
+        if not self.channel_password_needs_rehash(pwhash):
+            return None
+        self.rehashes += 1
+        return self.hash_channel_password(password)
+
+    @staticmethod
+    def is_channel_hash(value):
+        return bool(BCRYPT_HASH.match(value or ''))
+
+    def stats(self):
+        with self._lock:
+            calls = self.hashes + self.verifies
+            return {
+                'max_workers': self.max_workers,
+                'in_flight': self._in_flight,
+                'clients': len(self._clients),
+                'hashes': self.hashes,
+                'verifies': self.verifies,
+                'rehashes': self.rehashes,
+                'rejected': self.rejected,
+                'rejected_client': self.rejected_client,
+                'avg_ms': round(self.seconds / calls * 1000, 3) if calls else 0,
+                'avg_wait_ms': round(self.wait_seconds / calls * 1000, 3) if calls else 0
+            }
+
+
+def _bcrypt_hash(password, rounds):
+    if not HAS_BCRYPT:
+        raise RuntimeError('bcrypt 未安裝，無法設定頻道密碼')
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds)).decode('utf-8')
+
+
+def _bcrypt_check(pwhash, password):
+    if not HAS_BCRYPT:
+        raise RuntimeError('bcrypt 未安裝，無法驗證頻道密碼')
+    return bcrypt.checkpw(password.encode('utf-8'), pwhash.encode('utf-8'))
+
+
+password_hasher = PasswordHasher()
+
+
+def configure_password_hashing(config):
+    """依 config 設定 password_hasher（app 初始化時呼叫）"""
+    workers = config.get('PASSWORD_HASH_WORKERS', 2)
+    # eventlet 模式下與 Socket 資料庫執行器共用 tpool（執行緒數由 SOCKETIO_DB_WORKERS 決定），
+    # 雜湊只以 _slots 限制最多佔用 PASSWORD_HASH_WORKERS 條執行緒，不改變 tpool 的大小
+    password_hasher.configure(
+        executor=BlockingExecutor(None, None, async_mode=config.get('SOCKETIO_ASYNC_MODE', 'threading'),
+                                  max_workers=workers, resize_pool=False),
+        max_workers=workers,
+        max_pending=config.get('PASSWORD_HASH_MAX_PENDING', 32),
+        per_client=config.get('PASSWORD_HASH_PER_CLIENT', 2),
+        method=config.get('FAB_PASSWORD_HASH_METHOD', 'scrypt'),
+        salt_length=config.get('FAB_PASSWORD_HASH_SALT_LENGTH', 16),
+        bcrypt_rounds=config.get('CHANNEL_PASSWORD_BCRYPT_ROUNDS', 12)
+    )
+    return password_hasher
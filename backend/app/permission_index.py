@@ -0,0 +1,100 @@
+"""
+角色權限索引
+Flask-AppBuilder 每次 has_access 都以 join 查詢角色是否擁有 (權限, 視圖)，頁面選單每個項目各查一次。
+這裡把所有角色的權限一次載入記憶體：role id -> frozenset((權限名稱, 視圖名稱))，
+之後的權限與管理員檢查都是集合查詢，不存取資料庫
+
+- 角色、權限變更時 invalidate() 遞增版本，下一次查詢時重新載入（多 worker 時經由訊息佇列通知）
+- 索引只處理資料庫中的角色；Flask-AppBuilder 的內建角色（FAB_ROLES）仍由 Flask-AppBuilder 判斷
+"""
+
+import threading
+import time
+
+
+class PermissionIndex:
+    """
+    @param loader: 回傳 (role_id, role_name, permission_name, view_name) 列的函式；
+                   沒有任何權限的角色以 permission_name / view_name 為 None 的列表示
+    @param admin_role: 管理員角色名稱
+    """
+
+    def __init__(self, loader, admin_role='Admin'):
+        self._loader = loader
+        self.admin_role = admin_role
+        self._lock = threading.Lock()
+        self.version = 0
+        self._built_version = None
+        self._permissions = {}
+        self._role_names = {}
+        self._admin_role_ids = frozenset()
+        # 統計
+        self.builds = 0
+        self.build_seconds = 0.0
+        self.lookups = 0
+
+    def invalidate(self):
+        """角色或權限變更，下一次查詢時重新載入"""
+        with self._lock:
+            self.version += 1
+
+    def load(self):
+        """載入索引（版本未變更時不重新載入）"""
+        if self._built_version == self.version:
+            return
+        with self._lock:
+            version = self.version
+            if self._built_version == version:
+                return
+            start = time.perf_counter()
+            permissions = {}
+            role_names = {}
+            for role_id, role_name, permission_name, view_name in self._loader():
+                role_names[role_id] = role_name
+                pairs = permissions.setdefault(role_id, set())
+                if permission_name is not None and view_name is not None:
+                    pairs.add((permission_name, view_name))
+            self._permissions = {role_id: frozenset(pairs) for role_id, pairs in permissions.items()}
+            self._role_names = role_names
+            self._admin_role_ids = frozenset(
+                role_id for role_id, name in role_names.items() if name == self.admin_role
+            )
+            self._built_version = version
+            self.builds += 1
+            self.build_seconds += time.perf_counter() - start
+
+    def has(self, role_ids, permission_name, view_name):
+        """任一角色擁有 (permission_name, view_name)"""
+        self.load()
+        self.lookups += 1
+        key = (permission_name, view_name)
+        permissions = self._permissions
+        return any(key in permissions.get(role_id, ()) for role_id in role_ids)
+
+    def view_menus(self, role_ids, permission_name):
+        """角色擁有 permission_name 的所有視圖名稱（頁面選單使用）"""
+        self.load()
+        self.lookups += 1
+        permissions = self._permissions
+        return {
+            view_name
+            for role_id in role_ids
+            for name, view_name in permissions.get(role_id, ())
+            if name == permission_name
+        }
+
+    def is_admin(self, role_ids):
+        self.load()
+        self.lookups += 1
+        return not self._admin_role_ids.isdisjoint(role_ids)
+
+    def stats(self):
+        self.load()
+        return {
+            'version': self.version,
+            'roles': len(self._permissions),
+            'permissions': sum(len(pairs) for pairs in self._permissions.values()),
+            'builds': self.builds,
+            'avg_build_ms': round(self.build_seconds / self.builds * 1000, 3) if self.builds else 0,
+            'lookups': self.lookups
+        }
@@ -0,0 +1,316 @@
+"""
+線上使用者註冊表
+以 sid 與 user_id 雙重索引維護 Socket 連線，連線/斷線皆為 O(1)，
+去重後的線上列表由索引直接產生，不需掃描所有連線
+
+線上列表採版本化同步：
+- 快照 (seq, users)：新連線或客戶端偵測到序號缺口時才發送
+- 增量 (seq, joined, left)：時間窗內的上線/離線變更合併為一筆
+
+多 worker 部署時，其他 worker 的線上使用者以 host_id 分開記錄（見 message_queue.PresenceSync），
+快照、增量與上線判斷皆以所有 worker 合併後的結果為準
+"""
+
+import threading
+from datetime import datetime
+
+
+class Connection:
+    """
+    單一 Socket 連線的精簡記錄，同時作為該連線的認證 session
+    連線時建立一次，之後所有 Socket 事件直接使用，不再查詢 User
+    """
+    __slots__ = ('sid', 'user_id', 'username', 'display_name', 'roles', 'connected_at', 'entry', 'wire')
+
+    def __init__(self, sid, user_id, username, display_name, roles=(), connected_at=None, wire='json'):
+        self.sid = sid
+        self.user_id = user_id
+        self.username = username
+        self.display_name = display_name
+        self.roles = frozenset(roles)
+        # 連線時協商的傳輸格式（'json' 或 'msgpack'）
+        self.wire = wire
+        self.connected_at = connected_at or datetime.now().isoformat()
+        # 線上列表項目只在建立連線時產生一次，快照直接共用
+        self.entry = self.to_dict()
+
+    @property
+    def id(self):
+        """稽核身分：設為 g.user 時，AuditMixin 透過 g.user.id 取得 user_id"""
+        return self.user_id
+
+    def has_role(self, role_name):
+        return role_name in self.roles
+
+    def to_dict(self):
+        """轉換為線上列表使用的字典格式"""
+        return {
+            'user_id': self.user_id,
+            'username': self.username,
+            'display_name': self.display_name,
+            'connected_at': self.connected_at
+        }
+
+    def __repr__(self):
+        return f'<Connection {self.sid}: {self.username} ({self.user_id})>'
+
+
+class PresenceRegistry:
+    """
+    線上使用者註冊表
+    - _connections: sid -> Connection
+    - _user_sids: user_id -> set(sid)
+    - _users: user_id -> 線上列表項目（去重後的全域線上列表，隨連線變更即時維護）
+    - _joined / _left: 尚未送出的上線/離線變更，由 drain_delta() 合併取出
+    - _remote: host_id -> {user_id: 線上列表項目}，其他 worker 的線上使用者
+    - _remote_hosts: user_id -> 該使用者在線的其他 worker 數
+    - _local_joined / _local_left: 本機尚未發佈給其他 worker 的變更（track_local_changes 為 True 時記錄）
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._connections = {}
+        self._user_sids = {}
+        self._users = {}
+        self._snapshot = None
+        self._seq = 0
+        self._joined = {}
+        self._left = set()
+        self._remote = {}
+        self._remote_hosts = {}
+        self.track_local_changes = False
+        self._local_joined = {}
+        self._local_left = set()
+
+    def add(self, sid, user_id, username, display_name, roles=(), wire='json'):
+        """
+        登記新連線
+        @return: (connection, is_first) is_first 表示該使用者原本不在線（包含其他 worker）
+        """
+        connection = Connection(sid, user_id, username, display_name, roles, wire=wire)
+        with self._lock:
+            old = self._connections.pop(sid, None)
+            if old is not None:
+                self._discard(old)
+            self._connections[sid] = connection
+            sids = self._user_sids.get(user_id)
+            is_local_first = not sids
+            if is_local_first:
+                sids = self._user_sids[user_id] = set()
+            sids.add(sid)
+            is_first = is_local_first and user_id not in self._remote_hosts
+            # 線上列表以該使用者最新的連線資訊為準
+            self._users[user_id] = connection.entry
+            self._snapshot = None
+            if is_first:
+                self._left.discard(user_id)
+                self._joined[user_id] = connection.entry
+            if is_local_first and self.track_local_changes:
+                self._local_left.discard(user_id)
+                self._local_joined[user_id] = connection.entry
+        return connection, is_first
+
+    def remove(self, sid):
+        """
+        移除連線
+        @return: (connection, is_last) 找不到 sid 時 connection 為 None；
+                 is_last 表示該使用者已沒有其他連線（包含其他 worker）
+        """
+        with self._lock:
+            connection = self._connections.pop(sid, None)
+            if connection is None:
+                return None, False
+            is_last = self._discard(connection)
+            self._snapshot = None
+        return connection, is_last
+
+    def _discard(self, connection):
+        """從 user_id 索引移除連線（呼叫端需持有鎖），回傳是否為全域最後一個連線"""
+        user_id = connection.user_id
+        sids = self._user_sids.get(user_id)
+        if sids is None:
+            return user_id not in self._remote_hosts
+        sids.discard(connection.sid)
+        if sids:
+            # 若快照項目屬於被移除的連線，改用該使用者其他仍在線的連線
+            if self._users.get(user_id) is connection.entry:
+                self._users[user_id] = self._connections[next(iter(sids))].entry
+            return False
+        del self._user_sids[user_id]
+        if self.track_local_changes:
+            self._local_joined.pop(user_id, None)
+            self._local_left.add(user_id)
+        if user_id in self._remote_hosts:
+            # 使用者仍在其他 worker 上線
+            self._users[user_id] = self._any_remote_entry(user_id)
+            return False
+        self._set_offline(user_id)
+        return True
+
+    def _set_offline(self, user_id):
+        """使用者在所有 worker 皆已離線（呼叫端需持有鎖）"""
+        self._users.pop(user_id, None)
+        # 同一時間窗內先上線又離線時，仍送出 left 讓已取得快照的客戶端移除
+        self._joined.pop(user_id, None)
+        self._left.add(user_id)
+
+    def _any_remote_entry(self, user_id):
+        for users in self._remote.values():
+            entry = users.get(user_id)
+            if entry is not None:
+                return entry
+        return None
+
+    def _remote_add(self, host_id, entry):
+        """記錄其他 worker 上線的使用者（呼叫端需持有鎖）"""
+        user_id = entry['user_id']
+        users = self._remote.setdefault(host_id, {})
+        known = user_id in users
+        users[user_id] = entry
+        if known:
+            return
+        self._remote_hosts[user_id] = self._remote_hosts.get(user_id, 0) + 1
+        if user_id not in self._users:
+            self._users[user_id] = entry
+            self._left.discard(user_id)
+            self._joined[user_id] = entry
+            self._snapshot = None
+
+    def _remote_remove(self, host_id, user_id):
+        """移除其他 worker 離線的使用者（呼叫端需持有鎖）"""
+        users = self._remote.get(host_id)
+        if not users or user_id not in users:
+            return
+        entry = users.pop(user_id)
+        count = self._remote_hosts[user_id] - 1
+        if count:
+            self._remote_hosts[user_id] = count
+        else:
+            del self._remote_hosts[user_id]
+        if user_id in self._user_sids:
+            return
+        if count:
+            if self._users.get(user_id) is entry:
+                self._users[user_id] = self._any_remote_entry(user_id)
+                self._snapshot = None
+        else:
+            self._set_offline(user_id)
+            self._snapshot = None
+
+    def apply_remote(self, host_id, joined, left):
+        """套用其他 worker 發佈的上線/離線增量"""
+        with self._lock:
+            for user_id in left:
+                self._remote_remove(host_id, user_id)
+            for entry in joined:
+                self._remote_add(host_id, entry)
+
+    def replace_remote(self, host_id, users):
+        """以其他 worker 發佈的完整狀態取代該 worker 的記錄"""
+        with self._lock:
+            current = self._remote.get(host_id, {})
+            incoming = {entry['user_id'] for entry in users}
+            for user_id in [uid for uid in current if uid not in incoming]:
+                self._remote_remove(host_id, user_id)
+            for entry in users:
+                self._remote_add(host_id, entry)
+
+    def drop_remote(self, host_id):
+        """移除已結束或失聯的 worker 上所有的使用者"""
+        with self._lock:
+            for user_id in list(self._remote.get(host_id, ())):
+                self._remote_remove(host_id, user_id)
+            self._remote.pop(host_id, None)
+
+    def local_state(self):
+        """本機在線使用者的線上列表項目（發佈給其他 worker 的完整狀態）"""
+        with self._lock:
+            return [self._connections[next(iter(sids))].entry for sids in self._user_sids.values()]
+
+    def drain_local_changes(self):
+        """
+        取出尚未發佈給其他 worker 的本機變更
+        @return: (joined 項目列表, left user_id 列表)，沒有變更時回傳 None
+        """
+        with self._lock:
+            if not self._local_joined and not self._local_left:
+                return None
+            changes = (list(self._local_joined.values()), list(self._local_left))
+            self._local_joined = {}
+            self._local_left = set()
+        return changes
+
+    def get(self, sid):
+        """依 sid 取得連線記錄"""
+        return self._connections.get(sid)
+
+    def sids_for_user(self, user_id):
+        """取得使用者在本機的所有連線 sid"""
+        with self._lock:
+            return frozenset(self._user_sids.get(user_id, ()))
+
+    def is_online(self, user_id):
+        return user_id in self._users
+
+    def snapshot(self):
+        """
+        取得去重後的線上使用者列表
+        列表在連線變更時才重建，同一版本的多次呼叫共用同一份結果
+        """
+        snapshot = self._snapshot
+        if snapshot is None:
+            with self._lock:
+                snapshot = self._snapshot
+                if snapshot is None:
+                    snapshot = self._snapshot = list(self._users.values())
+        return snapshot
+
+    def snapshot_state(self):
+        """
+        取得版本化快照
+        @return: {'seq': 最近一次送出的增量序號, 'users': 線上列表}
+        快照可能已包含尚未送出的變更；增量事件為冪等的集合操作，重複套用不影響結果
+        """
+        with self._lock:
+            seq = self._seq
+        return {'seq': seq, 'users': self.snapshot()}
+
+    def drain_delta(self):
+        """
+        取出時間窗內累積的上線/離線變更並遞增序號
+        @return: {'seq', 'joined': [線上列表項目], 'left': [user_id]}，沒有變更時回傳 None
+        """
+        with self._lock:
+            if not self._joined and not self._left:
+                return None
+            self._seq += 1
+            delta = {
+                'seq': self._seq,
+                'joined': list(self._joined.values()),
+                'left': list(self._left)
+            }
+            self._joined = {}
+            self._left = set()
+        return delta
+
+    @property
+    def seq(self):
+        return self._seq
+
+    @property
+    def connection_count(self):
+        return len(self._connections)
+
+    @property
+    def user_count(self):
+        return len(self._users)
+
+    @property
+    def remote_host_count(self):
+        return len(self._remote)
+
+    def __contains__(self, sid):
+        return sid in self._connections
+
+    def __len__(self):
+        return len(self._connections)
@@ -0,0 +1,156 @@
+"""
+線上狀態批次寫入 (write-behind)
+線上狀態以記憶體中的 PresenceRegistry 為準，連線/斷線只記錄待寫入的變更，
+由背景執行緒定期以集合式 UPDATE ... WHERE user_id IN (...) 寫入 user_profiles，
+重連風暴時不再讓每個 Socket 連線各自等待 SQLite 的寫入鎖
+"""
+
+import logging
+import threading
+from datetime import datetime, timezone
+
+from sqlalchemy import case, select
+
+logger = logging.getLogger(__name__)
+
+
+class PresenceFlusher:
+    """
+    定期將上線/離線變更批次寫入 user_profiles
+    同一使用者在一個間隔內多次上線/離線只保留最後的狀態
+    @param table: user_profiles 的 SQLAlchemy Table
+    @param interval: 寫入間隔（秒）
+    @param run_blocking: 執行阻塞資料庫呼叫的函式 run_blocking(fn, *args)
+    """
+
+    def __init__(self, table, interval=1.0, run_blocking=None):
+        self.table = table
+        self.interval = interval
+        self._run_blocking = run_blocking or (lambda fn, *args: fn(*args))
+        self._engine = None
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._wakeup = threading.Event()
+        self._stopping = False
+        self._thread = None
+        self._start_lock = threading.Lock()
+        # 統計
+        self.flushes = 0
+        self.rows = 0
+        self.inserted = 0
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, engine):
+        with self._start_lock:
+            if self.running:
+                return
+            self._engine = engine
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name='presence-flusher', daemon=True)
+            self._thread.start()
+
+    def mark_online(self, user_id, display_name=None):
+        with self._lock:
+            self._pending[user_id] = (True, datetime.now(timezone.utc), display_name)
+
+    def mark_offline(self, user_id):
+        with self._lock:
+            self._pending[user_id] = (False, datetime.now(timezone.utc), None)
+
+    def stop(self, flush=True, timeout=5.0):
+        """停止寫入執行緒；flush=True 時先寫入尚未寫入的變更"""
+        if not self.running:
+            return
+        self._stopping = True
+        self._wakeup.set()
+        self._thread.join(timeout)
+        if flush:
+            self.flush()
+
+    def _run(self):
+        while not self._stopping:
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("批次寫入線上狀態失敗")
+
+    def flush(self):
+        """立即寫入目前累積的變更，回傳寫入的使用者數"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+        try:
+            self._run_blocking(self._write, pending)
+        except Exception:
+            # 寫入失敗時放回佇列，較新的變更優先
+            with self._lock:
+                for user_id, change in pending.items():
+                    self._pending.setdefault(user_id, change)
+            raise
+        self.flushes += 1
+        self.rows += len(pending)
+        return len(pending)
+
+    def _write(self, pending):
+        """每種狀態各一句 UPDATE，last_seen 以 CASE user_id 寫入各使用者自己最後一次變更的時間"""
+        table = self.table
+        online = [uid for uid, (is_online, _, _) in pending.items() if is_online]
+        offline = [uid for uid, (is_online, _, _) in pending.items() if not is_online]
+        now = datetime.now(timezone.utc)
+        with self._engine.begin() as conn:
+            for user_ids, is_online in ((online, True), (offline, False)):
+                if not user_ids:
+                    continue
+                last_seen = case({uid: pending[uid][1] for uid in user_ids}, value=table.c.user_id)
+                conn.execute(
+                    table.update()
+                    .where(table.c.user_id.in_(user_ids))
+                    .values(
+                        is_online=is_online,
+                        last_seen=last_seen,
+                        changed_on=now,
+                        # 稽核欄位記錄為使用者本人
+                        changed_by_fk=table.c.user_id
+                    )
+                )
+            if online:
+                self._insert_missing(conn, online, pending, now)
+
+    def _insert_missing(self, conn, user_ids, pending, now):
+        """第一次上線、尚未建立 UserProfile 的使用者直接新增"""
+        existing = set(conn.execute(
+            select(self.table.c.user_id).where(self.table.c.user_id.in_(user_ids))
+        ).scalars())
+        rows = [
+            {
+                'user_id': uid,
+                'display_name': pending[uid][2],
+                'is_online': True,
+                'last_seen': pending[uid][1],
+                'join_date': now,
+                'created_on': now,
+                'changed_on': now,
+                'created_by_fk': uid,
+                'changed_by_fk': uid
+            }
+            for uid in user_ids if uid not in existing
+        ]
+        if rows:
+            conn.execute(self.table.insert(), rows)
+            self.inserted += len(rows)
+
+    def stats(self):
+        with self._lock:
+            pending = len(self._pending)
+        return {
+            'pending': pending,
+            'flushes': self.flushes,
+            'rows': self.rows,
+            'inserted': self.inserted
+        }
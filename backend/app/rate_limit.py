@@ -0,0 +1,109 @@
+"""
+Socket 事件的 token bucket 限流
+每種事件分別設定每個連線 (sid) 與每個使用者 (user_id，合計其所有連線) 的預算：
+rate 為每秒補充的 token 數，burst 為桶的容量。每個事件消耗兩個桶各一個 token，
+任一個不足時拒絕，且兩個桶都不扣除。每次檢查為 O(1)
+"""
+
+import threading
+from collections import Counter
+import time
+
+SCOPE_SID = 'sid'
+SCOPE_USER = 'user'
+
+
+class TokenBucketLimiter:
+    """
+    @param limits: {event: {'sid': (rate, burst), 'user': (rate, burst)}}，未列出的事件不限流，
+                   rate <= 0 的範圍不限流
+    @param max_tracked_users: 統計被拒絕次數的使用者數上限，超過時只保留次數最多的一半
+    """
+
+    def __init__(self, limits, clock=time.monotonic, prune_interval=60.0, max_tracked_users=1000):
+        self.limits = {}
+        for event, scopes in (limits or {}).items():
+            rules = {scope: (float(rate), float(burst)) for scope, (rate, burst) in scopes.items() if rate > 0}
+            if rules:
+                self.limits[event] = rules
+        self.max_tracked_users = max_tracked_users
+        self._clock = clock
+        self._prune_interval = prune_interval
+        self._last_prune = clock()
+        self._lock = threading.Lock()
+        # (scope, key, event) -> [tokens, 上次補充時間]
+        self._buckets = {}
+        # 統計
+        self.allowed = {}
+        self.limited = {}
+        self.limited_users = Counter()
+
+    def check(self, event, sid, user_id, now=None):
+        """
+        檢查並扣除 token
+        @return: 0 表示允許，否則為建議的重試秒數
+        """
+        limit = self.limits.get(event)
+        if not limit:
+            return 0
+        now = self._clock() if now is None else now
+        with self._lock:
+            buckets = []
+            retry_after = 0.0
+            for scope, key in ((SCOPE_SID, sid), (SCOPE_USER, user_id)):
+                rule = limit.get(scope)
+                if rule is None or key is None:
+                    continue
+                rate, burst = rule
+                bucket = self._buckets.get((scope, key, event))
+                if bucket is None:
+                    bucket = self._buckets[(scope, key, event)] = [burst, now]
+                else:
+                    bucket[0] = min(burst, bucket[0] + (now - bucket[1]) * rate)
+                    bucket[1] = now
+                if bucket[0] < 1:
+                    retry_after = max(retry_after, (1 - bucket[0]) / rate)
+                buckets.append(bucket)
+            if retry_after:
+                self.limited[event] = self.limited.get(event, 0) + 1
+                self.limited_users[user_id] += 1
+                if len(self.limited_users) > self.max_tracked_users:
+                    self.limited_users = Counter(dict(self.limited_users.most_common(self.max_tracked_users // 2)))
+            else:
+                for bucket in buckets:
+                    bucket[0] -= 1
+                self.allowed[event] = self.allowed.get(event, 0) + 1
+            if now - self._last_prune > self._prune_interval:
+                self._last_prune = now
+                self._prune(now)
+        return retry_after
+
+    def allow(self, event, sid, user_id, now=None):
+        return self.check(event, sid, user_id, now) == 0
+
+    def forget_sid(self, sid):
+        """連線結束時移除該連線的桶"""
+        with self._lock:
+            for event in self.limits:
+                self._buckets.pop((SCOPE_SID, sid, event), None)
+
+    def _prune(self, now):
+        """移除已補滿的桶（與新建立的桶狀態相同，不需要保留）"""
+        full = []
+        for key, (tokens, updated) in self._buckets.items():
+            rate, burst = self.limits[key[2]][key[0]]
+            if tokens + (now - updated) * rate >= burst:
+                full.append(key)
+        for key in full:
+            del self._buckets[key]
+
+    def stats(self, top=10):
+        with self._lock:
+            offenders = self.limited_users.most_common(top)
+            return {
+                'buckets': len(self._buckets),
+                'allowed': dict(self.allowed),
+                'limited': dict(self.limited),
+                'limited_total': sum(self.limited.values()),
+                'top_limited_users': [{'user_id': user_id, 'limited': count} for user_id, count in offenders]
+            }
@@ -7,9 +7,13 @@ from flask_appbuilder.api import BaseApi
 from flask_appbuilder import expose
 from flask_appbuilder.security.decorators import protect
 import datetime
-from werkzeug.security import check_password_hash
+import jwt
 
-from .auth import create_jwt_token
+from .auth import create_jwt_token, create_refresh_token
+from .logging_config import get_logger
+from .password_hashing import password_hasher, PasswordHashingBusy, password_busy_response
+
+logger = get_logger(__name__)
 
 class JWTAuthApi(BaseApi):
     """
@@ -26,42 +30,43 @@ class JWTAuthApi(BaseApi):
         """
         try:
             data = request.get_json()
-            print(f"登入請求資料: {data}")
             
             if not data or 'username' not in data or 'password' not in data:
-                print("缺少必要欄位")
+                logger.info('登入失敗: 缺少必要欄位', sample='auth.login_failed')
                 return jsonify({'message': '請提供使用者名稱和密碼'}), 400
             
             username = data['username']
             password = data['password']
-            print(f"嘗試登入: username={username}")
+            logger.debug('嘗試登入', sample='auth.login', username=username)
             
             # 尋找使用者
             user = self.appbuilder.sm.find_user(username=username)
             
             if not user:
-                print(f"使用者不存在: {username}")
+                logger.info('登入失敗: 使用者不存在', sample='auth.login_failed', username=username)
                 return jsonify({'message': '使用者不存在'}), 401
             
-            print(f"找到使用者: {user.username}, is_active={user.is_active}")
+            logger.debug('找到使用者', sample='auth.login', user_id=user.id, is_active=user.is_active)
             
-            # 驗證密碼
-            if not check_password_hash(user.password, password):
-                print(f"密碼驗證失敗")
+            # 驗證密碼（在密碼雜湊工作池執行）
+            if not password_hasher.verify_password(user.password, password):
+                logger.info('登入失敗: 密碼錯誤', sample='auth.login_failed', username=username)
                 return jsonify({'message': '密碼錯誤'}), 401
             
             # 檢查使用者是否啟用
             if not user.is_active:
                 return jsonify({'message': '使用者帳號已停用'}), 401
             
-            # 創建 JWT token
-            access_token = create_jwt_token(user, current_app)
+            # 雜湊參數已變更（FAB_PASSWORD_HASH_METHOD）時，以新參數重新雜湊
+            new_hash = password_hasher.rehash_password(user.password, password)
+            if new_hash:
+                user.password = new_hash
+                self.appbuilder.sm.update_user(user)
+                logger.info('已以新的雜湊參數更新密碼', user_id=user.id)
             
             # 回傳認證資訊
             return jsonify({
-                'access_token': access_token,
-                'token_type': 'Bearer',
-                'expires_in': 7 * 24 * 60 * 60,  # 7 天（秒）
+                **self._issue_tokens(user),
                 'user': {
                     'id': user.id,
                     'username': user.username,
@@ -72,10 +77,54 @@ class JWTAuthApi(BaseApi):
                 }
             }), 200
             
+        except PasswordHashingBusy as e:
+            return password_busy_response(e)
         except Exception as e:
             current_app.logger.error(f"登入錯誤: {str(e)}")
             return jsonify({'message': '登入失敗'}), 500
     
+    def _issue_tokens(self, user):
+        """簽發 access token 與 refresh token"""
+        config = current_app.config
+        return {
+            'access_token': create_jwt_token(user, current_app),
+            'refresh_token': create_refresh_token(user, current_app),
+            'token_type': 'Bearer',
+            'expires_in': config.get('JWT_ACCESS_TOKEN_EXPIRES', 15 * 60),
+            'refresh_expires_in': config.get('JWT_REFRESH_TOKEN_EXPIRES', 7 * 24 * 60 * 60)
+        }
+    
+    @expose('/refresh', methods=['POST'])
+    def refresh(self):
+        """
+        以 refresh token 換發新的 access token 與 refresh token，舊的 refresh token 隨即撤銷
+        POST /api/v1/auth/refresh
+        """
+        data = request.get_json(silent=True) or {}
+        refresh_token = data.get('refresh_token')
+        if not refresh_token:
+            return jsonify({'message': '請提供 refresh token'}), 400
+        
+        sm = self.appbuilder.sm
+        try:
+            claims = sm.decode_token(refresh_token, token_type='refresh')
+        except jwt.InvalidTokenError as e:
+            logger.info('refresh token 無效', sample='auth.rejected', error=str(e))
+            claims = None
+        if claims is None:
+            return jsonify({'message': 'refresh token 無效或已過期'}), 401
+        
+        user = sm.get_user_by_id(claims.get('user_id'))
+        if not user or not user.is_active:
+            return jsonify({'message': '使用者不存在或已停用'}), 401
+        
+        # 每個 refresh token 只能使用一次；同時送出的第二個請求會在這裡失敗
+        if not sm.revoke_token(claims):
+            return jsonify({'message': 'refresh token 已使用'}), 401
+        
+        logger.debug('已換發 token', sample='auth.refresh', user_id=user.id)
+        return jsonify(self._issue_tokens(user)), 200
+    
     @expose('/me')
     @protect()
     def me(self):
@@ -105,6 +154,59 @@ class JWTAuthApi(BaseApi):
         except Exception as e:
             current_app.logger.error(f"取得使用者資訊錯誤: {str(e)}")
             return jsonify({'message': '取得使用者資訊失敗'}), 500
+    
+    @expose('/logout', methods=['POST'])
+    def logout(self):
+        """
+        登出：撤銷此 access token（與 body 中屬於同一使用者的 refresh_token），並移除其驗證快取
+        POST /api/v1/auth/logout
+        """
+        from flask import g
+        from flask_login import logout_user
+        
+        sm = self.appbuilder.sm
+        user = sm.request_user()
+        refresh_claims = None
+        refresh_token = (request.get_json(silent=True) or {}).get('refresh_token')
+        if refresh_token:
+            refresh_claims = self._decode(refresh_token, 'refresh')
+            # 只能撤銷自己的 refresh token，先檢查再撤銷任何 token
+            if refresh_claims is not None and (user is None or refresh_claims.get('user_id') != user.id):
+                logger.info('拒絕撤銷其他使用者的 refresh token', sample='auth.rejected',
+                               user_id=getattr(user, 'id', None), owner_id=refresh_claims.get('user_id'))
+                return jsonify({'message': '無法撤銷其他使用者的 token'}), 403
+        auth_header = request.headers.get('Authorization')
+        if auth_header and auth_header.startswith('Bearer '):
+            token = auth_header.split(' ')[1]
+            sm.token_cache.invalidate_token(token)
+            access_claims = self._decode(token, 'access')
+            if access_claims is not None:
+                sm.revoke_token(access_claims)
+        if refresh_claims is not None:
+            sm.revoke_token(refresh_claims)
+        if not (auth_header and sm.is_stateless_request()):
+            # 以 session 登入的使用者（無狀態的 JWT 請求沒有 session 可清除）
+            logout_user()
+        logger.info('使用者登出', sample='auth.logout', user_id=getattr(g.user, 'id', None))
+        return jsonify({'message': '已登出'}), 200
+    
+    def _decode(self, token, token_type):
+        """解碼要撤銷的 token，無效或已過期時回傳 None"""
+        try:
+            return self.appbuilder.sm.decode_token(token, token_type=token_type)
+        except jwt.InvalidTokenError:
+            return None
+    
+    @expose('/token-cache-stats')
+    def token_cache_stats(self):
+        """
+        已驗證 token 快取的命中率與每次認證耗時（管理員）
+        GET /api/v1/auth/token-cache-stats
+        """
+        if not self.appbuilder.sm.is_admin():
+            return jsonify({'message': '權限不足'}), 403
+        sm = self.appbuilder.sm
+        return jsonify({'result': {**sm.token_cache.stats(), 'revoked': sm.revoked_tokens.stats()}}), 200
 
 class RegisterApi(BaseApi):
     """
@@ -146,7 +248,7 @@ class RegisterApi(BaseApi):
                 last_name=data['last_name'],
                 email=data['email'],
                 role=role,
-                password=data['password']
+                hashed_password=password_hasher.hash_password(data['password'])
             )
             
             if user:
@@ -164,6 +266,8 @@ class RegisterApi(BaseApi):
             else:
                 return jsonify({'message': '註冊失敗'}), 500
                 
+        except PasswordHashingBusy as e:
+            return password_busy_response(e)
         except Exception as e:
             current_app.logger.error(f"註冊錯誤: {str(e)}")
             return jsonify({'message': '註冊失敗'}), 500
@@ -0,0 +1,211 @@
+"""
+Socket.IO 事件延遲統計
+每個事件處理函式包一層計時，依事件分別累計總耗時、資料庫耗時與送出 (emit) 耗時的直方圖，
+以及處理失敗次數。直方圖使用固定的對數刻度桶，記錄一次只是一次二分搜尋與幾個整數加法，
+可以在正式環境常駐開啟
+
+資料庫 / 送出耗時以 phase() 或 add() 歸屬到目前執行緒（eventlet/gevent 下為目前 greenlet）正在處理的事件；
+不在事件處理中（例如背景任務）的呼叫直接略過
+"""
+
+import bisect
+import functools
+import threading
+import time
+
+# 直方圖桶的上界（毫秒），最後一個桶收集超過上界的值
+BUCKET_BOUNDS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+PHASE_DB = 'db'
+PHASE_EMIT = 'emit'
+
+
+class LatencyHistogram:
+    """固定桶的延遲直方圖，百分位數以所在桶的上界估計"""
+    __slots__ = ('counts', 'count', 'total', 'max')
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKET_BOUNDS_MS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds):
+        ms = seconds * 1000
+        self.counts[bisect.bisect_left(BUCKET_BOUNDS_MS, ms)] += 1
+        self.count += 1
+        self.total += ms
+        if ms > self.max:
+            self.max = ms
+
+    def percentile(self, q):
+        if not self.count:
+            return 0
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                if index == len(BUCKET_BOUNDS_MS):
+                    return round(self.max, 2)
+                return min(BUCKET_BOUNDS_MS[index], round(self.max, 2))
+        return round(self.max, 2)
+
+    def snapshot(self):
+        return {
+            'count': self.count,
+            'avg_ms': round(self.total / self.count, 3) if self.count else 0,
+            'p50_ms': self.percentile(0.5),
+            'p95_ms': self.percentile(0.95),
+            'p99_ms': self.percentile(0.99),
+            'max_ms': round(self.max, 2),
+            # 每個桶的筆數（非累計），鍵為桶的上界毫秒數
+            'buckets': {
+                str(bound) if index < len(BUCKET_BOUNDS_MS) else '+Inf': count
+                for index, (bound, count) in enumerate(zip(BUCKET_BOUNDS_MS + (None,), self.counts))
+                if count
+            }
+        }
+
+
+class _EventMetrics:
+    __slots__ = ('calls', 'errors', 'exceptions', 'total', 'db', 'emit')
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.exceptions = 0
+        self.total = LatencyHistogram()
+        self.db = LatencyHistogram()
+        self.emit = LatencyHistogram()
+
+
+class _Context:
+    """一次事件處理中累計的各階段耗時（None 表示未經過該階段）"""
+    __slots__ = ('db', 'emit', 'error', 'phase')
+
+    def __init__(self):
+        self.db = None
+        self.emit = None
+        self.error = False
+        self.phase = None
+
+
+class _Phase:
+    __slots__ = ('metrics', 'kind', 'context', 'start')
+
+    def __init__(self, metrics, kind):
+        self.metrics = metrics
+        self.kind = kind
+
+    def __enter__(self):
+        context = getattr(self.metrics._local, 'context', None)
+        # 巢狀的同類階段只計最外層
+        if context is None or context.phase == self.kind:
+            self.context = None
+            return self
+        self.context = context
+        context.phase = self.kind
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        context = self.context
+        if context is not None:
+            context.phase = None
+            _add(context, self.kind, time.perf_counter() - self.start)
+        return False
+
+
+def _add(context, kind, seconds):
+    if kind == PHASE_DB:
+        context.db = (context.db or 0.0) + seconds
+    else:
+        context.emit = (context.emit or 0.0) + seconds
+
+
+class SocketMetrics:
+    """依事件名稱累計的延遲統計"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._events = {}
+        self.started = time.time()
+
+    def instrument(self, event, handler):
+        """包裝事件處理函式，記錄耗時與未處理的例外（例外照常拋出）"""
+        local = self._local
+
+        @functools.wraps(handler)
+        def wrapper(*args, **kwargs):
+            context = _Context()
+            previous = getattr(local, 'context', None)
+            local.context = context
+            start = time.perf_counter()
+            raised = False
+            try:
+                return handler(*args, **kwargs)
+            except Exception:
+                raised = True
+                raise
+            finally:
+                elapsed = time.perf_counter() - start
+                local.context = previous
+                self._record(event, context, elapsed, raised)
+        return wrapper
+
+    def phase(self, kind):
+        """計時區塊：with metrics.phase(PHASE_DB): ..."""
+        return _Phase(self, kind)
+
+    def add(self, kind, seconds):
+        """把已量測的耗時加到目前處理中的事件（例如阻塞工作池回報的資料庫耗時）"""
+        context = getattr(self._local, 'context', None)
+        if context is not None and context.phase != kind:
+            _add(context, kind, seconds)
+
+    def mark_error(self):
+        """目前處理中的事件以錯誤結束（handler 自行攔截例外並回應 error 時呼叫）"""
+        context = getattr(self._local, 'context', None)
+        if context is not None:
+            context.error = True
+
+    def _record(self, event, context, elapsed, raised):
+        with self._lock:
+            metrics = self._events.get(event)
+            if metrics is None:
+                metrics = self._events[event] = _EventMetrics()
+            metrics.calls += 1
+            metrics.total.record(elapsed)
+            if context.db is not None:
+                metrics.db.record(context.db)
+            if context.emit is not None:
+                metrics.emit.record(context.emit)
+            if raised:
+                metrics.exceptions += 1
+            if raised or context.error:
+                metrics.errors += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'since': self.started,
+                'bucket_bounds_ms': list(BUCKET_BOUNDS_MS),
+                'events': {
+                    event: {
+                        'calls': metrics.calls,
+                        'errors': metrics.errors,
+                        'exceptions': metrics.exceptions,
+                        'total': metrics.total.snapshot(),
+                        'db': metrics.db.snapshot(),
+                        'emit': metrics.emit.snapshot()
+                    }
+                    for event, metrics in self._events.items()
+                }
+            }
+
+    def reset(self):
+        with self._lock:
+            self._events = {}
+            self.started = time.time()
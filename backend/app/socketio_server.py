@@ -3,42 +3,307 @@ from flask_socketio import SocketIO, emit, join_room, leave_room
 from flask_login import current_user
 from flask_jwt_extended import decode_token, get_jwt_identity
 from datetime import datetime, timezone
+import atexit
 import jwt
 
 from . import app, db, appbuilder
-from .models import ChatMessage, UserProfile
+from .models import ChatMessage, UserProfile, ChatChannel, ChannelMember
 from .time_utils import to_iso_utc
+from .presence import PresenceRegistry
+from .message_writer import MessageWriter, DURABILITY_BATCHED, DURABILITY_ASYNC
+from .async_workers import BlockingExecutor, ASYNC_MODES
+from .message_queue import create_client_manager, PresenceSync
+from .typing_indicator import TypingAggregator
+from .presence_flusher import PresenceFlusher
+from .outbound import install_outbound_queues
+from .message_replay import RecentMessageBuffer, assign_channel_seqs
+from . import wire_format
+from .wire_format import WIRE_JSON, WIRE_MSGPACK, BINARY_EVENTS
+from .broadcast import FrameBroadcaster
+from .message_batcher import MessageBatcher
+from .rate_limit import TokenBucketLimiter
+from .socket_metrics import SocketMetrics, PHASE_DB, PHASE_EMIT
+from .logging_config import get_logger, logging_stats
+
+logger = get_logger(__name__)
+
+# 非同步模式：eventlet/gevent 需在匯入 app 前完成 monkey patch（見 run.py）
+async_mode = app.config.get('SOCKETIO_ASYNC_MODE', 'threading')
+if async_mode not in ASYNC_MODES:
+    raise ValueError(f'不支援的 SOCKETIO_ASYNC_MODE: {async_mode}')
+
+# 多 worker 部署：透過訊息佇列共享房間與廣播（SOCKETIO_MESSAGE_QUEUE 為空時為單一程序）
+# SQLite 佇列的輪詢與發佈在 eventlet/gevent 模式下交給原生執行緒（不計入 db_executor 的統計）
+queue_executor = BlockingExecutor(None, None, async_mode=async_mode, max_workers=2, resize_pool=False)
+client_manager = create_client_manager(
+    app.config.get('SOCKETIO_MESSAGE_QUEUE', ''),
+    channel=app.config.get('SOCKETIO_MESSAGE_QUEUE_CHANNEL', 'flask-socketio'),
+    run_blocking=queue_executor.run
+)
+queue_options = {'client_manager': client_manager} if client_manager else {}
 
 socketio = SocketIO(app, 
                    cors_allowed_origins=["http://localhost:3000"],
-                   logger=True, 
-                   engineio_logger=True,
-                   async_mode='threading',
+                   logger=app.config.get('SOCKETIO_LOGGER', False),
+                   engineio_logger=app.config.get('SOCKETIO_ENGINEIO_LOGGER', False),
+                   async_mode=async_mode,
                    ping_timeout=60,
-                   ping_interval=25)
+                   ping_interval=25,
+                   **queue_options)
+
+# 每個連線的發送佇列設有上限，慢速客戶端優先丟棄/合併低優先事件，超過上限時中斷
+outbound_stats = None
+if app.config.get('SOCKETIO_OUTBOUND_QUEUES', True):
+    outbound_stats = install_outbound_queues(
+        socketio.server.eio,
+        soft_limit=app.config.get('SOCKETIO_OUTBOUND_SOFT_LIMIT', 100),
+        hard_limit=app.config.get('SOCKETIO_OUTBOUND_HARD_LIMIT', 1000),
+        policies=app.config.get('SOCKETIO_OUTBOUND_EVENT_POLICIES', {}),
+        overflow=app.config.get('SOCKETIO_OUTBOUND_OVERFLOW', 'disconnect')
+    )
+
+# 預先編碼的廣播：每次廣播只編碼一次，房間內所有連線（與其他 worker）共用編碼後的封包
+frame_broadcaster = None
+if app.config.get('SOCKETIO_FRAME_BROADCAST', True):
+    frame_broadcaster = FrameBroadcaster(socketio.server)
+
+# 阻塞的資料庫工作在 eventlet/gevent 模式下交給有上限的原生執行緒池
+db_executor = BlockingExecutor(
+    app, db,
+    async_mode=async_mode,
+    max_workers=app.config.get('SOCKETIO_DB_WORKERS', 8)
+)
+
+# 事件延遲統計：SOCKETIO_LATENCY_METRICS 為 False 時不包裝事件處理函式，phase() 等呼叫直接略過
+socket_metrics = SocketMetrics()
+db_executor.observer = lambda seconds: socket_metrics.add(PHASE_DB, seconds)
+
+def on_event(event):
+    """註冊 Socket 事件處理函式（取代 @socketio.on），並記錄該事件的延遲"""
+    def decorator(handler):
+        if app.config.get('SOCKETIO_LATENCY_METRICS', True):
+            socketio.on(event)(socket_metrics.instrument(event, handler))
+        else:
+            socketio.on(event)(handler)
+        return handler
+    return decorator
+
+# 儲存線上使用者（sid 與 user_id 雙重索引）
+presence = PresenceRegistry()
+
+# 跨 worker 的線上列表同步（僅在使用訊息佇列時啟用）
+presence_sync = None
+if client_manager:
+    presence_sync = PresenceSync(
+        presence, client_manager,
+        heartbeat_interval=app.config.get('SOCKETIO_PRESENCE_HEARTBEAT', 5.0),
+        host_timeout=app.config.get('SOCKETIO_PRESENCE_HOST_TIMEOUT', 15.0),
+        on_invalidate=lambda user_id, reason: socketio.start_background_task(
+            invalidate_user_sessions, user_id, reason, broadcast=False
+        ),
+        on_permissions_changed=lambda: invalidate_permissions(broadcast=False),
+        on_tokens_revoked=lambda tokens: revoke_tokens(tokens, broadcast=False)
+    )
+
+# 輸入狀態聚合器（SOCKETIO_TYPING_AGGREGATION 為 False 時逐筆轉發 user_typing）
+typing_aggregator = TypingAggregator(ttl=app.config.get('SOCKETIO_TYPING_TTL', 5.0))
+
+# 訊息批次寫入器（SOCKETIO_MESSAGE_DURABILITY 為 'sync' 時不啟用）
+message_writer = None
+if app.config.get('SOCKETIO_MESSAGE_DURABILITY', 'sync') in (DURABILITY_BATCHED, DURABILITY_ASYNC):
+    message_writer = MessageWriter(
+        ChatMessage.__table__,
+        batch_size=app.config.get('SOCKETIO_MESSAGE_BATCH_SIZE', 100),
+        max_latency=app.config.get('SOCKETIO_MESSAGE_BATCH_LATENCY', 0.05),
+        durability=app.config['SOCKETIO_MESSAGE_DURABILITY'],
+        run_blocking=db_executor.run,
+        # 多 worker 時各自配發不重疊的 id（id % worker 數 == worker 編號）
+        id_offset=app.config.get('SOCKETIO_WORKER_INDEX', 0),
+        id_stride=app.config.get('SOCKETIO_WORKER_COUNT', 1),
+        # 在批次交易中配發頻道序號
+        prepare_rows=assign_channel_seqs
+    )
+
+# 每個頻道最近的訊息，斷線續傳時優先由此補送
+replay_buffer = RecentMessageBuffer(size=app.config.get('SOCKETIO_RESUME_BUFFER_SIZE', 200))
+
+# Socket 事件限流（每個連線與每個使用者各一組 token bucket）
+rate_limiter = None
+if app.config.get('SOCKETIO_RATE_LIMITING', True):
+    rate_limiter = TokenBucketLimiter(app.config.get('SOCKETIO_RATE_LIMITS', {}))
+
+def within_rate_limit(event, user_info, notify=True):
+    """
+    檢查事件是否在限流預算內
+    超過時 notify=True 回應 error（含 retry_after 秒數），輸入狀態這類高頻事件則直接忽略
+    """
+    if rate_limiter is None:
+        return True
+    retry_after = rate_limiter.check(event, request.sid, user_info.user_id)
+    if not retry_after:
+        return True
+    if notify:
+        emit('error', {
+            'message': '操作過於頻繁，請稍後再試',
+            'event': event,
+            'retry_after': round(retry_after, 2)
+        })
+    return False
+
+# 繁忙頻道的 new_message 合併廣播（key 為 (房間, channel_id)）
+message_batcher = None
+if app.config.get('SOCKETIO_BROADCAST_BATCHING', True):
+    message_batcher = MessageBatcher(
+        emit_single=lambda key, message: broadcast('new_message', message, key[0]),
+        emit_batch=lambda key, messages: broadcast('new_messages', {
+            'channel_id': key[1],
+            'messages': messages
+        }, key[0]),
+        window=app.config.get('SOCKETIO_BROADCAST_BATCH_WINDOW', 0.025),
+        threshold=app.config.get('SOCKETIO_BROADCAST_BATCH_THRESHOLD', 20),
+        max_batch=app.config.get('SOCKETIO_BROADCAST_BATCH_MAX', 200)
+    )
+
+# 線上狀態批次寫入器（SOCKETIO_PRESENCE_PERSISTENCE 為 'sync' 時逐筆 commit）
+presence_flusher = None
+if app.config.get('SOCKETIO_PRESENCE_PERSISTENCE', 'batched') == 'batched':
+    presence_flusher = PresenceFlusher(
+        UserProfile.__table__,
+        interval=app.config.get('SOCKETIO_PRESENCE_FLUSH_INTERVAL', 1.0),
+        run_blocking=db_executor.run
+    )
+
+def ensure_presence_flusher():
+    """
+    第一次使用時啟動線上狀態寫入執行緒（需在 app context 內呼叫）
+    @return: 啟用中的 PresenceFlusher，未啟用批次寫入時回傳 None
+    """
+    if presence_flusher is None:
+        return None
+    if not presence_flusher.running:
+        presence_flusher.start(db.engine)
+        atexit.register(presence_flusher.stop, flush=True)
+        logger.info('線上狀態批次寫入器已啟動')
+    return presence_flusher
+
+def ensure_message_writer():
+    """
+    第一次使用時啟動寫入執行緒（需在 app context 內呼叫）
+    @return: 啟用中的 MessageWriter，未啟用批次寫入時回傳 None
+    """
+    if message_writer is None:
+        return None
+    if not message_writer.running:
+        message_writer.start(db.engine)
+        if app.config.get('SOCKETIO_MESSAGE_FLUSH_ON_SHUTDOWN', True):
+            atexit.register(
+                message_writer.stop,
+                flush=True,
+                timeout=app.config.get('SOCKETIO_MESSAGE_FLUSH_TIMEOUT', 5.0)
+            )
+        logger.info('訊息批次寫入器已啟動', durability=message_writer.durability)
+    return message_writer
+
+# 線上列表增量廣播的背景任務
+_presence_delta_task = None
+
+def presence_deltas_enabled():
+    return app.config.get('SOCKETIO_PRESENCE_DELTAS', True)
+
+def _presence_delta_loop():
+    """
+    定期將時間窗內的上線/離線變更合併為一筆 presence_delta 廣播
+    多 worker 時同時與其他 worker 交換線上使用者；每個 worker 都持有全域線上列表，
+    因此增量只送給本機的連線（ignore_queue），避免經由佇列重複送達
+    """
+    interval = app.config.get('SOCKETIO_PRESENCE_DELTA_INTERVAL', 0.5)
+    while True:
+        socketio.sleep(interval)
+        try:
+            if presence_sync:
+                presence_sync.tick()
+            delta = presence.drain_delta()
+            if delta:
+                if presence_deltas_enabled():
+                    broadcast('presence_delta', delta, 'general', ignore_queue=True)
+                else:
+                    broadcast('online_users', presence.snapshot(), 'general', ignore_queue=True)
+        except Exception as e:
+            logger.exception('廣播線上列表增量失敗', sample='socket.background_error')
+
+def start_presence_delta_task():
+    """第一次有連線時才啟動增量廣播（與跨 worker 同步）任務"""
+    global _presence_delta_task
+    if _presence_delta_task is None:
+        if presence_sync:
+            presence_sync.start()
+            atexit.register(presence_sync.stop)
+        _presence_delta_task = socketio.start_background_task(_presence_delta_loop)
+
+# 輸入狀態的背景廣播任務
+_typing_task = None
 
-# 儲存線上使用者
-online_users = {}
+def typing_aggregation_enabled():
+    return app.config.get('SOCKETIO_TYPING_AGGREGATION', True)
+
+def _typing_loop():
+    """定期移除過期的輸入者，並對有變更的頻道廣播一次 typing_state"""
+    interval = app.config.get('SOCKETIO_TYPING_INTERVAL', 0.5)
+    # 多 worker 時各自只聚合本機連線的輸入者，客戶端依 worker 分別保存後合併顯示
+    worker = presence_sync.host_id if presence_sync else None
+    while True:
+        socketio.sleep(interval)
+        try:
+            for channel_id, users in typing_aggregator.drain().items():
+                broadcast('typing_state', {
+                    'channel_id': channel_id,
+                    'users': users,
+                    'worker': worker
+                }, message_room(channel_id))
+        except Exception as e:
+            logger.exception('廣播輸入狀態失敗', sample='socket.background_error')
+
+def start_typing_task():
+    """第一次收到 typing 事件時才啟動輸入狀態廣播任務"""
+    global _typing_task
+    if _typing_task is None:
+        _typing_task = socketio.start_background_task(_typing_loop)
+
+# 訊息合併廣播的背景任務：每個 window 送出一次累積的訊息，即為增加延遲的上限
+_message_batch_task = None
+
+def _message_batch_loop():
+    while True:
+        socketio.sleep(message_batcher.window)
+        try:
+            message_batcher.flush()
+        except Exception as e:
+            logger.exception('送出合併訊息失敗', sample='socket.background_error')
+
+def start_message_batch_task():
+    """第一次有訊息時才啟動合併廣播任務"""
+    global _message_batch_task
+    if _message_batch_task is None:
+        _message_batch_task = socketio.start_background_task(_message_batch_loop)
 
 # 應用啟動時清理所有線上狀態
 def reset_all_online_status():
-    """重置所有使用者的線上狀態為離線"""
+    """重置所有使用者的線上狀態為離線（單一 UPDATE，不載入 ORM 物件）"""
     try:
         with app.app_context():
-            # 將所有使用者設為離線
-            profiles = db.session.query(UserProfile).filter_by(is_online=True).all()
-            for profile in profiles:
-                profile.is_online = False
-                profile.changed_on = datetime.now(timezone.utc)
-                # 使用該使用者的 user_id 作為 changed_by_fk
-                profile.changed_by_fk = profile.user_id
+            # 將所有使用者設為離線，並以該使用者的 user_id 作為 changed_by_fk
+            count = db.session.query(UserProfile).filter(
+                UserProfile.is_online == True
+            ).update({
+                UserProfile.is_online: False,
+                UserProfile.changed_on: datetime.now(timezone.utc),
+                UserProfile.changed_by_fk: UserProfile.user_id
+            }, synchronize_session=False)
             
             db.session.commit()
-            print(f"已重置 {len(profiles)} 個使用者的線上狀態為離線")
+            logger.info('已重置使用者的線上狀態為離線', count=count)
     except Exception as e:
-        print(f"重置線上狀態失敗: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception('重置線上狀態失敗')
 
 # 延遲執行重置，避免在模組載入時影響 Socket.IO 初始化
 def init_socketio():
@@ -47,114 +312,127 @@ def init_socketio():
 
 # 在這裡不執行重置，改為在應用啟動時執行
 
+# 頻道房間路由
+def channel_room(channel_id):
+    """頻道對應的 Socket.IO 房間名稱"""
+    return f'channel:{channel_id}'
+
+def message_room(channel_id):
+    """
+    取得頻道事件要廣播的房間
+    啟用 SOCKETIO_CHANNEL_ROUTING 時只送到該頻道房間，否則沿用 'general'
+    """
+    if channel_id and app.config.get('SOCKETIO_CHANNEL_ROUTING', True):
+        return channel_room(channel_id)
+    return 'general'
+
+# 傳輸格式：選用 msgpack 的連線加入 '<房間>#msgpack'，高頻事件以編碼一次的 bytes 另外廣播
+def binary_wire_enabled():
+    return app.config.get('SOCKETIO_BINARY_WIRE', True) and wire_format.available()
+
+def join_wire_room(room, connection):
+    """依連線協商的格式加入房間"""
+    join_room(wire_format.wire_room(room, connection.wire))
+
+def leave_wire_room(room, connection):
+    leave_room(wire_format.wire_room(room, connection.wire))
+
+def is_reserved_room(room):
+    """
+    伺服器管理的房間，不能以 join_room / leave_room 直接加入或離開：
+    頻道房間（經由 join_channel 檢查成員資格）、msgpack 格式房間，以及各連線 sid 的私人房間
+    """
+    if not isinstance(room, str) or not room:
+        return True
+    if room.startswith('channel:') or room.endswith(f'#{wire_format.WIRE_MSGPACK}'):
+        return True
+    return socketio.server.manager.is_connected(room, '/')
+
+def emit_to_room(event, payload, room, skip_sid=None, ignore_queue=False, encoder=None):
+    """送出一次廣播：啟用 SOCKETIO_FRAME_BROADCAST 時預先編碼一次，否則交給 Socket.IO 的 emit"""
+    if frame_broadcaster:
+        frame_broadcaster.broadcast(event, payload, room, skip_sid=skip_sid,
+                                    ignore_queue=ignore_queue, encoder=encoder)
+        return
+    if encoder:
+        payload = encoder(payload)
+    socketio.emit(event, payload, to=room, skip_sid=skip_sid, ignore_queue=ignore_queue)
+
+def broadcast(event, payload, room, skip_sid=None, ignore_queue=False):
+    """
+    廣播事件到房間（包含選用 msgpack 的連線）
+    BINARY_EVENTS 對 msgpack 房間另外送出一次 bytes，其他事件以 JSON 同時送到兩種房間
+    """
+    with socket_metrics.phase(PHASE_EMIT):
+        if not binary_wire_enabled():
+            emit_to_room(event, payload, room, skip_sid, ignore_queue)
+            return
+        msgpack_room = wire_format.wire_room(room, WIRE_MSGPACK)
+        if event not in BINARY_EVENTS:
+            emit_to_room(event, payload, [room, msgpack_room], skip_sid, ignore_queue)
+            return
+        emit_to_room(event, payload, room, skip_sid, ignore_queue)
+        emit_to_room(event, payload, msgpack_room, skip_sid, ignore_queue, encoder=wire_format.encode)
+
+def reply(event, payload, connection):
+    """回應目前的連線，依該連線協商的格式編碼"""
+    with socket_metrics.phase(PHASE_EMIT):
+        if connection.wire == WIRE_MSGPACK and event in BINARY_EVENTS:
+            payload = wire_format.encode(payload)
+        emit(event, payload)
+
+def member_channel_ids(user_id):
+    """取得使用者 active ChannelMember 記錄的頻道 ID"""
+    return [
+        row.channel_id for row in
+        db.session.query(ChannelMember.channel_id).filter_by(
+            user_id=user_id,
+            status='active'
+        ).all()
+    ]
+
+def user_identity(user):
+    """將 User 轉為建立連線 session 所需的純資料（可安全跨執行緒傳遞）"""
+    return {
+        'user_id': user.id,
+        'username': user.username,
+        'first_name': getattr(user, 'first_name', '') or '',
+        'last_name': getattr(user, 'last_name', '') or '',
+        'roles': [role.name for role in getattr(user, 'roles', None) or []]
+    }
+
+def authenticate_identity(auth):
+    """驗證 token 並回傳使用者身分資料，失敗時回傳 None"""
+    user = authenticate_socket(auth)
+    return user_identity(user) if user else None
+
 # 驗證JWT Token
 def authenticate_socket(auth):
-    """驗證Socket連接的JWT token"""
+    """驗證Socket連接的JWT token（與 HTTP 請求共用 JWTSecurityManager 的驗證流程與 token 快取）"""
     if not auth or 'token' not in auth:
         return None
         
     token = auth['token']
     if not token:
         return None
-        
-    try:
-        # 使用Flask-AppBuilder的JWT解碼
-        import jwt
-        
-        # 獲取JWT設定
-        secret_key = app.config.get('SECRET_KEY')
-        algorithm = 'HS256'
-        
-        # 解碼JWT token
-        decoded = jwt.decode(token, secret_key, algorithms=[algorithm])
-        user_id = decoded.get('user_id') or decoded.get('sub')
-        
-        if not user_id:
-            print("Token中沒有找到user_id")
-            return None
-        
-        # 從資料庫獲取使用者 - 使用appbuilder的User模型
-        User = appbuilder.sm.user_model
-        user = db.session.query(User).filter_by(id=user_id).first()
-        
-        if user:
-            print(f"Token驗證成功: {user.username}")
-        else:
-            print(f"找不到用戶ID: {user_id}")
-            
-        return user
-    except jwt.ExpiredSignatureError:
-        print("Token已過期")
-        return None
-    except jwt.InvalidTokenError as e:
-        print(f"Token無效: {e}")
-        return None
-    except Exception as e:
-        print(f"Token驗證失敗: {e}")
-        return None
-
-@socketio.on('connect')
-def on_connect(auth):
-    """使用者連接"""
-    print(f"Socket連接嘗試，auth: {auth}")
-    
-    # 嘗試使用Socket認證
-    user = authenticate_socket(auth)
-    
-    # 如果Socket認證失敗，嘗試使用current_user（適用於同域Cookie）
-    if not user and current_user and current_user.is_authenticated:
-        user = current_user
-    
-    if not user:
-        print(f"未認證使用者嘗試連接: {request.sid}")
-        return False
-    
-    user_id = user.id
-    username = user.username
-    
-    # 使用username作為主要顯示名稱，這樣更一致
-    display_name = username
-    first_name = getattr(user, 'first_name', '') or ''
-    last_name = getattr(user, 'last_name', '') or ''
-        
-    print(f"使用者資訊: username={username}, first_name={first_name}, last_name={last_name}, display_name={display_name}")
-    
-    # 檢查該使用者是否已經在線，如果是，先移除舊連接
-    existing_sids = []
-    for sid, user_info in list(online_users.items()):
-        if user_info['user_id'] == user_id:
-            existing_sids.append(sid)
-    
-    # 移除該使用者的所有舊連接記錄
-    for old_sid in existing_sids:
-        if old_sid in online_users:
-            print(f"移除使用者 {username} 的舊連接: {old_sid}")
-            del online_users[old_sid]
-    
-    # 確保在記憶體中該使用者只有一個連接
-    print(f"使用者 {username} 連接前: {len([u for u in online_users.values() if u['user_id'] == user_id])} 個連接")
-    
-    # 記錄新的線上使用者
-    online_users[request.sid] = {
-        'user_id': user_id,
-        'username': username,
-        'display_name': display_name,
-        'connected_at': datetime.now().isoformat()
-    }
     
-    # 更新資料庫中的線上狀態
+    user, _ = appbuilder.sm.authenticate_token(token)
+    if user:
+        logger.debug('Token 驗證成功', sample='socket.connect', user_id=user.id)
+    return user
+
+def mark_user_online(connection):
+    """更新資料庫中的線上狀態為上線（阻塞的資料庫工作，經由 db_executor 執行）"""
     try:
-        # 設定 Flask g.user，這樣 AuditMixin 才能正確取得 user_id
-        g.user = user
-        print(f"🔍 DEBUG: 連線時已設定 g.user = {g.user.username} (ID: {g.user.id})")
-        
+        # 以連線 session 作為稽核身分，AuditMixin 才能正確取得 user_id
+        g.user = connection
         # 查找或創建 UserProfile
-        user_profile = db.session.query(UserProfile).filter_by(user_id=user_id).first()
+        user_profile = db.session.query(UserProfile).filter_by(user_id=connection.user_id).first()
         if not user_profile:
             # 如果不存在 UserProfile，創建一個
             user_profile = UserProfile(
-                user_id=user_id,
-                display_name=display_name,
+                user_id=connection.user_id,
+                display_name=connection.display_name,
                 is_online=True,
                 last_seen=datetime.now(timezone.utc),
                 join_date=datetime.now(timezone.utc)
@@ -169,125 +447,260 @@ def on_connect(auth):
             # 不需要手動設定 changed_by_fk，AuditMixin 會自動處理
         
         db.session.commit()
-        print(f"已更新使用者 {username} 的線上狀態為上線")
+        logger.debug('已更新線上狀態為上線', sample='socket.connect', user_id=connection.user_id)
     except Exception as e:
-        print(f"更新線上狀態失敗: {e}")
+        logger.exception('更新線上狀態失敗', user_id=connection.user_id)
         db.session.rollback()
+
+def mark_user_offline(connection):
+    """更新資料庫中的線上狀態為離線（阻塞的資料庫工作，經由 db_executor 執行）"""
+    user_id = connection.user_id
+    username = connection.username
+    try:
+        # 以連線 session 作為稽核身分，AuditMixin.get_user_id() 透過 g.user.id 取得 user_id
+        g.user = connection
+        user_profile = db.session.query(UserProfile).filter_by(user_id=user_id).first()
+        if user_profile:
+            user_profile.is_online = False
+            user_profile.last_seen = datetime.now(timezone.utc)
+            user_profile.changed_on = datetime.now(timezone.utc)
+            # 不需要手動設定 changed_by_fk，AuditMixin 會自動處理
+            
+            db.session.commit()
+            logger.debug('已更新線上狀態為離線', sample='socket.disconnect', user_id=user_id)
+        else:
+            logger.warning('找不到使用者的 UserProfile 記錄', user_id=user_id, username=username)
+    except Exception as e:
+        logger.exception('更新離線狀態失敗', user_id=user_id)
+        db.session.rollback()
+
+def persist_message(connection, content, channel_id):
+    """
+    逐筆寫入訊息並 commit（阻塞的資料庫工作，經由 db_executor 執行）
+    頻道序號由 before_insert hook 在同一交易中配發
+    @return: (message_id, created_on, channel_seq)
+    """
+    try:
+        # 使用者已在連線時驗證，直接以連線 session 作為稽核身分
+        g.user = connection
+        new_message = ChatMessage(
+            content=content,
+            sender_id=connection.user_id,
+            channel_id=channel_id,  # 使用前端傳遞的頻道ID
+            # 手動設定 AuditMixin 欄位
+            created_by_fk=connection.user_id,
+            changed_by_fk=connection.user_id,
+            created_on=datetime.now(timezone.utc),
+            changed_on=datetime.now(timezone.utc)
+        )
+        
+        db.session.add(new_message)
+        db.session.commit()
+        return new_message.id, new_message.created_on, new_message.channel_seq
+    except Exception:
+        db.session.rollback()
+        raise
+
+def message_payload(message_id, content, sender_id, sender_name, created_on, channel_id, seq):
+    """new_message 與 resume_messages 共用的訊息格式（使用 ISO 8601 UTC 格式）"""
+    return {
+        'id': message_id,
+        'content': content,
+        'sender_id': sender_id,
+        'sender_name': sender_name,
+        'created_on': to_iso_utc(created_on),
+        'channel_id': channel_id,
+        'seq': seq
+    }
+
+def load_missed_messages(user_id, cursors, limit):
+    """
+    取得各頻道在客戶端最後序號之後的訊息（阻塞的資料庫工作，經由 db_executor 執行）
+    只處理使用者有權限的頻道；先查記憶體緩衝，涵蓋不到時以 channel_seq 範圍查詢資料庫
+    @param cursors: {channel_id: last_seq}
+    @return: {channel_id: (messages, complete)}，complete 為 False 表示超過 limit 則
+    """
+    User = appbuilder.sm.user_model
+    channels = db.session.query(
+        ChatChannel.id, ChatChannel.message_seq, ChatChannel.is_private
+    ).filter(
+        ChatChannel.id.in_(list(cursors)),
+        ChatChannel.is_active == True
+    ).all()
+    
+    private_ids = [channel.id for channel in channels if channel.is_private]
+    member_ids = set()
+    if private_ids:
+        member_ids = {
+            row.channel_id for row in
+            db.session.query(ChannelMember.channel_id).filter(
+                ChannelMember.user_id == user_id,
+                ChannelMember.status == 'active',
+                ChannelMember.channel_id.in_(private_ids)
+            ).all()
+        }
+    
+    results = {}
+    for channel in channels:
+        if channel.is_private and channel.id not in member_ids:
+            continue
+        after_seq = cursors[channel.id]
+        head_seq = channel.message_seq or 0
+        messages = replay_buffer.since(channel.id, after_seq, head_seq, limit)
+        if messages is not None:
+            results[channel.id] = (messages, True)
+            continue
+        rows = db.session.query(
+            ChatMessage.id, ChatMessage.content, ChatMessage.sender_id, User.username,
+            ChatMessage.created_on, ChatMessage.channel_seq
+        ).join(
+            User, User.id == ChatMessage.sender_id
+        ).filter(
+            ChatMessage.channel_id == channel.id,
+            ChatMessage.channel_seq > after_seq,
+            ChatMessage.is_deleted == False
+        ).order_by(ChatMessage.channel_seq).limit(limit + 1).all()
+        messages = [
+            message_payload(row.id, row.content, row.sender_id, row.username,
+                            row.created_on, channel.id, row.channel_seq)
+            for row in rows[:limit]
+        ]
+        results[channel.id] = (messages, len(rows) <= limit)
+    return results
+
+@on_event('connect')
+def on_connect(auth):
+    """使用者連接"""
+    logger.debug('Socket 連接嘗試', sample='socket.connect', sid=request.sid)
+    
+    # 嘗試使用Socket認證
+    identity = db_executor.run(authenticate_identity, auth)
+    
+    # 如果Socket認證失敗，嘗試使用current_user（適用於同域Cookie）
+    if not identity and current_user and current_user.is_authenticated:
+        identity = user_identity(current_user)
+    
+    if not identity:
+        logger.info('未認證使用者嘗試連接', sample='socket.auth_rejected', sid=request.sid)
+        return False
+    
+    user_id = identity['user_id']
+    username = identity['username']
+    
+    # 使用username作為主要顯示名稱，這樣更一致
+    display_name = username
+    
+    # 記錄新的線上連線（同一使用者的多個分頁各自保留連線）
+    # 連線記錄同時作為認證 session，之後的事件不再查詢 User
+    wire = wire_format.negotiate(auth) if binary_wire_enabled() else WIRE_JSON
+    connection, _ = presence.add(request.sid, user_id, username, display_name, identity['roles'], wire=wire)
+    
+    # 更新資料庫中的線上狀態（批次模式下由背景執行緒定期寫入）
+    flusher = ensure_presence_flusher()
+    if flusher:
+        flusher.mark_online(user_id, display_name)
+    else:
+        db_executor.run(mark_user_online, connection)
     
     # 加入預設房間
-    join_room('general')
+    join_wire_room('general', connection)
     
-    print(f"使用者 {display_name} ({username}) 已連接, SID: {request.sid}")
+    # 加入使用者所屬頻道的房間
+    if app.config.get('SOCKETIO_CHANNEL_ROUTING', True):
+        try:
+            channel_ids = db_executor.run(member_channel_ids, user_id)
+            for channel_id in channel_ids:
+                join_wire_room(channel_room(channel_id), connection)
+            logger.debug('已加入頻道房間', sample='socket.connect', user_id=user_id, channels=len(channel_ids))
+        except Exception as e:
+            logger.exception('加入頻道房間失敗', user_id=user_id)
+            db.session.rollback()
+            socket_metrics.mark_error()
+    
+    logger.info('使用者已連接', sample='socket.connect', user_id=user_id, username=username, sid=request.sid,
+                wire=wire, connections=len(presence.sids_for_user(user_id)))
     
     # 廣播使用者上線
-    emit('user_joined', {
+    broadcast('user_joined', {
         'user_id': user_id,
         'username': username,
         'display_name': display_name,
         'message': f'{display_name} 加入聊天室'
-    }, room='general')
+    }, 'general')
     
     # 發送線上使用者列表（去重）
-    unique_users = {}
-    for user_info in online_users.values():
-        user_id = user_info['user_id']
-        unique_users[user_id] = user_info
-    
-    print(f"Socket記憶體中總連接數: {len(online_users)}, 去重後使用者數: {len(unique_users)}")
-    emit('online_users', list(unique_users.values()), room='general')
+    logger.debug('線上連線數', sample='socket.connect', connections=presence.connection_count, users=presence.user_count)
+    if presence_deltas_enabled() or presence_sync:
+        start_presence_delta_task()
+    if presence_deltas_enabled():
+        # 只對新連線發送快照，其他人由 presence_delta 增量更新
+        reply('presence_snapshot', presence.snapshot_state(), connection)
+    elif presence_sync:
+        reply('online_users', presence.snapshot(), connection)
+    else:
+        broadcast('online_users', presence.snapshot(), 'general')
 
-@socketio.on('disconnect')
+@on_event('disconnect')
 def on_disconnect(auth=None):
     """使用者斷線"""
-    if request.sid in online_users:
-        user_info = online_users[request.sid]
-        user_id = user_info['user_id']
-        username = user_info['username']
-        display_name = user_info['display_name']
-        
-        # 檢查該使用者是否還有其他活躍的連接
-        other_connections = False
-        for sid, info in online_users.items():
-            if sid != request.sid and info['user_id'] == user_id:
-                other_connections = True
-                break
-        
-        # 移除線上使用者記錄
-        del online_users[request.sid]
+    # 移除線上連線記錄，並確認該使用者是否還有其他活躍的連接
+    user_info, is_last = presence.remove(request.sid)
+    if rate_limiter:
+        rate_limiter.forget_sid(request.sid)
+    if user_info:
+        user_id = user_info.user_id
+        username = user_info.username
+        display_name = user_info.display_name
+        other_connections = not is_last
         
         # 只有當用戶沒有其他活躍連接時，才更新資料庫為離線狀態
         if not other_connections:
-            print(f"準備將使用者 {username} (ID: {user_id}) 設為離線狀態")
-            try:
-                # 確保 user_id 是有效的整數
-                if user_id is None:
-                    print(f"❌ user_id 為 None，無法更新資料庫")
-                    return
-                
-                print(f"🔍 DEBUG: user_id = {user_id}, type = {type(user_id)}")
-                
-                # 獲取使用者物件並設定到 Flask g 對象，這樣 AuditMixin 才能正確取得 user_id
-                User = appbuilder.sm.user_model
-                user_obj = db.session.query(User).filter_by(id=user_id).first()
-                if not user_obj:
-                    print(f"❌ 找不到 User 物件 (ID: {user_id})")
-                    return
-                
-                # 設定 Flask g.user，這樣 AuditMixin.get_user_id() 就能正確返回 user_id
-                g.user = user_obj
-                print(f"🔍 DEBUG: 已設定 g.user = {g.user.username} (ID: {g.user.id})")
-                
-                user_profile = db.session.query(UserProfile).filter_by(user_id=user_id).first()
-                if user_profile:
-                    print(f"找到使用者資料: {user_profile.display_name}, 目前線上狀態: {user_profile.is_online}")
-                    
-                    user_profile.is_online = False
-                    user_profile.last_seen = datetime.now(timezone.utc)
-                    user_profile.changed_on = datetime.now(timezone.utc)
-                    # 不需要手動設定 changed_by_fk，AuditMixin 會自動處理
-                    
-                    print(f"🔍 DEBUG: 提交前 changed_by_fk = {user_profile.changed_by_fk}")
-                    db.session.commit()
-                    print(f"✅ 已成功更新使用者 {username} 的線上狀態為離線，last_seen: {user_profile.last_seen}")
-                else:
-                    print(f"❌ 找不到使用者 {username} (ID: {user_id}) 的 UserProfile 記錄")
-            except Exception as e:
-                print(f"❌ 更新離線狀態失敗: {e}")
-                import traceback
-                traceback.print_exc()
-                db.session.rollback()
+            logger.debug('準備將使用者設為離線狀態', sample='socket.disconnect', user_id=user_id)
+            # 確保 user_id 是有效的整數
+            if user_id is None:
+                logger.warning('user_id 為 None，無法更新資料庫', sid=request.sid)
+                return
+            
+            if presence_flusher:
+                presence_flusher.mark_offline(user_id)
+            else:
+                db_executor.run(mark_user_offline, user_info)
         else:
-            print(f"使用者 {username} 還有其他活躍連接，不更新資料庫狀態")
+            logger.debug('使用者還有其他活躍連接，不更新資料庫狀態', sample='socket.disconnect', user_id=user_id)
         
-        print(f"使用者 {display_name} 已斷線, SID: {request.sid}")
+        logger.info('使用者已斷線', sample='socket.disconnect', user_id=user_id, username=username, sid=request.sid)
+        
+        # 本機已沒有該使用者的連線時，清除其輸入狀態
+        if not presence.sids_for_user(user_id):
+            typing_aggregator.remove_user(user_id)
         
         # 廣播使用者離線（只有在沒有其他連接時才廣播）
         if not other_connections:
-            emit('user_left', {
+            broadcast('user_left', {
                 'user_id': user_id,
                 'username': username,
                 'display_name': display_name,
                 'message': f'{display_name} 離開聊天室'
-            }, room='general')
-        
-        # 更新線上使用者列表（去重）
-        unique_users = {}
-        for user_info in online_users.values():
-            user_id = user_info['user_id']
-            unique_users[user_id] = user_info
+            }, 'general')
         
-        print(f"斷線後Socket記憶體中總連接數: {len(online_users)}, 去重後使用者數: {len(unique_users)}")
-        emit('online_users', list(unique_users.values()), room='general')
+        # 更新線上使用者列表（去重），增量模式下由背景任務合併廣播
+        logger.debug('斷線後線上連線數', sample='socket.disconnect', connections=presence.connection_count,
+                     users=presence.user_count)
+        if not presence_deltas_enabled() and not presence_sync:
+            broadcast('online_users', presence.snapshot(), 'general')
 
-@socketio.on('send_message')
+@on_event('send_message')
 def handle_message(data):
     """處理發送訊息"""
-    # 從 online_users 中取得使用者資訊（因為 Socket.IO 可能無法直接使用 current_user）
-    user_info = online_users.get(request.sid)
+    # 從線上註冊表取得使用者資訊（因為 Socket.IO 可能無法直接使用 current_user）
+    user_info = presence.get(request.sid)
     if not user_info:
         emit('error', {'message': '未認證使用者'})
         return
     
+    if not within_rate_limit('send_message', user_info):
+        return
+    
     content = data.get('content', '').strip()
     if not content:
         emit('error', {'message': '訊息內容不能為空'})
@@ -299,161 +712,394 @@ def handle_message(data):
         emit('error', {'message': '必須指定頻道ID'})
         return
     
-    user_id = user_info['user_id']
-    username = user_info['username']
-    display_name = user_info['display_name']
+    user_id = user_info.user_id
+    username = user_info.username
+    display_name = user_info.display_name
     
     # 儲存訊息到資料庫
     try:
-        # 取得使用者物件以便設定 AuditMixin 欄位
-        User = appbuilder.sm.user_model
-        user = db.session.query(User).filter_by(id=user_id).first()
-        
-        if not user:
-            emit('error', {'message': '使用者不存在'})
-            return
-        
-        new_message = ChatMessage(
-            content=content,
-            sender_id=user_id,
-            channel_id=channel_id,  # 使用前端傳遞的頻道ID
-            # 手動設定 AuditMixin 欄位
-            created_by_fk=user_id,
-            changed_by_fk=user_id,
-            created_on=datetime.now(timezone.utc),
-            changed_on=datetime.now(timezone.utc)
-        )
+        writer = ensure_message_writer()
+        if writer:
+            # 批次寫入：先配發 id，交由寫入執行緒合併 commit
+            now = datetime.now(timezone.utc)
+            message_id = writer.next_id()
+            row = {
+                'id': message_id,
+                'content': content,
+                'sender_id': user_id,
+                'channel_id': channel_id,
+                'created_by_fk': user_id,
+                'changed_by_fk': user_id,
+                'created_on': now,
+                'changed_on': now
+            }
+            future = writer.submit(row)
+            created_on = now
+            if writer.durability == DURABILITY_BATCHED:
+                # 等待所在批次 commit，寫入失敗時拋出例外；序號在寫入交易中配發
+                with socket_metrics.phase(PHASE_DB):
+                    future.result()
+                seq = row.get('channel_seq')
+            else:
+                # async 模式廣播時尚未取得序號，寫入後才加入續傳緩衝
+                seq = None
+                
+                def buffer_when_written(done):
+                    if not done.exception():
+                        replay_buffer.add(message_payload(
+                            message_id, content, user_id, display_name, now, channel_id, row.get('channel_seq')
+                        ))
+                future.add_done_callback(buffer_when_written)
+        else:
+            message_id, created_on, seq = db_executor.run(persist_message, user_info, content, channel_id)
         
-        db.session.add(new_message)
-        db.session.commit()
+        # 準備廣播資料
+        message_data = message_payload(message_id, content, user_id, display_name, created_on, channel_id, seq)
+        if seq is not None:
+            replay_buffer.add(message_data)
         
-        # 準備廣播資料（使用 ISO 8601 UTC 格式）
-        message_data = {
-            'id': new_message.id,
-            'content': content,
-            'sender_id': user_id,
-            'sender_name': display_name,
-            'created_on': to_iso_utc(new_message.created_on),
-            'channel_id': new_message.channel_id
-        }
+        logger.debug('新訊息', sample='socket.send_message', user_id=user_id, channel_id=channel_id,
+                     message_id=message_id, length=len(content))
         
-        print(f"新訊息來自 {display_name}: {content}")
+        # 廣播訊息到該頻道房間（未啟用頻道路由時為 'general'）
+        # 啟用合併廣播時，繁忙的房間改由背景任務以 new_messages 批次送出
+        room = message_room(channel_id)
+        if message_batcher:
+            start_message_batch_task()
+            message_batcher.submit((room, channel_id), message_data)
+        else:
+            broadcast('new_message', message_data, room)
         
-        # 廣播訊息到所有連線使用者
-        emit('new_message', message_data, room='general')
+        # 送出訊息即結束輸入狀態
+        if typing_aggregation_enabled():
+            typing_aggregator.update(channel_id, user_id, display_name, False)
         
     except Exception as e:
-        print(f"儲存訊息失敗: {e}")
+        logger.exception('儲存訊息失敗', user_id=user_id, channel_id=channel_id)
         db.session.rollback()
+        socket_metrics.mark_error()
         emit('error', {'message': '發送訊息失敗'})
 
-@socketio.on('delete_message')
+@on_event('delete_message')
 def handle_delete_message(data):
     """處理刪除訊息"""
-    # 從 online_users 中取得使用者資訊（因為 Socket.IO 可能無法直接使用 current_user）
-    user_info = online_users.get(request.sid)
+    # 從線上註冊表取得使用者資訊（因為 Socket.IO 可能無法直接使用 current_user）
+    user_info = presence.get(request.sid)
     if not user_info:
         emit('error', {'message': '未認證使用者'})
         return
     
+    if not within_rate_limit('delete_message', user_info):
+        return
+    
     message_id = data.get('message_id')
     if not message_id:
         emit('error', {'message': '無效的訊息ID'})
         return
     
-    user_id = user_info['user_id']
-    username = user_info['username']
+    user_id = user_info.user_id
+    username = user_info.username
     
     try:
-        # 查找訊息
-        message = db.session.query(ChatMessage).filter_by(
-            id=message_id,
-            sender_id=user_id
-        ).first()
+        with socket_metrics.phase(PHASE_DB):
+            # 查找訊息
+            message = db.session.query(ChatMessage).filter_by(
+                id=message_id,
+                sender_id=user_id
+            ).first()
+            
+            # 訊息可能還在批次寫入佇列中，寫完後再查一次
+            if not message and message_writer and message_writer.running:
+                message_writer.flush(timeout=app.config.get('SOCKETIO_MESSAGE_FLUSH_TIMEOUT', 5.0))
+                message = db.session.query(ChatMessage).filter_by(
+                    id=message_id,
+                    sender_id=user_id
+                ).first()
+            
+            if message:
+                channel_id = message.channel_id
+                
+                # 刪除訊息
+                db.session.delete(message)
+                db.session.commit()
         
         if not message:
             emit('error', {'message': '找不到訊息或無權限刪除'})
             return
         
-        channel_id = message.channel_id
+        replay_buffer.mark_deleted(channel_id, message_id)
         
-        # 刪除訊息
-        db.session.delete(message)
-        db.session.commit()
-        
-        print(f"使用者 {username} 刪除了訊息 ID: {message_id}")
+        logger.info('使用者刪除了訊息', user_id=user_id, message_id=message_id, channel_id=channel_id)
         
         # 廣播刪除事件
-        emit('message_deleted', {
+        broadcast('message_deleted', {
             'message_id': message_id, 
             'channel_id': channel_id
-        }, room='general')
+        }, message_room(channel_id))
         
     except Exception as e:
-        print(f"刪除訊息失敗: {e}")
+        logger.exception('刪除訊息失敗', user_id=user_id, message_id=message_id)
         db.session.rollback()
+        socket_metrics.mark_error()
         emit('error', {'message': '刪除訊息失敗'})
 
-@socketio.on('typing')
+@on_event('typing')
 def handle_typing(data):
     """處理輸入狀態"""
-    # 從 online_users 中取得使用者資訊
-    user_info = online_users.get(request.sid)
+    # 從線上註冊表取得使用者資訊
+    user_info = presence.get(request.sid)
     if not user_info:
         return
     
+    if not within_rate_limit('typing', user_info, notify=False):
+        return
+    
     is_typing = data.get('is_typing', False)
-    user_id = user_info['user_id']
-    display_name = user_info['display_name']
+    channel_id = data.get('channel_id')
+    user_id = user_info.user_id
+    display_name = user_info.display_name
+    
+    if typing_aggregation_enabled():
+        # 只更新聚合狀態，由背景任務合併廣播
+        start_typing_task()
+        typing_aggregator.update(channel_id, user_id, display_name, bool(is_typing))
+        return
     
     # 廣播輸入狀態（除了自己）
-    emit('user_typing', {
+    broadcast('user_typing', {
         'user_id': user_id,
         'display_name': display_name,
-        'is_typing': is_typing
-    }, room='general', include_self=False)
+        'is_typing': is_typing,
+        'channel_id': channel_id
+    }, message_room(channel_id), skip_sid=request.sid)
+
+@on_event('join_channel')
+def handle_join_channel(data):
+    """切換頻道時加入該頻道房間（公開頻道或 active 成員才可加入）"""
+    user_info = presence.get(request.sid)
+    if not user_info:
+        return
+    
+    if not within_rate_limit('join_channel', user_info):
+        return
+    
+    channel_id = (data or {}).get('channel_id')
+    if not channel_id or not app.config.get('SOCKETIO_CHANNEL_ROUTING', True):
+        return
+    
+    try:
+        with socket_metrics.phase(PHASE_DB):
+            channel = db.session.query(ChatChannel).filter_by(
+                id=channel_id,
+                is_active=True
+            ).first()
+            member = None
+            if channel and channel.is_private:
+                member = db.session.query(ChannelMember.id).filter_by(
+                    channel_id=channel_id,
+                    user_id=user_info.user_id,
+                    status='active'
+                ).first()
+        if not channel:
+            emit('error', {'message': '頻道不存在'})
+            return
+        
+        if channel.is_private and not member:
+            emit('error', {'message': '您不是此頻道的成員'})
+            return
+        
+        join_wire_room(channel_room(channel_id), user_info)
+    except Exception as e:
+        logger.exception('加入頻道房間失敗', user_id=user_info.user_id, channel_id=channel_id)
+        db.session.rollback()
+        socket_metrics.mark_error()
+
+@on_event('resume')
+def handle_resume(data):
+    """
+    重新連線後補送缺少的訊息
+    data: {'channels': {channel_id: 最後收到的 seq}}
+    每個頻道回傳一筆 resume_messages: {channel_id, messages, complete}，
+    complete 為 False 表示缺少的訊息超過上限，客戶端應改為重新載入歷史訊息
+    """
+    user_info = presence.get(request.sid)
+    if not user_info:
+        emit('error', {'message': '未認證使用者'})
+        return
+    
+    if not within_rate_limit('resume', user_info):
+        return
+    
+    try:
+        cursors = {
+            int(channel_id): int(seq or 0)
+            for channel_id, seq in ((data or {}).get('channels') or {}).items()
+        }
+    except (TypeError, ValueError, AttributeError):
+        emit('error', {'message': '無效的續傳資料'})
+        return
+    if not cursors:
+        return
+    
+    limit = app.config.get('SOCKETIO_RESUME_MAX_MESSAGES', 500)
+    try:
+        results = db_executor.run(load_missed_messages, user_info.user_id, cursors, limit)
+    except Exception as e:
+        logger.exception('補送訊息失敗', user_id=user_info.user_id)
+        db.session.rollback()
+        socket_metrics.mark_error()
+        emit('error', {'message': '補送訊息失敗'})
+        return
+    
+    for channel_id, (messages, complete) in results.items():
+        reply('resume_messages', {
+            'channel_id': channel_id,
+            'messages': messages,
+            'complete': complete
+        }, user_info)
 
-@socketio.on('join_room')
+@on_event('join_room')
 def handle_join_room(data):
     """加入特定房間"""
-    # 從 online_users 中取得使用者資訊
-    user_info = online_users.get(request.sid)
+    # 從線上註冊表取得使用者資訊
+    user_info = presence.get(request.sid)
     if not user_info:
         return
     
+    if not within_rate_limit('join_room', user_info):
+        return
+    
     room = data.get('room', 'general')
-    join_room(room)
+    if is_reserved_room(room):
+        logger.info('拒絕加入保留的房間', sample='socket.join_room', user_id=user_info.user_id, room=room)
+        emit('error', {'message': '無法加入此房間'})
+        return
+    join_wire_room(room, user_info)
     
-    display_name = user_info['display_name']
-    emit('status', {'message': f'{display_name} 已加入房間 {room}'}, room=room)
+    display_name = user_info.display_name
+    broadcast('status', {'message': f'{display_name} 已加入房間 {room}'}, room)
 
-@socketio.on('leave_room')
+@on_event('leave_room')
 def handle_leave_room(data):
     """離開特定房間"""
-    # 從 online_users 中取得使用者資訊
-    user_info = online_users.get(request.sid)
+    # 從線上註冊表取得使用者資訊
+    user_info = presence.get(request.sid)
     if not user_info:
         return
     
+    if not within_rate_limit('leave_room', user_info):
+        return
+    
     room = data.get('room', 'general')
-    leave_room(room)
+    if is_reserved_room(room):
+        logger.info('拒絕離開保留的房間', sample='socket.leave_room', user_id=user_info.user_id, room=room)
+        emit('error', {'message': '無法離開此房間'})
+        return
+    leave_wire_room(room, user_info)
     
-    display_name = user_info['display_name']
-    emit('status', {'message': f'{display_name} 已離開房間 {room}'}, room=room)
+    display_name = user_info.display_name
+    broadcast('status', {'message': f'{display_name} 已離開房間 {room}'}, room)
 
-@socketio.on('get_online_users')
+@on_event('get_online_users')
 def handle_get_online_users():
     """取得線上使用者列表"""
+    user_info = presence.get(request.sid)
+    if not user_info:
+        return
+    
+    if not within_rate_limit('get_online_users', user_info):
+        return
+    
     # 去重後發送
-    unique_users = {}
-    for user_info in online_users.values():
-        user_id = user_info['user_id']
-        unique_users[user_id] = user_info
+    reply('online_users', presence.snapshot(), user_info)
+
+def room_count(namespace='/'):
+    """本機的具名房間數（不含每個連線以 sid 命名的個人房間）"""
+    rooms = socketio.server.manager.rooms.get(namespace, {})
+    sids = rooms.get(None, {})
+    return sum(1 for room in rooms if room is not None and room not in sids)
+
+def socket_stats():
+    """Socket 伺服器統計（發送佇列深度、丟棄的封包數、事件延遲等），供 get_socket_stats 與管理 API 使用"""
+    return {
+        'connections': presence.connection_count,
+        'users': presence.user_count,
+        'rooms': room_count(),
+        'latency': socket_metrics.snapshot(),
+        'outbound': outbound_stats.snapshot() if outbound_stats else None,
+        'broadcast': frame_broadcaster.stats.snapshot() if frame_broadcaster else None,
+        'message_batcher': message_batcher.stats() if message_batcher else None,
+        'rate_limit': rate_limiter.stats() if rate_limiter else None,
+        'typing': typing_aggregator.stats(),
+        'db_executor': db_executor.stats(),
+        'message_writer': message_writer.stats() if message_writer else None,
+        'presence_flusher': presence_flusher.stats() if presence_flusher else None,
+        'logging': logging_stats()
+    }
+
+@on_event('get_socket_stats')
+def handle_get_socket_stats():
+    """管理員取得 Socket 伺服器統計"""
+    user_info = presence.get(request.sid)
+    if not user_info or not user_info.has_role('Admin'):
+        emit('error', {'message': '權限不足'})
+        return
+    emit('socket_stats', socket_stats())
+
+@on_event('get_presence_snapshot')
+def handle_get_presence_snapshot():
+    """客戶端偵測到 presence_delta 序號缺口時，重新取得版本化快照"""
+    user_info = presence.get(request.sid)
+    if not user_info:
+        return
     
-    emit('online_users', list(unique_users.values()))
+    if not within_rate_limit('get_presence_snapshot', user_info, notify=False):
+        return
+    reply('presence_snapshot', presence.snapshot_state(), user_info)
+
+def invalidate_user_sessions(user_id, reason='', broadcast=True):
+    """
+    使用者被停用或角色變更時，中斷其所有 Socket 連線，並移除其 HTTP token 的驗證快取
+    客戶端重新連線時會重新驗證並建立新的 session（已停用的使用者會被拒絕）
+    多 worker 時 broadcast=True 會同時要求其他 worker 中斷該使用者在其上的連線
+    """
+    if broadcast and presence_sync:
+        presence_sync.invalidate_user(user_id, reason)
+    # HTTP 請求的已驗證 token 快取（其他 worker 收到失效通知時也會執行這裡）
+    appbuilder.sm.token_cache.invalidate_user(user_id)
+    sids = presence.sids_for_user(user_id)
+    for sid in sids:
+        try:
+            socketio.server.disconnect(sid, namespace='/')
+        except Exception as e:
+            logger.warning('中斷連線失敗', sid=sid, error=str(e))
+    if sids:
+        logger.info('已中斷使用者的連線', user_id=user_id, connections=len(sids), reason=reason)
+    return len(sids)
+
+def invalidate_permissions(broadcast=True):
+    """
+    角色權限變更後重新載入權限索引
+    多 worker 時 broadcast=True 會同時通知其他 worker
+    """
+    if broadcast and presence_sync:
+        presence_sync.invalidate_permissions()
+    if appbuilder.sm.permission_index is not None:
+        appbuilder.sm.permission_index.invalidate()
+        logger.info('角色權限已變更，重新載入權限索引', version=appbuilder.sm.permission_index.version)
+
+def revoke_tokens(tokens, broadcast=True):
+    """
+    將已撤銷的 token（[(jti, 到期 UNIX 時間)]）加入撤銷清單，之後的 HTTP 請求與 Socket 連線都會拒絕
+    多 worker 時 broadcast=True 會同時通知其他 worker
+    """
+    if broadcast and presence_sync:
+        presence_sync.revoke_tokens(tokens)
+    for jti, expires_at in tokens:
+        appbuilder.sm.revoked_tokens.add(jti, expires_at)
 
 # 錯誤處理
 @socketio.on_error_default
 def default_error_handler(e):
-    print(f"SocketIO 錯誤: {e}")
+    logger.exception('SocketIO 錯誤', sample='socket.error', sid=request.sid)
     emit('error', {'message': '伺服器發生錯誤'})
\ No newline at end of file
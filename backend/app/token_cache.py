@@ -0,0 +1,206 @@
+"""
+已驗證 JWT 的快取
+HTTP 請求帶著同一個 token 反覆呼叫 API 時，不再每次解碼 token、查詢 User 與載入角色：
+第一次驗證後以 token 的簽章為鍵保存解碼後的 claims 與精簡的使用者 / 角色快照（UserSnapshot），
+之後的請求直接使用快照作為 g.user
+
+- 有上限的 LRU，每筆資料在 ttl 秒或 token 到期時失效（取較早者）
+- 使用者登出、停用或角色變更時移除該 token / 該使用者的所有快取
+- 記錄命中率與每次認證的耗時（命中 / 未命中分開）
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class RoleSnapshot:
+    """角色快照：Flask-AppBuilder 的權限檢查只需要 id 與 name"""
+    __slots__ = ('id', 'name')
+
+    def __init__(self, id, name):
+        self.id = id
+        self.name = name
+
+    def __repr__(self):
+        return self.name
+
+
+class UserSnapshot:
+    """
+    已驗證使用者的唯讀快照，作為 g.user / Flask-Login 的 current_user
+    提供 API 與權限檢查會用到的欄位（id、username、roles 等），不連結資料庫 session
+    """
+    __slots__ = ('id', 'username', 'email', 'first_name', 'last_name', 'active', 'roles', 'groups')
+
+    is_authenticated = True
+    is_anonymous = False
+
+    def __init__(self, id, username, email='', first_name='', last_name='', active=True, roles=()):
+        self.id = id
+        self.username = username
+        self.email = email
+        self.first_name = first_name
+        self.last_name = last_name
+        self.active = active
+        # Flask-AppBuilder 以 user.roles + 群組角色計算權限，roles 必須是 list
+        self.roles = list(roles)
+        self.groups = []
+
+    @classmethod
+    def from_user(cls, user):
+        return cls(
+            id=user.id,
+            username=user.username,
+            email=user.email,
+            first_name=user.first_name or '',
+            last_name=user.last_name or '',
+            active=user.is_active,
+            roles=[RoleSnapshot(role.id, role.name) for role in user.roles]
+        )
+
+    @property
+    def is_active(self):
+        return bool(self.active)
+
+    def get_id(self):
+        return str(self.id)
+
+    def get_full_name(self):
+        # Flask-AppBuilder 的頁面導覽列會呼叫
+        return f'{self.first_name} {self.last_name}'
+
+    def has_role(self, role_name):
+        return any(role.name == role_name for role in self.roles)
+
+    def __repr__(self):
+        return f'<UserSnapshot {self.username} ({self.id})>'
+
+
+def token_key(token):
+    """快取鍵：token 的簽章部分（簽章涵蓋 header 與 payload，不同 token 的簽章不會相同）"""
+    return token.rsplit('.', 1)[-1]
+
+
+class _Entry:
+    __slots__ = ('claims', 'user', 'expires_at')
+
+    def __init__(self, claims, user, expires_at):
+        self.claims = claims
+        self.user = user
+        self.expires_at = expires_at
+
+
+class VerifiedTokenCache:
+    """
+    @param maxsize: 最多保存的 token 數，0 表示停用快取
+    @param ttl: 每筆資料最多保存的秒數，也是角色變更在其他 worker 生效前的最長延遲
+    """
+
+    def __init__(self, maxsize=10000, ttl=60.0, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        # user_id -> {token_key}，角色變更或停用時移除該使用者的所有 token
+        self._user_keys = {}
+        # 統計
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.hit_seconds = 0.0
+        self.miss_seconds = 0.0
+
+    def get(self, token, now=None):
+        """@return: (claims, UserSnapshot)，未快取或已過期時回傳 None"""
+        if not self.maxsize:
+            return None
+        key = token_key(token)
+        now = self._clock() if now is None else now
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry.expires_at <= now:
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry.claims, entry.user
+
+    def put(self, token, claims, user, now=None):
+        """保存已驗證的 token；token 的 exp（UNIX 時間）早於 ttl 時以 exp 為準"""
+        if not self.maxsize:
+            return
+        key = token_key(token)
+        now = self._clock() if now is None else now
+        expires_at = now + self.ttl
+        exp = claims.get('exp')
+        if exp is not None:
+            expires_at = min(expires_at, now + (exp - time.time()))
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = _Entry(claims, user, expires_at)
+            self._user_keys.setdefault(user.id, set()).add(key)
+            while len(self._entries) > self.maxsize:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return False
+        keys = self._user_keys.get(entry.user.id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._user_keys[entry.user.id]
+        return True
+
+    def invalidate_token(self, token):
+        with self._lock:
+            if self._remove(token_key(token)):
+                self.invalidations += 1
+
+    def invalidate_user(self, user_id):
+        """移除使用者的所有 token（停用、角色變更），回傳移除的筆數"""
+        with self._lock:
+            keys = list(self._user_keys.get(user_id, ()))
+            for key in keys:
+                self._remove(key)
+            self.invalidations += len(keys)
+        return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._user_keys.clear()
+
+    def record(self, seconds, hit):
+        """記錄一次認證的耗時"""
+        with self._lock:
+            if hit:
+                self.hits += 1
+                self.hit_seconds += seconds
+            else:
+                self.misses += 1
+                self.miss_seconds += seconds
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'hit_auth_us': round(self.hit_seconds / self.hits * 1e6, 1) if self.hits else 0,
+                'miss_auth_us': round(self.miss_seconds / self.misses * 1e6, 1) if self.misses else 0,
+                'avg_auth_us': round((self.hit_seconds + self.miss_seconds) / lookups * 1e6, 1) if lookups else 0
+            }
@@ -0,0 +1,79 @@
+"""
+已撤銷 JWT 的清單
+登出或更新 refresh token 時以 token 的 jti 記錄在 revoked_tokens 資料表，每個 worker 在記憶體中保存
+尚未到期的 jti，驗證 token（包括命中已驗證 token 快取時）只需一次集合查詢，不查詢資料庫：
+
+- 啟動時從 revoked_tokens 載入（load），之後的撤銷由 commit hook 加入並經由訊息佇列通知其他 worker
+- token 到期後不論是否撤銷都會被拒絕，到期的 jti 定期移除，清單大小只與有效期限內的撤銷數有關
+"""
+
+import threading
+import time
+
+
+class RevocationList:
+    """
+    @param loader: 回傳 (jti, 到期 UNIX 時間) 列的可呼叫物件，load() 時呼叫
+    @param prune_interval: 移除到期 jti 的最短間隔（秒）
+    """
+
+    def __init__(self, loader=None, prune_interval=60.0, clock=time.time):
+        self._loader = loader
+        self.prune_interval = prune_interval
+        self._clock = clock
+        self._lock = threading.Lock()
+        # jti -> 到期 UNIX 時間
+        self._entries = {}
+        self._next_prune = 0
+        # 統計
+        self.loads = 0
+        self.revoked = 0
+        self.rejected = 0
+        self.pruned = 0
+
+    def load(self):
+        """以 loader 的結果取代目前的清單"""
+        rows = self._loader() if self._loader else []
+        now = self._clock()
+        entries = {jti: expires_at for jti, expires_at in rows if expires_at > now}
+        with self._lock:
+            self._entries = entries
+            self._next_prune = now + self.prune_interval
+            self.loads += 1
+        return len(entries)
+
+    def add(self, jti, expires_at):
+        now = self._clock()
+        if not jti or expires_at <= now:
+            return
+        with self._lock:
+            self._entries[jti] = expires_at
+            self.revoked += 1
+            if now >= self._next_prune:
+                self._prune(now)
+
+    def is_revoked(self, jti):
+        # 讀取不加鎖：dict 的查詢與單筆寫入是原子操作，_prune / load 以新的 dict 整個替換
+        if jti is not None and jti in self._entries:
+            self.rejected += 1
+            return True
+        return False
+
+    def _prune(self, now):
+        entries = {jti: expires_at for jti, expires_at in self._entries.items() if expires_at > now}
+        self.pruned += len(self._entries) - len(entries)
+        self._entries = entries
+        self._next_prune = now + self.prune_interval
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'loads': self.loads,
+                'revoked': self.revoked,
+                'rejected': self.rejected,
+                'pruned': self.pruned
+            }
@@ -0,0 +1,95 @@
+"""
+輸入狀態聚合器
+客戶端的 typing 事件只更新記憶體中的狀態，由背景任務以固定間隔
+對有變更的頻道廣播一次「目前誰正在輸入」的完整列表，
+超過存活時間沒有更新的輸入者自動移除，廣播量與頻道數成正比而非與按鍵數成正比
+"""
+
+import threading
+import time
+
+
+class TypingAggregator:
+    """
+    以 (channel_id, user_id) 記錄輸入中的使用者
+    - _channels: channel_id -> {user_id: [display_name, expires_at]}
+    - _dirty: 自上次 drain() 之後輸入者有變動的頻道
+    @param ttl: 輸入狀態的存活秒數，期間內重複的 typing 事件只延長存活時間
+    """
+
+    def __init__(self, ttl=5.0):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._channels = {}
+        self._dirty = set()
+        # 統計
+        self.updates = 0
+        self.broadcasts = 0
+
+    def update(self, channel_id, user_id, display_name, is_typing, now=None):
+        """記錄一次 typing 事件，只有輸入者增減時才標記頻道需要廣播"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self.updates += 1
+            typers = self._channels.get(channel_id)
+            if is_typing:
+                if typers is None:
+                    typers = self._channels[channel_id] = {}
+                entry = typers.get(user_id)
+                if entry is None:
+                    typers[user_id] = [display_name, now + self.ttl]
+                    self._dirty.add(channel_id)
+                else:
+                    entry[1] = now + self.ttl
+            elif typers and typers.pop(user_id, None) is not None:
+                self._dirty.add(channel_id)
+                if not typers:
+                    del self._channels[channel_id]
+
+    def remove_user(self, user_id):
+        """使用者離線時從所有頻道移除"""
+        with self._lock:
+            for channel_id in [cid for cid, typers in self._channels.items() if user_id in typers]:
+                typers = self._channels[channel_id]
+                del typers[user_id]
+                self._dirty.add(channel_id)
+                if not typers:
+                    del self._channels[channel_id]
+
+    def drain(self, now=None):
+        """
+        移除過期的輸入者並取出需要廣播的頻道狀態
+        @return: {channel_id: [{'user_id', 'display_name'}]}，輸入者清空的頻道為空列表
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            for channel_id, typers in list(self._channels.items()):
+                expired = [uid for uid, (_, expires_at) in typers.items() if expires_at <= now]
+                if not expired:
+                    continue
+                for uid in expired:
+                    del typers[uid]
+                self._dirty.add(channel_id)
+                if not typers:
+                    del self._channels[channel_id]
+            if not self._dirty:
+                return {}
+            states = {}
+            for channel_id in self._dirty:
+                typers = self._channels.get(channel_id, {})
+                states[channel_id] = [
+                    {'user_id': uid, 'display_name': name} for uid, (name, _) in typers.items()
+                ]
+            self._dirty = set()
+            self.broadcasts += len(states)
+        return states
+
+    def stats(self):
+        with self._lock:
+            typing_users = sum(len(typers) for typers in self._channels.values())
+        return {
+            'channels': len(self._channels),
+            'typing_users': typing_users,
+            'updates': self.updates,
+            'broadcasts': self.broadcasts
+        }
@@ -5,7 +5,7 @@ from flask_appbuilder.security.sqla.models import User
 
 from . import appbuilder, db
 from .models import ChatMessage, UserProfile, ChatChannel
-from .apis import ChatMessageApi, UserProfileApi, ChatChannelApi
+from .apis import ChatMessageApi, UserProfileApi, ChatChannelApi, SocketStatsApi
 from .channel_member_api import ChannelMemberApi
 
 # Register REST APIs
@@ -13,6 +13,7 @@ appbuilder.add_api(ChatMessageApi)
 appbuilder.add_api(UserProfileApi)
 appbuilder.add_api(ChatChannelApi)
 appbuilder.add_api(ChannelMemberApi)
+appbuilder.add_api(SocketStatsApi)
 
 # Import and register security APIs
 from .security_apis import JWTAuthApi, RegisterApi
@@ -37,10 +38,7 @@ class ChatMessageView(ModelView):
         return self._is_admin()
     
     def _is_admin(self):
-        from flask import g
-        return (hasattr(g, 'user') and g.user and 
-                hasattr(g.user, 'roles') and 
-                any(role.name == 'Admin' for role in g.user.roles))
+        return self.appbuilder.sm.is_admin()
 
 
 class UserProfileView(ModelView):
@@ -58,10 +56,7 @@ class UserProfileView(ModelView):
         return self._is_admin()
     
     def _is_admin(self):
-        from flask import g
-        return (hasattr(g, 'user') and g.user and 
-                hasattr(g.user, 'roles') and 
-                any(role.name == 'Admin' for role in g.user.roles))
+        return self.appbuilder.sm.is_admin()
 
 
 class ChatChannelView(ModelView):
@@ -81,10 +76,7 @@ class ChatChannelView(ModelView):
         return self._is_admin()
     
     def _is_admin(self):
-        from flask import g
-        return (hasattr(g, 'user') and g.user and 
-                hasattr(g.user, 'roles') and 
-                any(role.name == 'Admin' for role in g.user.roles))
+        return self.appbuilder.sm.is_admin()
 
 
 class UserView(ModelView):
@@ -103,10 +95,7 @@ class UserView(ModelView):
         return self._is_admin()
     
     def _is_admin(self):
-        from flask import g
-        return (hasattr(g, 'user') and g.user and 
-                hasattr(g.user, 'roles') and 
-                any(role.name == 'Admin' for role in g.user.roles))
+        return self.appbuilder.sm.is_admin()
 
 
 # Register Admin Views
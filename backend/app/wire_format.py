@@ -0,0 +1,114 @@
+"""
+Socket.IO 事件的精簡二進位格式（MessagePack + 短鍵名）
+客戶端在連線時以 auth 的 wire / wire_version 選用；未選用或伺服器未安裝 msgpack 時沿用 JSON。
+
+選用 msgpack 的連線加入 '<房間>#msgpack' 而不是原本的房間：
+- BINARY_EVENTS 中的高頻事件對兩種房間各廣播一次，msgpack 房間收到的是 bytes（Socket.IO 二進位附件）
+- 其他事件仍以 JSON 同時送到兩種房間
+
+payload 中的欄位名稱依 KEY_MAP 縮短（遞迴套用於所有字典），前端 utils/wireFormat.ts 有對應的還原表，
+修改 KEY_MAP 時必須同步修改前端並遞增 WIRE_SCHEMA_VERSION
+"""
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover
+    msgpack = None
+
+WIRE_JSON = 'json'
+WIRE_MSGPACK = 'msgpack'
+WIRE_SCHEMA_VERSION = 1
+
+# 以二進位格式送給 msgpack 連線的事件
+# 二進位事件多一個附件封包（約 40 bytes 的事件封包開銷），message_deleted 這類極小的事件維持 JSON 反而較小
+BINARY_EVENTS = frozenset({
+    'new_message',
+    'new_messages',
+    'user_typing',
+    'typing_state',
+    'online_users',
+    'presence_snapshot',
+    'presence_delta',
+    'resume_messages',
+    'user_joined',
+    'user_left',
+})
+
+# 欄位名稱 -> 短鍵名（短鍵名不可與任何欄位名稱重複）
+KEY_MAP = {
+    'id': 'i',
+    'content': 'c',
+    'sender_id': 's',
+    'sender_name': 'n',
+    'created_on': 't',
+    'channel_id': 'h',
+    'seq': 'q',
+    'message_id': 'm',
+    'message_type': 'mt',
+    'user_id': 'u',
+    'username': 'un',
+    'display_name': 'd',
+    'connected_at': 'a',
+    'is_typing': 'y',
+    'users': 'us',
+    'joined': 'j',
+    'left': 'l',
+    'worker': 'w',
+    'messages': 'ms',
+    'complete': 'k',
+    'message': 'g',
+}
+REVERSE_KEY_MAP = {short: key for key, short in KEY_MAP.items()}
+
+
+def available():
+    return msgpack is not None
+
+
+def negotiate(auth):
+    """
+    依客戶端連線時的 auth 決定該連線的格式
+    只有在要求 msgpack、短鍵名版本相符且伺服器已安裝 msgpack 時才使用二進位格式
+    """
+    if not available() or not isinstance(auth, dict):
+        return WIRE_JSON
+    if auth.get('wire') != WIRE_MSGPACK:
+        return WIRE_JSON
+    try:
+        version = int(auth.get('wire_version') or 0)
+    except (TypeError, ValueError):
+        return WIRE_JSON
+    return WIRE_MSGPACK if version == WIRE_SCHEMA_VERSION else WIRE_JSON
+
+
+def wire_room(room, wire):
+    """連線實際加入的房間名稱"""
+    return f'{room}#{WIRE_MSGPACK}' if wire == WIRE_MSGPACK else room
+
+
+def compact(value, _short=KEY_MAP.get):
+    """遞迴將字典鍵名換成短鍵名（大型線上列表每次廣播都會經過，避免多餘的函式查找）"""
+    value_type = type(value)
+    if value_type is dict:
+        return {_short(key, key): compact(item) for key, item in value.items()}
+    if value_type is list or value_type is tuple:
+        return [compact(item) for item in value]
+    return value
+
+
+def expand(value):
+    """compact() 的反向操作"""
+    if isinstance(value, dict):
+        return {REVERSE_KEY_MAP.get(key, key): expand(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [expand(item) for item in value]
+    return value
+
+
+def encode(payload):
+    """將事件 payload 編碼為 msgpack bytes"""
+    return msgpack.packb(compact(payload), use_bin_type=True)
+
+
+def decode(data):
+    return expand(msgpack.unpackb(data, raw=False))
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+每個 HTTP 請求的認證成本
+以 Flask 測試客戶端對同一個 API 連續發送帶 Bearer token 的請求，統計每個請求的 JWT 解碼次數、
+認證相關的資料庫查詢數與認證耗時，比較兩種流程：
+
+- before: 模擬原本的行為（has_access 重新驗證 token、不使用已驗證 token 快取）
+- after:  單次驗證流程（request_user 保存在 g 上，has_access / jwt_required 沿用；已驗證 token 快取）
+
+預設的路徑分別是 @jwt_required 的 API 與 Flask-AppBuilder 的管理頁面（@has_access，
+頁面選單另外會對每個項目呼叫 has_access）
+
+使用方式:
+    python bench/auth_pipeline.py [--requests 2000] [--path /api/v1/userprofileapi/me]
+"""
+import argparse
+import os
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_PATHS = ['/api/v1/userprofileapi/me', '/chatchannelview/list/']
+
+
+class Counter:
+    """包裝函式，累計呼叫次數與耗時"""
+
+    def __init__(self, func):
+        self.func = func
+        self.calls = 0
+        self.seconds = 0.0
+
+    def __call__(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return self.func(*args, **kwargs)
+        finally:
+            self.seconds += time.perf_counter() - start
+            self.calls += 1
+
+
+def run(client, paths, headers, requests):
+    start = time.perf_counter()
+    for index in range(requests):
+        path = paths[index % len(paths)]
+        response = client.get(path, headers=headers)
+        if response.status_code >= 400:
+            raise RuntimeError(f'{path} 回應 {response.status_code}')
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=2000, help='每種流程的請求數')
+    parser.add_argument('--path', action='append', default=None, help='測試的 API 路徑（可重複指定）')
+    parser.add_argument('--username', default=None, help='簽發 token 的使用者（預設為第一個使用者）')
+    args = parser.parse_args()
+    paths = args.path or DEFAULT_PATHS
+
+    sys.path.insert(0, BACKEND_DIR)
+    import jwt
+    from flask import g
+    from sqlalchemy import event
+    from app import app, appbuilder, db
+    from app import auth
+
+    with app.app_context():
+        sm = appbuilder.sm
+        user = sm.find_user(username=args.username) if args.username else sm.get_all_users()[0]
+        token = auth.create_jwt_token(user, app)
+    headers = {'Authorization': f'Bearer {token}'}
+    client = app.test_client()
+
+    # 計數：JWT 解碼次數（auth 模組內的 jwt.decode）、認證耗時、資料庫查詢數
+    decode = Counter(jwt.decode)
+    auth.jwt.decode = decode
+    authenticate = Counter(sm.authenticate_token)
+    sm.authenticate_token = authenticate
+    queries = [0]
+    with app.app_context():
+        engine = db.engine
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def count_query(*_):
+        queries[0] += 1
+
+    single_pass_has_access = sm.has_access
+
+    def legacy_has_access(permission_name, view_name):
+        # 原本的 has_access 一律重新驗證 Authorization header
+        g.pop('auth_resolved', None)
+        return single_pass_has_access(permission_name, view_name)
+
+    cache_size = sm.token_cache.maxsize
+    modes = {
+        'before': (legacy_has_access, 0),
+        'after': (single_pass_has_access, cache_size)
+    }
+
+    # 預熱（建立資料庫連線、載入權限等）
+    run(client, paths, headers, 50)
+
+    results = {}
+    for name, (has_access, maxsize) in modes.items():
+        sm.has_access = has_access
+        sm.token_cache.maxsize = maxsize
+        sm.token_cache.clear()
+        for counter in (decode, authenticate):
+            counter.calls, counter.seconds = 0, 0.0
+        queries[0] = 0
+
+        elapsed = run(client, paths, headers, args.requests)
+        results[name] = elapsed
+        print(f"{name:>6}: {args.requests / elapsed:8.1f} req/s  "
+              f"認證 {authenticate.seconds / args.requests * 1e6:7.1f} µs/req  "
+              f"驗證 {authenticate.calls / args.requests:4.2f} 次/req  "
+              f"解碼 {decode.calls / args.requests:4.2f} 次/req  "
+              f"查詢 {queries[0] / args.requests:5.2f} 次/req")
+
+    sm.has_access = single_pass_has_access
+    auth.jwt.decode = decode.func
+    print(f"吞吐量提升: {results['before'] / results['after']:.2f}x（路徑: {', '.join(paths)}）")
+
+
+if __name__ == '__main__':
+    main()
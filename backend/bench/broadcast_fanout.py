@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+房間廣播扇出微基準測試
+比較每個收件者各自編碼封包與 FrameBroadcaster 預先編碼一次的 CPU 成本，
+並列出 FrameBroadcaster 統計中的編碼 / 寫入耗時（寫入只是放入記憶體佇列，不含網路）
+
+使用方式:
+    python bench/broadcast_fanout.py [--recipients 10,100,1000] [--broadcasts 200]
+"""
+import argparse
+import importlib.util
+import os
+import queue
+import time
+from datetime import datetime, timezone
+
+import socketio
+from socketio import packet
+
+# 直接載入 broadcast.py，避免初始化整個 Flask 應用
+_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'app', 'broadcast.py')
+_spec = importlib.util.spec_from_file_location('broadcast', _path)
+broadcast = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(broadcast)
+
+
+def make_server(recipients):
+    server = socketio.Server(async_mode='threading')
+    queues = {}
+
+    def send_eio_packet(eio_sid, pkt):
+        # 模擬 websocket 寫入：取得 frame 並放入該連線的佇列
+        queues[eio_sid].put(pkt.encode())
+
+    server._send_eio_packet = send_eio_packet
+    for i in range(recipients):
+        eio_sid = f'eio-{i}'
+        queues[eio_sid] = queue.SimpleQueue()
+        sid = server.manager.connect(eio_sid, '/')
+        server.manager.enter_room(sid, '/', 'channel:1')
+    return server
+
+
+def sample_message(i):
+    return {
+        'id': i,
+        'content': '大家好，今天下午三點開會，記得帶筆電',
+        'sender_id': 42,
+        'sender_name': 'alice',
+        'created_on': datetime.now(timezone.utc).isoformat(),
+        'channel_id': 1,
+        'seq': i
+    }
+
+
+def per_recipient(server, broadcasts):
+    """每個收件者各自建立並編碼封包（舊有 handler 逐一 emit 的成本）"""
+    start = time.perf_counter()
+    for i in range(broadcasts):
+        payload = sample_message(i)
+        for sid, eio_sid in server.manager.get_participants('/', 'channel:1'):
+            pkt = packet.Packet(packet.EVENT, data=['new_message', payload])
+            server._send_eio_packet(eio_sid, broadcast.FramePacket(pkt.encode()))
+    return time.perf_counter() - start
+
+
+def encode_once(server, broadcasts):
+    broadcaster = broadcast.FrameBroadcaster(server)
+    start = time.perf_counter()
+    for i in range(broadcasts):
+        broadcaster.broadcast('new_message', sample_message(i), 'channel:1')
+    return time.perf_counter() - start, broadcaster.stats.snapshot()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--recipients', default='10,100,1000', help='房間內的連線數（逗號分隔）')
+    parser.add_argument('--broadcasts', type=int, default=200, help='每種規模的廣播次數')
+    args = parser.parse_args()
+
+    print(f"{'recipients':>10} | {'per-recipient ms':>16} | {'encode-once ms':>14} | "
+          f"{'encode µs':>9} | {'write µs':>9} | {'speedup':>7}")
+    print('-' * 82)
+    for recipients in (int(n) for n in args.recipients.split(',')):
+        naive = per_recipient(make_server(recipients), args.broadcasts)
+        once, stats = encode_once(make_server(recipients), args.broadcasts)
+        print(f"{recipients:>10} | {naive / args.broadcasts * 1000:>16.3f} | {once / args.broadcasts * 1000:>14.3f} | "
+              f"{stats['encode_us']:>9.1f} | {stats['write_us']:>9.1f} | {naive / once:>6.1f}x")
+
+
+if __name__ == '__main__':
+    main()
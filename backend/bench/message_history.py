@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+訊息歷史每頁的查詢次數與耗時
+以同一個頻道的訊息比較兩種寫法（每種頁面大小各讀取多次，每次使用新的 session，與 API 請求相同）：
+
+- before: 查詢 ChatMessage 實體後逐筆 to_dict()，每個發送者延遲載入一次 sender
+- after:  ChatMessage.query_dicts() 以一個查詢取得訊息與發送者欄位
+
+使用方式:
+    python bench/message_history.py [--channel-id 1] [--sizes 20 50 100] [--rounds 50]
+"""
+import argparse
+import os
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--channel-id', type=int, default=1)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[20, 50, 100], help='每頁筆數')
+    parser.add_argument('--rounds', type=int, default=50, help='每種頁面大小的讀取次數')
+    args = parser.parse_args()
+
+    sys.path.insert(0, BACKEND_DIR)
+    from sqlalchemy import event
+    from app import app, db
+    from app.models import ChatMessage
+
+    def before(session, size):
+        rows = (
+            session.query(ChatMessage)
+            .filter(ChatMessage.is_deleted.is_(False), ChatMessage.channel_id == args.channel_id)
+            .order_by(ChatMessage.id.desc()).limit(size).all()
+        )
+        return [row.to_dict() for row in rows]
+
+    def after(session, size):
+        rows = (
+            ChatMessage.query_dicts(session)
+            .filter(ChatMessage.is_deleted.is_(False), ChatMessage.channel_id == args.channel_id)
+            .order_by(ChatMessage.id.desc()).limit(size).all()
+        )
+        return [ChatMessage.row_to_dict(row) for row in rows]
+
+    queries = [0]
+
+    def count(*_):
+        queries[0] += 1
+
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', count)
+        for size in args.sizes:
+            for name, page in (('before', before), ('after', after)):
+                queries[0] = 0
+                start = time.perf_counter()
+                for _ in range(args.rounds):
+                    result = page(db.session, size)
+                    db.session.remove()
+                elapsed = time.perf_counter() - start
+                senders = len({message['sender_id'] for message in result})
+                print(f"{name:>6} {size:>4} 筆/頁（{senders} 位發送者）: "
+                      f"{queries[0] / args.rounds:5.1f} 次查詢/頁  {elapsed / args.rounds * 1000:7.2f} ms/頁")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+訊息寫入吞吐量基準測試
+比較目前逐筆 commit 的寫入路徑與 MessageWriter 批次寫入 (batched / async) 的每秒訊息數
+
+使用獨立的暫存 SQLite 資料庫，不會動到 app.db
+
+使用方式:
+    python bench/message_writer.py [--messages 2000] [--senders 8] [--batch-size 100] [--latency 0.005]
+"""
+import argparse
+import importlib.util
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+
+from sqlalchemy import (
+    Boolean, Column, DateTime, ForeignKey, Integer, MetaData, String, Table, Text, create_engine, select
+)
+
+# 直接載入 message_writer.py，避免初始化整個 Flask 應用
+_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'app', 'message_writer.py')
+_spec = importlib.util.spec_from_file_location('message_writer', _path)
+message_writer = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(message_writer)
+
+metadata = MetaData()
+
+users = Table(
+    'ab_user', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('username', String(64)),
+)
+
+chat_messages = Table(
+    'chat_messages', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('content', Text, nullable=False),
+    Column('sender_id', Integer, ForeignKey('ab_user.id'), nullable=False),
+    Column('message_type', String(20), default='text'),
+    Column('is_deleted', Boolean, default=False),
+    Column('channel_id', Integer, default=1),
+    Column('created_on', DateTime),
+    Column('changed_on', DateTime),
+    Column('created_by_fk', Integer),
+    Column('changed_by_fk', Integer),
+)
+
+
+def make_engine(directory, name):
+    engine = create_engine(f'sqlite:///{os.path.join(directory, name)}')
+    metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(users.insert(), [{'id': 1, 'username': 'bench'}])
+    return engine
+
+
+def make_row(i):
+    now = datetime.now(timezone.utc)
+    return {
+        'content': f'benchmark message {i}',
+        'sender_id': 1,
+        'channel_id': 1,
+        'created_by_fk': 1,
+        'changed_by_fk': 1,
+        'created_on': now,
+        'changed_on': now
+    }
+
+
+def run_senders(messages, senders, send):
+    """以多個發送執行緒模擬同時發訊息的 Socket，回傳總耗時"""
+    per_sender = messages // senders
+
+    def worker(offset):
+        for i in range(per_sender):
+            send(offset + i)
+
+    threads = [threading.Thread(target=worker, args=(n * per_sender,)) for n in range(senders)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return time.perf_counter() - start, per_sender * senders
+
+
+def bench_sync(engine, messages, senders):
+    """目前的路徑：查詢使用者 + 插入 + commit，每則訊息一次交易"""
+    lock = threading.Lock()  # 模擬 SQLite 單一寫入者
+
+    def send(i):
+        with lock, engine.begin() as conn:
+            conn.execute(select(users.c.id).where(users.c.id == 1)).first()
+            conn.execute(chat_messages.insert(), [make_row(i)])
+
+    return run_senders(messages, senders, send)
+
+
+def bench_writer(engine, messages, senders, durability, batch_size, latency):
+    writer = message_writer.MessageWriter(
+        chat_messages, batch_size=batch_size, max_latency=latency, durability=durability
+    )
+    writer.start(engine)
+
+    def send(i):
+        row = make_row(i)
+        row['id'] = writer.next_id()
+        future = writer.submit(row)
+        if durability == message_writer.DURABILITY_BATCHED:
+            future.result()
+
+    elapsed, count = run_senders(messages, senders, send)
+    # async 模式要把佇列寫完才算完成持久化
+    start = time.perf_counter()
+    writer.stop(flush=True, timeout=60)
+    elapsed += time.perf_counter() - start
+    return elapsed, count, writer.stats()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--messages', type=int, default=2000, help='總訊息數')
+    parser.add_argument('--senders', type=int, default=8, help='同時發送的執行緒數')
+    parser.add_argument('--batch-size', type=int, default=100, help='單批最多寫入筆數')
+    parser.add_argument('--latency', type=float, default=0.005, help='批次最多等待秒數')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        results = []
+        elapsed, count = bench_sync(make_engine(directory, 'sync.db'), args.messages, args.senders)
+        results.append(('sync', elapsed, count, None))
+        for durability in (message_writer.DURABILITY_BATCHED, message_writer.DURABILITY_ASYNC):
+            elapsed, count, stats = bench_writer(
+                make_engine(directory, f'{durability}.db'), args.messages, args.senders,
+                durability, args.batch_size, args.latency
+            )
+            results.append((durability, elapsed, count, stats))
+
+    print(f"messages={args.messages} senders={args.senders} batch_size={args.batch_size} latency={args.latency}s")
+    print(f"{'mode':>8} | {'msgs/sec':>10} | {'total s':>8} | {'commits':>8} | {'avg batch':>9}")
+    print('-' * 56)
+    for mode, elapsed, count, stats in results:
+        commits = stats['batches'] if stats else count
+        avg_batch = stats['avg_batch_size'] if stats else 1
+        print(f"{mode:>8} | {count / elapsed:>10.0f} | {elapsed:>8.2f} | {commits:>8} | {avg_batch:>9}")
+
+
+if __name__ == '__main__':
+    main()
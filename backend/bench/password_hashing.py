@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+登入高峰下的密碼雜湊
+以多個執行緒（各自模擬不同的來源 IP）同時呼叫 /api/v1/auth/login，同時由一個探測執行緒每 10ms
+執行一段小工作（模擬同一程序中的 Socket 事件），比較兩種設定：
+
+- before: 原本的行為，每個請求在自己的執行緒直接雜湊，同時進行的雜湊數不受限制
+- after:  config.py 的 PASSWORD_HASH_* 設定（有上限的工作池、每個 IP 的上限）
+
+回報每秒成功登入數、登入延遲、被拒絕（429）的次數與探測工作的延遲
+
+使用方式:
+    python bench/password_hashing.py [--clients 16] [--seconds 10] [--username alice --password secret1]
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentile(values, q):
+    if not values:
+        return 0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def probe(stop, delays):
+    """每 10ms 執行一段小工作，記錄從預定時間到完成的延遲"""
+    payload = {'type': 'new_message', 'content': 'x' * 200, 'users': list(range(50))}
+    next_run = time.perf_counter()
+    while not stop.is_set():
+        next_run += 0.01
+        time.sleep(max(0, next_run - time.perf_counter()))
+        json.dumps(payload)
+        delays.append(time.perf_counter() - next_run)
+
+
+def client_loop(app, index, credentials, stop, results):
+    client = app.test_client(use_cookies=False)
+    environ = {'REMOTE_ADDR': f'10.0.{index // 250}.{index % 250 + 1}'}
+    while not stop.is_set():
+        start = time.perf_counter()
+        response = client.post('/api/v1/auth/login', json=credentials, environ_base=environ)
+        elapsed = time.perf_counter() - start
+        if response.status_code == 200:
+            results['ok'].append(elapsed)
+        elif response.status_code == 429:
+            results['rejected'] += 1
+            time.sleep(float(response.headers.get('Retry-After', 1)))
+        else:
+            raise RuntimeError(f'登入回應 {response.status_code}: {response.get_data(as_text=True)}')
+
+
+def run(app, clients, seconds, credentials):
+    stop = threading.Event()
+    results = {'ok': [], 'rejected': 0}
+    delays = []
+    threads = [threading.Thread(target=probe, args=(stop, delays), daemon=True)]
+    threads += [
+        threading.Thread(target=client_loop, args=(app, index, credentials, stop, results), daemon=True)
+        for index in range(clients)
+    ]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return results, delays
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clients', type=int, default=16, help='同時登入的客戶端數')
+    parser.add_argument('--seconds', type=float, default=10, help='每種設定的執行秒數')
+    parser.add_argument('--username', default='alice')
+    parser.add_argument('--password', default='secret1')
+    args = parser.parse_args()
+    credentials = {'username': args.username, 'password': args.password}
+
+    sys.path.insert(0, BACKEND_DIR)
+    from app import app
+    from app.password_hashing import password_hasher, configure_password_hashing
+
+    settings = {
+        'before': lambda: password_hasher.configure(
+            max_workers=args.clients, max_pending=args.clients, per_client=0,
+            method=app.config.get('FAB_PASSWORD_HASH_METHOD', 'scrypt')
+        ),
+        'after': lambda: configure_password_hashing(app.config)
+    }
+    for name, configure in settings.items():
+        configure()
+        results, delays = run(app, args.clients, args.seconds, credentials)
+        ok = results['ok']
+        print(f"{name:>6}: {len(ok) / args.seconds:6.1f} 登入/s  "
+              f"延遲 p50 {percentile(ok, 0.5) * 1000:6.0f}ms p99 {percentile(ok, 0.99) * 1000:6.0f}ms  "
+              f"429 {results['rejected']:4d}  "
+              f"探測延遲 p50 {percentile(delays, 0.5) * 1000:5.1f}ms p99 {percentile(delays, 0.99) * 1000:6.1f}ms "
+              f"max {max(delays, default=0) * 1000:6.1f}ms")
+    print(f"工作池: {password_hasher.stats()}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+每個 HTTP 請求的權限檢查成本
+以 Flask 測試客戶端對管理頁面（@has_access，頁面選單對每個項目再呼叫 has_access）與
+需要管理員的 API 連續發送帶 Bearer token 的請求，統計 has_access / is_admin 的呼叫次數、耗時與資料庫查詢數，
+比較兩種方式：
+
+- before: Flask-AppBuilder 的逐次查詢（PERMISSION_INDEX = False）
+- after:  角色權限索引（集合查詢，不存取資料庫）
+
+使用方式:
+    python bench/permission_checks.py [--requests 1000] [--path /chatchannelview/list/]
+"""
+import argparse
+import os
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_PATHS = ['/chatchannelview/list/', '/api/v1/socket/stats']
+
+
+class Counter:
+    """包裝函式，累計呼叫次數與耗時"""
+
+    def __init__(self, func):
+        self.func = func
+        self.calls = 0
+        self.seconds = 0.0
+
+    def __call__(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return self.func(*args, **kwargs)
+        finally:
+            self.seconds += time.perf_counter() - start
+            self.calls += 1
+
+
+def run(client, paths, headers, requests):
+    start = time.perf_counter()
+    for index in range(requests):
+        path = paths[index % len(paths)]
+        response = client.get(path, headers=headers)
+        if response.status_code >= 400:
+            raise RuntimeError(f'{path} 回應 {response.status_code}')
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=1000, help='每種方式的請求數')
+    parser.add_argument('--path', action='append', default=None, help='測試的路徑（可重複指定）')
+    parser.add_argument('--username', default=None, help='簽發 token 的使用者（需為管理員，預設為第一個使用者）')
+    args = parser.parse_args()
+    paths = args.path or DEFAULT_PATHS
+
+    sys.path.insert(0, BACKEND_DIR)
+    from sqlalchemy import event
+    from app import app, appbuilder, db
+    from app.auth import create_jwt_token
+
+    with app.app_context():
+        sm = appbuilder.sm
+        user = sm.find_user(username=args.username) if args.username else sm.get_all_users()[0]
+        token = create_jwt_token(user, app)
+    headers = {'Authorization': f'Bearer {token}'}
+    client = app.test_client()
+
+    # 只計算權限檢查本身：外層的 has_access / is_admin 呼叫（內部的巢狀呼叫不重複計算）
+    has_access = Counter(sm.has_access)
+    sm.has_access = has_access
+    is_admin = Counter(sm.is_admin)
+    sm.is_admin = is_admin
+    queries = [0]
+    with app.app_context():
+        engine = db.engine
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def count_query(*_):
+        queries[0] += 1
+
+    index = sm.permission_index
+    modes = {'before': None, 'after': index}
+
+    # 預熱（建立資料庫連線、載入索引等）
+    run(client, paths, headers, 50)
+
+    results = {}
+    for name, permission_index in modes.items():
+        sm.permission_index = permission_index
+        for counter in (has_access, is_admin):
+            counter.calls, counter.seconds = 0, 0.0
+        queries[0] = 0
+
+        elapsed = run(client, paths, headers, args.requests)
+        results[name] = elapsed
+        checks = has_access.calls + is_admin.calls
+        check_seconds = has_access.seconds + is_admin.seconds
+        print(f"{name:>6}: {args.requests / elapsed:8.1f} req/s  "
+              f"權限檢查 {checks / args.requests:5.2f} 次/req  "
+              f"{check_seconds / args.requests * 1e6:8.1f} µs/req "
+              f"({check_seconds / max(checks, 1) * 1e6:6.1f} µs/次)  "
+              f"查詢 {queries[0] / args.requests:5.2f} 次/req")
+
+    sm.permission_index = index
+    print(f"吞吐量提升: {results['before'] / results['after']:.2f}x（路徑: {', '.join(paths)}）")
+    print(f"索引: {index.stats()}")
+
+
+if __name__ == '__main__':
+    main()
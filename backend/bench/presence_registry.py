@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+線上使用者註冊表微基準測試
+比較舊版 sid -> dict 線性掃描與 PresenceRegistry 在不同連線數下的連線/斷線成本
+
+使用方式:
+    python bench/presence_registry.py [--sizes 100,1000,10000] [--ops 2000]
+"""
+import argparse
+import importlib.util
+import os
+import time
+from datetime import datetime
+
+# 直接載入 presence.py，避免初始化整個 Flask 應用
+_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'app', 'presence.py')
+_spec = importlib.util.spec_from_file_location('presence', _path)
+presence = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(presence)
+
+
+class LegacyOnlineUsers:
+    """舊版 online_users 實作：每次連線/斷線都掃描所有連線"""
+
+    def __init__(self):
+        self.online_users = {}
+
+    def add(self, sid, user_id, username, display_name):
+        for old_sid, info in list(self.online_users.items()):
+            if info['user_id'] == user_id:
+                del self.online_users[old_sid]
+        self.online_users[sid] = {
+            'user_id': user_id,
+            'username': username,
+            'display_name': display_name,
+            'connected_at': datetime.now().isoformat()
+        }
+
+    def remove(self, sid):
+        info = self.online_users.get(sid)
+        if not info:
+            return None, False
+        other_connections = any(
+            other != sid and i['user_id'] == info['user_id']
+            for other, i in self.online_users.items()
+        )
+        del self.online_users[sid]
+        return info, not other_connections
+
+    def snapshot(self):
+        unique_users = {}
+        for info in self.online_users.values():
+            unique_users[info['user_id']] = info
+        return list(unique_users.values())
+
+
+def populate(registry, size):
+    for i in range(size):
+        registry.add(f'sid-{i}', i, f'user{i}', f'user{i}')
+
+
+def measure(factory, size, ops):
+    """預先放入 size 個連線後，量測 ops 次「連線 + 列表 + 斷線」的平均耗時（微秒）"""
+    registry = factory()
+    populate(registry, size)
+    connect_total = disconnect_total = snapshot_total = 0.0
+    for i in range(ops):
+        sid = f'bench-{i}'
+        user_id = size + i
+        t0 = time.perf_counter()
+        registry.add(sid, user_id, 'bench', 'bench')
+        t1 = time.perf_counter()
+        registry.snapshot()
+        t2 = time.perf_counter()
+        registry.remove(sid)
+        t3 = time.perf_counter()
+        connect_total += t1 - t0
+        snapshot_total += t2 - t1
+        disconnect_total += t3 - t2
+    scale = 1_000_000 / ops
+    return connect_total * scale, disconnect_total * scale, snapshot_total * scale
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='100,1000,10000', help='既有連線數（逗號分隔）')
+    parser.add_argument('--ops', type=int, default=2000, help='每種規模量測的操作次數')
+    args = parser.parse_args()
+
+    print(f"{'connections':>12} | {'impl':>8} | {'connect µs':>11} | {'disconnect µs':>13} | {'snapshot µs':>11}")
+    print('-' * 68)
+    for size in (int(s) for s in args.sizes.split(',')):
+        for name, factory in (('legacy', LegacyOnlineUsers), ('registry', presence.PresenceRegistry)):
+            connect, disconnect, snapshot = measure(factory, size, args.ops)
+            print(f"{size:>12} | {name:>8} | {connect:>11.2f} | {disconnect:>13.2f} | {snapshot:>11.2f}")
+
+
+if __name__ == '__main__':
+    main()
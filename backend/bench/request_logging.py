@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+日誌設定對 HTTP 請求吞吐量的影響
+以 Flask 測試客戶端對同一個需要 JWT 的 API 連續發送請求，比較兩種日誌設定：
+
+- before: 模擬原本的行為（root 等級 DEBUG、所有逐請求日誌同步寫出、不取樣）
+- after:  config.py 的 LOG_* 設定（各模組等級、取樣、非同步佇列輸出）
+
+兩種設定都寫入同一個日誌檔（--log-file，預設為暫存檔），只比較格式化與 I/O 的差異
+
+使用方式:
+    python bench/request_logging.py [--requests 2000] [--path /api/v1/chatchannelapi/my-channels]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run(client, path, headers, requests):
+    start = time.perf_counter()
+    for _ in range(requests):
+        response = client.get(path, headers=headers)
+        if response.status_code >= 400:
+            raise RuntimeError(f'{path} 回應 {response.status_code}')
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=2000, help='每種設定的請求數')
+    parser.add_argument('--path', default='/api/v1/chatchannelapi/my-channels', help='測試的 API 路徑')
+    parser.add_argument('--username', default=None, help='簽發 token 的使用者（預設為第一個使用者）')
+    parser.add_argument('--log-file', default=None, help='日誌輸出檔案（預設為暫存檔）')
+    args = parser.parse_args()
+
+    sys.path.insert(0, BACKEND_DIR)
+    from app import app, appbuilder
+    from app.auth import create_jwt_token
+    from app.logging_config import configure_logging, flush_logging, logging_stats
+
+    log_file = args.log_file or tempfile.NamedTemporaryFile(prefix='request_logging_', suffix='.log', delete=False).name
+    with app.app_context():
+        sm = appbuilder.sm
+        user = sm.find_user(username=args.username) if args.username else sm.get_all_users()[0]
+        token = create_jwt_token(user, app)
+    headers = {'Authorization': f'Bearer {token}'}
+    client = app.test_client()
+
+    settings = {
+        'before': {
+            'LOG_LEVEL': 'DEBUG',
+            'LOG_LEVELS': {name: 'DEBUG' for name in app.config.get('LOG_LEVELS', {})},
+            'LOG_ASYNC': False,
+            'LOG_SAMPLING': {},
+            'LOG_SAMPLING_DEFAULT': (float('inf'), float('inf'))
+        },
+        'after': dict(app.config)
+    }
+    # 預熱（建立資料庫連線、載入權限等）
+    configure_logging(dict(app.config, LOG_FILE=log_file))
+    run(client, args.path, headers, 50)
+
+    results = {}
+    for name, config in settings.items():
+        configure_logging(dict(config, LOG_FILE=log_file))
+        size = os.path.getsize(log_file)
+        elapsed = run(client, args.path, headers, args.requests)
+        flush_logging()
+        stats = logging_stats()
+        results[name] = elapsed
+        print(f"{name:>6}: {args.requests / elapsed:8.1f} req/s  "
+              f"{elapsed / args.requests * 1000:6.3f} ms/req  "
+              f"日誌 {(os.path.getsize(log_file) - size) / 1024:8.1f} KiB  "
+              f"取樣略過 {stats['sampled_out']}  丟棄 {stats['dropped']}")
+    print(f"吞吐量提升: {results['before'] / results['after']:.2f}x（日誌檔: {log_file}）")
+
+
+if __name__ == '__main__':
+    main()
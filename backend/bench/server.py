@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+基準測試用的 Socket.IO 伺服器啟動器
+與 run.py 相同，但可指定非同步模式與埠號，並關閉 debug/reloader 以便量測
+建立測試資料的基準測試先呼叫 use_scratch_database()，測試使用者與頻道不會寫入 app.db
+
+使用方式:
+    python bench/server.py --async-mode eventlet --port 8090
+"""
+import argparse
+import atexit
+import os
+import shutil
+import subprocess
+import socket
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def use_scratch_database(uri=None):
+    """
+    讓本程序與之後 spawn_server() 啟動的伺服器使用暫存的 SQLite 資料庫（程序結束時刪除）
+    必須在匯入 app 之前呼叫；指定 uri 時改用該資料庫（例如 --url 指定的伺服器所用的資料庫）
+    """
+    if 'app' in sys.modules:
+        raise RuntimeError('必須在匯入 app 之前設定資料庫')
+    if uri is None:
+        directory = tempfile.mkdtemp(prefix='chat-bench-')
+        atexit.register(shutil.rmtree, directory, ignore_errors=True)
+        uri = 'sqlite:///' + os.path.join(directory, 'bench.db')
+    os.environ['CHAT_DATABASE_URI'] = uri
+    return uri
+
+
+def spawn_server(async_mode='threading', port=8090, env=None, quiet=True):
+    """以子程序啟動伺服器並等待埠號可連線，回傳 Popen 物件"""
+    child_env = dict(os.environ, SOCKETIO_ASYNC_MODE=async_mode, **(env or {}))
+    output = subprocess.DEVNULL if quiet else None
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(BACKEND_DIR, 'bench', 'server.py'),
+         '--async-mode', async_mode, '--port', str(port)],
+        cwd=BACKEND_DIR, env=child_env, stdout=output, stderr=output
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'伺服器啟動失敗 (exit code {process.returncode})')
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return process
+        except OSError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError('等待伺服器啟動逾時')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--async-mode', default=os.getenv('SOCKETIO_ASYNC_MODE', 'threading'),
+                        choices=['threading', 'eventlet', 'gevent'])
+    parser.add_argument('--port', type=int, default=8090)
+    args = parser.parse_args()
+
+    # 必須在匯入 app 之前修補標準函式庫
+    os.environ['SOCKETIO_ASYNC_MODE'] = args.async_mode
+    if args.async_mode == 'eventlet':
+        import eventlet
+        eventlet.monkey_patch()
+    elif args.async_mode == 'gevent':
+        from gevent import monkey
+        monkey.patch_all()
+
+    sys.path.insert(0, BACKEND_DIR)
+    from app import app
+    from app.socketio_server import socketio
+
+    print(f"基準測試伺服器啟動: async_mode={socketio.async_mode} port={args.port}", flush=True)
+    socketio.run(app, host='127.0.0.1', port=args.port, debug=False, use_reloader=False,
+                 log_output=False, allow_unsafe_werkzeug=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Socket.IO 單一程序連線容量測試
+依序以 threading / eventlet / gevent 模式啟動伺服器，量測可同時維持多少閒置與活躍連線
+
+- 閒置階段：以固定速率建立連線，維持 --hold 秒後統計仍在線的連線數
+- 活躍階段：所有連線每 --interval 秒發送一則訊息，統計送達數與伺服器資源用量
+
+測試使用者與頻道建立在暫存的 SQLite 資料庫（結束時刪除），不會寫入 app.db。
+需要額外套件：pip install -r requirements_bench.txt
+
+使用方式:
+    python bench/socket_capacity.py --modes threading,eventlet --connections 500,2000
+"""
+import argparse
+import asyncio
+import os
+import secrets
+import sys
+import time
+
+import socketio
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from server import spawn_server, use_scratch_database  # noqa: E402
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+
+def mint_tokens(count):
+    """
+    建立基準測試使用者與測試頻道（須先呼叫 use_scratch_database()），使用者都加入頻道並簽發 JWT
+    @return: (tokens, channel_id)
+    """
+    from flask import g
+    from app import app, appbuilder, db
+    from app.auth import create_jwt_token
+    from app.models import ChannelMember, ChatChannel
+
+    sm = appbuilder.sm
+    tokens = []
+    with app.app_context():
+        role_name = app.config.get('AUTH_USER_REGISTRATION_ROLE', 'Public')
+        role = sm.find_role(role_name)
+        if role is None:
+            raise RuntimeError(f'找不到註冊使用者的角色 {role_name}')
+        users = []
+        for i in range(count):
+            username = f'bench_user_{i}'
+            user = sm.find_user(username=username)
+            if not user:
+                # 以 JWT 連線，不需要知道密碼
+                user = sm.add_user(username, 'bench', str(i), f'{username}@bench.local', role,
+                                   password=secrets.token_urlsafe(32))
+            users.append(user)
+
+        g.user = users[0]  # AuditMixin 以 g.user 填入 created_by
+        channel = ChatChannel(name='bench-capacity', creator_id=users[0].id, is_private=False, max_members=count + 1)
+        db.session.add(channel)
+        db.session.flush()
+        channel_id = channel.id
+        for user in users:
+            # 成為頻道成員，連線時才會自動加入頻道房間並收到廣播
+            g.user = user
+            db.session.add(ChannelMember(channel_id=channel_id, user_id=user.id, role='member', status='active'))
+            tokens.append(create_jwt_token(user, app))
+        db.session.commit()
+    return tokens, channel_id
+
+
+def server_usage(process):
+    if psutil is None or process is None:
+        return None, None
+    proc = psutil.Process(process.pid)
+    return proc.cpu_percent(interval=0.5), proc.memory_info().rss / (1024 * 1024)
+
+
+async def open_clients(url, tokens, count, rate):
+    """以每秒 rate 個的速率建立 count 個連線，回傳成功連線的 client 與失敗數"""
+    clients = []
+    failures = 0
+
+    async def connect(token):
+        nonlocal failures
+        client = socketio.AsyncClient(reconnection=False)
+        client.received = 0
+
+        @client.on('new_message')
+        async def on_message(data):
+            client.received += 1
+
+        try:
+            await client.connect(url, auth={'token': token}, transports=['websocket'], wait_timeout=10)
+            clients.append(client)
+        except Exception:
+            failures += 1
+
+    tasks = []
+    for i in range(count):
+        tasks.append(asyncio.create_task(connect(tokens[i % len(tokens)])))
+        await asyncio.sleep(1 / rate)
+    await asyncio.gather(*tasks)
+    return clients, failures
+
+
+async def run_level(url, tokens, channel_id, count, args, process):
+    start = time.perf_counter()
+    clients, failures = await open_clients(url, tokens, count, args.rate)
+    connect_seconds = time.perf_counter() - start
+
+    await asyncio.sleep(args.hold)
+    idle_alive = sum(1 for c in clients if c.connected)
+    idle_cpu, idle_rss = server_usage(process)
+
+    # 活躍階段：所有連線定期發送訊息到同一頻道
+    sent = 0
+    deadline = time.monotonic() + args.active
+    while time.monotonic() < deadline:
+        for client in clients:
+            if client.connected:
+                await client.emit('send_message', {'content': 'capacity test', 'channel_id': channel_id})
+                sent += 1
+        await asyncio.sleep(args.interval)
+    await asyncio.sleep(1)
+    active_alive = sum(1 for c in clients if c.connected)
+    active_cpu, active_rss = server_usage(process)
+    received = sum(c.received for c in clients)
+
+    await asyncio.gather(*(c.disconnect() for c in clients if c.connected), return_exceptions=True)
+    return {
+        'connections': count,
+        'connected': len(clients),
+        'failures': failures,
+        'connect_rate': len(clients) / connect_seconds if connect_seconds else 0,
+        'idle_alive': idle_alive,
+        'active_alive': active_alive,
+        'sent': sent,
+        'received': received,
+        'idle_rss': idle_rss,
+        'active_rss': active_rss,
+        'active_cpu': active_cpu,
+    }
+
+
+def fmt(value, spec):
+    return format(value, spec) if value is not None else '-'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--modes', default='threading,eventlet', help='要測試的非同步模式（逗號分隔）')
+    parser.add_argument('--connections', default='200,1000', help='每一輪的連線數（逗號分隔）')
+    parser.add_argument('--users', type=int, default=50, help='基準測試使用者數（連線會輪流使用）')
+    parser.add_argument('--rate', type=float, default=200, help='每秒建立的連線數')
+    parser.add_argument('--hold', type=float, default=5, help='閒置階段維持秒數')
+    parser.add_argument('--active', type=float, default=5, help='活躍階段持續秒數')
+    parser.add_argument('--interval', type=float, default=1.0, help='活躍階段每個連線的發送間隔（秒）')
+    parser.add_argument('--port', type=int, default=8090)
+    args = parser.parse_args()
+
+    use_scratch_database()
+    tokens, channel_id = mint_tokens(args.users)
+    url = f'http://127.0.0.1:{args.port}'
+    rows = []
+    for mode in args.modes.split(','):
+        for count in (int(c) for c in args.connections.split(',')):
+            process = spawn_server(mode, args.port)
+            try:
+                result = asyncio.run(run_level(url, tokens, channel_id, count, args, process))
+            finally:
+                process.terminate()
+                process.wait()
+            result['mode'] = mode
+            rows.append(result)
+            print(f"{mode} {count}: {result}", flush=True)
+
+    print()
+    print(f"{'mode':>9} | {'target':>6} | {'conn':>6} | {'fail':>5} | {'conn/s':>7} | {'idle ok':>7} | "
+          f"{'active ok':>9} | {'delivered':>10} | {'rss MB':>7} | {'cpu %':>6}")
+    print('-' * 100)
+    for r in rows:
+        print(f"{r['mode']:>9} | {r['connections']:>6} | {r['connected']:>6} | {r['failures']:>5} | "
+              f"{r['connect_rate']:>7.0f} | {r['idle_alive']:>7} | {r['active_alive']:>9} | "
+              f"{r['received']:>10} | {fmt(r['active_rss'], '7.1f')} | {fmt(r['active_cpu'], '6.1f')}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,400 @@
+#!/usr/bin/env python3
+"""
+Socket.IO 負載測試：模擬大量使用者的聊天行為
+在本機啟動伺服器（或連線到 --url 指定的本機伺服器），以 python-socketio 的非同步客戶端
+建立 N 個同時連線，依設定的速率在多個頻道中發送訊息、輸入狀態與切換頻道，並回報：
+
+- 連線速率、連線耗時百分位數、連線失敗數
+- 訊息端到端延遲百分位數（發送時間寫在訊息內容中，所有客戶端在同一程序，時間來源一致）
+- 送達率（實際送達數 / 發送時頻道內的連線數總和）
+- 被伺服器中斷的連線數、被限流的事件數
+- 伺服器 CPU / RSS（每秒取樣，需要 psutil）
+
+每個連線使用獨立的測試使用者（bench_user_<n>），使用者 n 是頻道 n % --channels 的成員；
+測試使用者與頻道建立在暫存的 SQLite 資料庫（結束時刪除），不會寫入 app.db。
+使用已啟動的伺服器（--url）時必須以 --database-uri 指定該伺服器使用的資料庫，測試資料會寫入其中。
+需要額外套件：pip install -r requirements_bench.txt
+
+使用方式:
+    python bench/socket_load.py --clients 1000 --channels 20 --duration 30 --send-rate 0.2
+    python bench/socket_load.py --url http://127.0.0.1:5000 --database-uri sqlite:////tmp/load.db --clients 200
+"""
+import argparse
+import asyncio
+import importlib.util
+import json
+import os
+import random
+import secrets
+import sys
+import time
+
+import socketio
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+sys.path.append(BENCH_DIR)
+
+from server import spawn_server, use_scratch_database  # noqa: E402
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# 直接載入 wire_format.py，解碼 msgpack 連線收到的事件
+_path = os.path.join(BACKEND_DIR, 'app', 'wire_format.py')
+_spec = importlib.util.spec_from_file_location('wire_format', _path)
+wire_format = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(wire_format)
+
+CONTENT_PREFIX = 'load-test'
+
+
+def prepare_fixtures(clients, channels):
+    """
+    建立（或沿用）測試頻道與使用者，並簽發 JWT（須先呼叫 use_scratch_database()）
+    @return: (tokens, channel_ids)，tokens[i] 的使用者是 channel_ids[i % channels] 的成員
+    """
+    sys.path.insert(0, BACKEND_DIR)
+    from flask import g
+    from app import app, appbuilder, db
+    from app.auth import create_jwt_token
+    from app.models import ChatChannel, ChannelMember
+
+    sm = appbuilder.sm
+    tokens = []
+    with app.app_context():
+        role_name = app.config.get('AUTH_USER_REGISTRATION_ROLE', 'Public')
+        role = sm.find_role(role_name)
+        if role is None:
+            raise RuntimeError(f'找不到註冊使用者的角色 {role_name}')
+        users = []
+        for i in range(clients):
+            username = f'bench_user_{i}'
+            user = sm.find_user(username=username)
+            if not user:
+                # 以 JWT 連線，不需要知道密碼
+                user = sm.add_user(username, 'bench', str(i), f'{username}@bench.local', role,
+                                   password=secrets.token_urlsafe(32))
+            users.append(user)
+
+        channel_ids = []
+        for i in range(channels):
+            name = f'bench-load-{i}'
+            channel = db.session.query(ChatChannel).filter_by(name=name, is_active=True).first()
+            if not channel:
+                g.user = users[0]  # AuditMixin 以 g.user 填入 created_by
+                channel = ChatChannel(name=name, creator_id=users[0].id, is_private=False, max_members=clients + 1)
+                db.session.add(channel)
+                db.session.flush()
+            channel_ids.append(channel.id)
+
+        existing = {
+            (channel_id, user_id)
+            for channel_id, user_id in db.session.query(ChannelMember.channel_id, ChannelMember.user_id).filter(
+                ChannelMember.channel_id.in_(channel_ids)
+            )
+        }
+        for i, user in enumerate(users):
+            channel_id = channel_ids[i % channels]
+            if (channel_id, user.id) not in existing:
+                g.user = user
+                db.session.add(ChannelMember(channel_id=channel_id, user_id=user.id, role='member', status='active'))
+            tokens.append(create_jwt_token(user, app))
+        db.session.commit()
+    return tokens, channel_ids
+
+
+def percentiles(values):
+    if not values:
+        return {'count': 0, 'p50': None, 'p95': None, 'p99': None, 'max': None}
+    ordered = sorted(values)
+
+    def pick(q):
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+    return {'count': len(ordered), 'p50': pick(0.5), 'p95': pick(0.95), 'p99': pick(0.99), 'max': ordered[-1]}
+
+
+class LoadStats:
+    def __init__(self):
+        self.connect_seconds = []
+        self.connect_failures = 0
+        self.dropped = 0
+        self.sent = 0
+        self.expected = 0
+        self.delivered = 0
+        self.latencies = []
+        self.typing = 0
+        self.joins = 0
+        self.rate_limited = 0
+        self.errors = 0
+        self.cpu = []
+        self.rss = []
+
+
+class SimulatedClient:
+    """
+    一個模擬使用者：連線時加入所屬頻道的房間，join 行為再加入其他頻道（不會離開原本的房間），
+    訊息發送到最後加入的頻道；收到的訊息依內容中的時間計算延遲
+    """
+
+    def __init__(self, index, token, channel_id, stats, room_sizes, wire):
+        self.index = index
+        self.token = token
+        self.channel_id = channel_id
+        self.rooms = {channel_id}
+        self.stats = stats
+        self.room_sizes = room_sizes
+        self.wire = wire
+        self.closing = False
+        self.client = socketio.AsyncClient(reconnection=False)
+        self._register()
+
+    def _decode(self, data):
+        if isinstance(data, (bytes, bytearray)):
+            return wire_format.decode(data)
+        return data
+
+    def _register(self):
+        client = self.client
+        stats = self.stats
+
+        def received(message):
+            content = message.get('content') or ''
+            if content.startswith(CONTENT_PREFIX):
+                stats.delivered += 1
+                stats.latencies.append(time.perf_counter() - float(content.split(':', 2)[1]))
+
+        @client.on('new_message')
+        async def on_message(data):
+            received(self._decode(data))
+
+        @client.on('new_messages')
+        async def on_messages(data):
+            for message in self._decode(data).get('messages') or []:
+                received(message)
+
+        @client.on('error')
+        async def on_error(data):
+            data = self._decode(data) or {}
+            if data.get('retry_after') is not None:
+                stats.rate_limited += 1
+                if data.get('event') == 'send_message':
+                    # 被拒絕的訊息不會送達（以目前的頻道人數近似扣除）
+                    stats.expected -= self.room_sizes[self.channel_id]
+            else:
+                stats.errors += 1
+
+        @client.on('disconnect')
+        async def on_disconnect(*args):
+            for channel_id in self.rooms:
+                self.room_sizes[channel_id] -= 1
+            if not self.closing:
+                stats.dropped += 1
+
+    async def connect(self, url):
+        auth = {'token': self.token}
+        if self.wire == wire_format.WIRE_MSGPACK:
+            auth.update(wire=wire_format.WIRE_MSGPACK, wire_version=wire_format.WIRE_SCHEMA_VERSION)
+        start = time.perf_counter()
+        try:
+            await self.client.connect(url, auth=auth, transports=['websocket'], wait_timeout=10)
+        except Exception:
+            self.stats.connect_failures += 1
+            return False
+        self.stats.connect_seconds.append(time.perf_counter() - start)
+        self.room_sizes[self.channel_id] += 1
+        return True
+
+    async def send(self, sequence):
+        await self.client.emit('send_message', {
+            'content': f'{CONTENT_PREFIX}:{time.perf_counter()!r}:{self.index}-{sequence}',
+            'channel_id': self.channel_id
+        })
+        self.stats.sent += 1
+        self.stats.expected += self.room_sizes[self.channel_id]
+
+    async def typing(self):
+        await self.client.emit('typing', {'is_typing': True, 'channel_id': self.channel_id})
+        self.stats.typing += 1
+
+    async def join(self, channel_ids):
+        """切換到另一個頻道（公開測試頻道，join_channel 不需要成員資格）"""
+        channel_id = random.choice(channel_ids)
+        await self.client.emit('join_channel', {'channel_id': channel_id})
+        if channel_id not in self.rooms:
+            self.rooms.add(channel_id)
+            self.room_sizes[channel_id] += 1
+        self.channel_id = channel_id
+        self.stats.joins += 1
+
+    async def run(self, args, channel_ids, deadline):
+        """依 --send-rate / --typing-rate / --join-rate（每個連線每秒次數）以指數分布的間隔產生行為"""
+        total = args.send_rate + args.typing_rate + args.join_rate
+        sequence = 0
+        while total and self.client.connected:
+            await asyncio.sleep(random.expovariate(total))
+            if time.monotonic() >= deadline or not self.client.connected:
+                return
+            pick = random.uniform(0, total)
+            try:
+                if pick < args.send_rate:
+                    sequence += 1
+                    await self.send(sequence)
+                elif pick < args.send_rate + args.typing_rate:
+                    await self.typing()
+                else:
+                    await self.join(channel_ids)
+            except socketio.exceptions.BadNamespaceError:
+                return
+
+    async def close(self):
+        self.closing = True
+        if self.client.connected:
+            await self.client.disconnect()
+
+
+async def sample_server(process, stats, stop):
+    """每秒取樣伺服器程序的 CPU 與 RSS"""
+    if psutil is None or process is None:
+        return
+    proc = psutil.Process(process.pid)
+    proc.cpu_percent(None)
+    while not stop.is_set():
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=1.0)
+        except asyncio.TimeoutError:
+            pass
+        try:
+            stats.cpu.append(proc.cpu_percent(None))
+            stats.rss.append(proc.memory_info().rss / (1024 * 1024))
+        except psutil.Error:
+            return
+
+
+async def run_load(url, tokens, channel_ids, args, process):
+    stats = LoadStats()
+    room_sizes = {channel_id: 0 for channel_id in channel_ids}
+    clients = [
+        SimulatedClient(i, token, channel_ids[i % len(channel_ids)], stats, room_sizes, args.wire)
+        for i, token in enumerate(tokens)
+    ]
+    stop = asyncio.Event()
+    sampler = asyncio.create_task(sample_server(process, stats, stop))
+
+    # 連線階段：以每秒 --connect-rate 個的速率建立連線
+    start = time.perf_counter()
+    tasks = []
+    for client in clients:
+        tasks.append(asyncio.create_task(client.connect(url)))
+        await asyncio.sleep(1 / args.connect_rate)
+    results = await asyncio.gather(*tasks)
+    connect_elapsed = time.perf_counter() - start
+    connected = [client for client, ok in zip(clients, results) if ok]
+    print(f"已連線 {len(connected)}/{len(clients)}（{connect_elapsed:.1f} 秒），開始負載 {args.duration} 秒", flush=True)
+
+    # 負載階段
+    await asyncio.sleep(args.warmup)
+    deadline = time.monotonic() + args.duration
+    await asyncio.gather(*(client.run(args, channel_ids, deadline) for client in connected))
+    # 等待最後的訊息送達
+    await asyncio.sleep(args.drain)
+    alive = sum(1 for client in connected if client.client.connected)
+
+    await asyncio.gather(*(client.close() for client in clients), return_exceptions=True)
+    stop.set()
+    await sampler
+
+    return {
+        'clients': len(clients),
+        'connected': len(connected),
+        'connect_failures': stats.connect_failures,
+        'connect_rate': len(connected) / connect_elapsed if connect_elapsed else 0,
+        'connect_ms': {k: v * 1000 if isinstance(v, float) else v for k, v in percentiles(stats.connect_seconds).items()},
+        'alive_after_load': alive,
+        'dropped': stats.dropped,
+        'sent': stats.sent,
+        'typing': stats.typing,
+        'joins': stats.joins,
+        'rate_limited': stats.rate_limited,
+        'errors': stats.errors,
+        'expected_deliveries': stats.expected,
+        'delivered': stats.delivered,
+        'delivery_ratio': stats.delivered / stats.expected if stats.expected else None,
+        'latency_ms': {k: v * 1000 if isinstance(v, float) else v for k, v in percentiles(stats.latencies).items()},
+        'server_cpu_avg': sum(stats.cpu) / len(stats.cpu) if stats.cpu else None,
+        'server_cpu_max': max(stats.cpu) if stats.cpu else None,
+        'server_rss_max_mb': max(stats.rss) if stats.rss else None,
+    }
+
+
+def fmt(value, spec):
+    return format(value, spec) if value is not None else '-'
+
+
+def report(result):
+    latency = result['latency_ms']
+    connect = result['connect_ms']
+    print()
+    print(f"連線:     {result['connected']}/{result['clients']}，失敗 {result['connect_failures']}，"
+          f"{result['connect_rate']:.0f} 個/秒，耗時 p50 {fmt(connect['p50'], '.1f')} / "
+          f"p99 {fmt(connect['p99'], '.1f')} ms")
+    print(f"中斷:     負載中被中斷 {result['dropped']}，結束時仍在線 {result['alive_after_load']}")
+    print(f"事件:     訊息 {result['sent']}，輸入狀態 {result['typing']}，切換頻道 {result['joins']}，"
+          f"被限流 {result['rate_limited']}，錯誤 {result['errors']}")
+    print(f"送達:     {result['delivered']}/{result['expected_deliveries']}"
+          f"（{fmt(result['delivery_ratio'] and result['delivery_ratio'] * 100, '.1f')}%）")
+    print(f"延遲 ms:  p50 {fmt(latency['p50'], '.1f')}  p95 {fmt(latency['p95'], '.1f')}  "
+          f"p99 {fmt(latency['p99'], '.1f')}  max {fmt(latency['max'], '.1f')}")
+    print(f"伺服器:   CPU 平均 {fmt(result['server_cpu_avg'], '.1f')}% / 最高 {fmt(result['server_cpu_max'], '.1f')}%，"
+          f"RSS 最高 {fmt(result['server_rss_max_mb'], '.1f')} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clients', type=int, default=200, help='同時連線數（每個連線一個測試使用者）')
+    parser.add_argument('--channels', type=int, default=10, help='測試頻道數')
+    parser.add_argument('--duration', type=float, default=20, help='負載階段秒數')
+    parser.add_argument('--connect-rate', type=float, default=200, help='每秒建立的連線數')
+    parser.add_argument('--send-rate', type=float, default=0.2, help='每個連線每秒發送的訊息數')
+    parser.add_argument('--typing-rate', type=float, default=0.5, help='每個連線每秒送出的輸入狀態數')
+    parser.add_argument('--join-rate', type=float, default=0.02, help='每個連線每秒切換頻道的次數')
+    parser.add_argument('--wire', default=wire_format.WIRE_JSON, choices=[wire_format.WIRE_JSON, wire_format.WIRE_MSGPACK],
+                        help='客戶端選用的傳輸格式')
+    parser.add_argument('--warmup', type=float, default=1.0, help='連線完成後開始負載前的等待秒數')
+    parser.add_argument('--drain', type=float, default=2.0, help='負載結束後等待訊息送達的秒數')
+    parser.add_argument('--async-mode', default='eventlet', choices=['threading', 'eventlet', 'gevent'],
+                        help='自動啟動的伺服器的非同步模式')
+    parser.add_argument('--port', type=int, default=8090, help='自動啟動的伺服器埠號')
+    parser.add_argument('--url', default=None, help='使用已啟動的本機伺服器（不量測伺服器 CPU / RSS）')
+    parser.add_argument('--database-uri', default=None,
+                        help='測試資料寫入的資料庫（預設為暫存的 SQLite；使用 --url 時必須指定伺服器使用的資料庫）')
+    parser.add_argument('--json', default=None, help='另外把結果寫入 JSON 檔')
+    args = parser.parse_args()
+    if args.url and not args.database_uri:
+        parser.error('使用 --url 時必須以 --database-uri 指定該伺服器使用的資料庫')
+
+    use_scratch_database(args.database_uri)
+    tokens, channel_ids = prepare_fixtures(args.clients, args.channels)
+    process = None
+    url = args.url
+    if url is None:
+        process = spawn_server(args.async_mode, args.port)
+        url = f'http://127.0.0.1:{args.port}'
+    try:
+        result = asyncio.run(run_load(url, tokens, channel_ids, args, process))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+    result['config'] = {key: value for key, value in vars(args).items() if key != 'json'}
+    report(result)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
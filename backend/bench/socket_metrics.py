@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+事件延遲統計的額外成本微基準測試
+比較未包裝的 handler 與經 SocketMetrics.instrument 包裝（含一次資料庫與一次送出階段）的每次呼叫耗時
+
+使用方式:
+    python bench/socket_metrics.py [--calls 200000]
+"""
+import argparse
+import importlib.util
+import os
+import time
+
+# 直接載入 socket_metrics.py，避免初始化整個 Flask 應用
+_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'app', 'socket_metrics.py')
+_spec = importlib.util.spec_from_file_location('socket_metrics', _path)
+socket_metrics = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(socket_metrics)
+
+
+def make_handler(metrics):
+    def handler(data):
+        metrics.add(socket_metrics.PHASE_DB, 0.0005)
+        with metrics.phase(socket_metrics.PHASE_EMIT):
+            data['seen'] = True
+    return handler
+
+
+def run(handler, calls):
+    data = {}
+    start = time.perf_counter()
+    for _ in range(calls):
+        handler(data)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--calls', type=int, default=200000, help='呼叫次數')
+    args = parser.parse_args()
+
+    metrics = socket_metrics.SocketMetrics()
+    handler = make_handler(metrics)
+    bare = run(handler, args.calls)
+    instrumented = run(metrics.instrument('send_message', handler), args.calls)
+
+    per_bare = bare / args.calls * 1e6
+    per_instrumented = instrumented / args.calls * 1e6
+    print(f"未包裝:   {per_bare:.2f} µs/次（phase 呼叫在事件外直接略過）")
+    print(f"包裝後:   {per_instrumented:.2f} µs/次")
+    print(f"額外成本: {per_instrumented - per_bare:.2f} µs/次")
+    stats = metrics.snapshot()['events']['send_message']
+    print(f"記錄筆數: {stats['calls']}, total p99: {stats['total']['p99_ms']} ms, db p50: {stats['db']['p50_ms']} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+無狀態 JWT API 的吞吐量
+以 Flask 測試客戶端（不保存 cookie，模擬只帶 Bearer token 的前端）連續呼叫 API，比較兩種模式：
+
+- before: 每個請求 login_user 寫入 session，回應重新簽署並發出 session cookie（JWT_STATELESS_API = False）
+- after:  只設定本次請求的 current_user，不寫入 session
+
+使用方式:
+    python bench/stateless_api.py [--requests 2000] [--path /api/v1/userprofileapi/me]
+"""
+import argparse
+import os
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_PATHS = ['/api/v1/userprofileapi/me', '/api/v1/chatchannelapi/my-channels']
+
+
+def run(client, paths, headers, requests):
+    """@return: (耗時秒數, 附帶 Set-Cookie 的回應數, Set-Cookie 總位元組)"""
+    cookies = 0
+    cookie_bytes = 0
+    start = time.perf_counter()
+    for index in range(requests):
+        path = paths[index % len(paths)]
+        response = client.get(path, headers=headers)
+        if response.status_code >= 400:
+            raise RuntimeError(f'{path} 回應 {response.status_code}')
+        set_cookie = response.headers.getlist('Set-Cookie')
+        if set_cookie:
+            cookies += 1
+            cookie_bytes += sum(len(value) for value in set_cookie)
+    return time.perf_counter() - start, cookies, cookie_bytes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=2000, help='每種模式的請求數')
+    parser.add_argument('--path', action='append', default=None, help='測試的 API 路徑（可重複指定）')
+    parser.add_argument('--username', default=None, help='簽發 token 的使用者（預設為第一個使用者）')
+    args = parser.parse_args()
+    paths = args.path or DEFAULT_PATHS
+
+    sys.path.insert(0, BACKEND_DIR)
+    from app import app, appbuilder
+    from app.auth import create_jwt_token
+
+    with app.app_context():
+        sm = appbuilder.sm
+        user = sm.find_user(username=args.username) if args.username else sm.get_all_users()[0]
+        token = create_jwt_token(user, app)
+    headers = {'Authorization': f'Bearer {token}'}
+    client = app.test_client(use_cookies=False)
+
+    stateless = sm.stateless_api
+    # 預熱
+    run(client, paths, headers, 50)
+
+    results = {}
+    for name, enabled in (('before', False), ('after', True)):
+        sm.stateless_api = enabled
+        elapsed, cookies, cookie_bytes = run(client, paths, headers, args.requests)
+        results[name] = elapsed
+        print(f"{name:>6}: {args.requests / elapsed:8.1f} req/s  "
+              f"{elapsed / args.requests * 1000:6.3f} ms/req  "
+              f"Set-Cookie {cookies}/{args.requests} 個回應（{cookie_bytes / max(cookies, 1):.0f} bytes/個）")
+
+    sm.stateless_api = stateless
+    print(f"吞吐量提升: {results['before'] / results['after']:.2f}x（路徑: {', '.join(paths)}）")
+
+
+if __name__ == '__main__':
+    main()
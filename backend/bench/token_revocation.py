@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+撤銷清單大小對每次請求認證成本的影響
+撤銷清單中放入不同數量的 jti，測量：
+
+- 每次撤銷檢查（RevocationList.is_revoked）的耗時
+- 以已快取的 Bearer token 連續呼叫 API 的吞吐量（每個請求都會檢查撤銷狀態）
+
+並以每個請求查詢 revoked_tokens 資料表的做法作為對照
+
+使用方式:
+    python bench/token_revocation.py [--sizes 0 1000 10000 100000 1000000] [--requests 2000]
+"""
+import argparse
+import os
+import sys
+import time
+import uuid
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def time_checks(revoked, jtis, rounds):
+    """@return: 每次檢查的平均耗時（秒）"""
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for jti in jtis:
+            revoked.is_revoked(jti)
+    return (time.perf_counter() - start) / (rounds * len(jtis))
+
+
+def time_requests(client, headers, requests, path):
+    start = time.perf_counter()
+    for _ in range(requests):
+        response = client.get(path, headers=headers)
+        if response.status_code != 200:
+            raise RuntimeError(f'{path} 回應 {response.status_code}')
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[0, 1000, 10000, 100000, 1000000],
+                        help='撤銷清單的 jti 數')
+    parser.add_argument('--requests', type=int, default=2000, help='每種大小的請求數')
+    parser.add_argument('--path', default='/api/v1/userprofileapi/me')
+    args = parser.parse_args()
+
+    sys.path.insert(0, BACKEND_DIR)
+    from app import app, appbuilder
+    from app.auth import create_jwt_token
+    from app.models import RevokedToken
+    from app.token_revocation import RevocationList
+
+    sm = appbuilder.sm
+    with app.app_context():
+        user = sm.get_all_users()[0]
+        token = create_jwt_token(user, app)
+    headers = {'Authorization': f'Bearer {token}'}
+    client = app.test_client(use_cookies=False)
+    time_requests(client, headers, 50, args.path)
+
+    # 對照：每個請求查詢資料庫
+    lookups = [uuid.uuid4().hex for _ in range(200)]
+    with app.app_context():
+        session = sm.get_session
+        start = time.perf_counter()
+        for jti in lookups:
+            session.query(RevokedToken.id).filter_by(jti=jti).first()
+        db_seconds = (time.perf_counter() - start) / len(lookups)
+    print(f"資料庫查詢 revoked_tokens: {db_seconds * 1e6:8.1f} µs/次（{sm.get_session.query(RevokedToken).count()} 筆）")
+
+    original = sm.revoked_tokens
+    expires_at = time.time() + 3600
+    revoked = RevocationList()
+    sm.revoked_tokens = revoked
+    try:
+        for size in sorted(args.sizes):
+            while len(revoked) < size:
+                revoked.add(uuid.uuid4().hex, expires_at)
+            # 一半命中、一半未命中
+            probes = list(revoked._entries)[:100] + lookups[:100]
+            check = time_checks(revoked, probes, 200)
+            elapsed = time_requests(client, headers, args.requests, args.path)
+            print(f"撤銷 {size:>8} 筆: 檢查 {check * 1e9:6.0f} ns/次  "
+                  f"API {args.requests / elapsed:7.1f} req/s  {elapsed / args.requests * 1000:6.3f} ms/req")
+    finally:
+        sm.revoked_tokens = original
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Socket.IO 傳輸格式微基準測試
+比較典型事件 payload 以 JSON、MessagePack（原鍵名）與 MessagePack + 短鍵名編碼為 Socket.IO 封包的
+編碼成本與傳輸位元組數（二進位格式包含事件封包與附件封包）
+
+使用方式:
+    python bench/wire_format.py [--ops 20000] [--users 50,500]
+"""
+import argparse
+import importlib.util
+import os
+import time
+from datetime import datetime, timezone
+
+import msgpack
+from socketio import packet
+
+# 直接載入 wire_format.py，避免初始化整個 Flask 應用
+_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'app', 'wire_format.py')
+_spec = importlib.util.spec_from_file_location('wire_format', _path)
+wire_format = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(wire_format)
+
+
+def online_user(i):
+    return {
+        'user_id': i,
+        'username': f'user{i}',
+        'display_name': f'user{i}',
+        'connected_at': datetime.now().isoformat()
+    }
+
+
+def sample_payloads(user_counts):
+    now = datetime.now(timezone.utc).isoformat().replace('+00:00', 'Z')
+    payloads = [
+        ('new_message', {
+            'id': 123456,
+            'content': '大家好，今天下午三點開會，記得帶筆電',
+            'sender_id': 42,
+            'sender_name': 'alice',
+            'created_on': now,
+            'channel_id': 7,
+            'seq': 98765
+        }),
+        ('message_deleted', {'message_id': 123456, 'channel_id': 7}),
+        ('user_typing', {'user_id': 42, 'display_name': 'alice', 'is_typing': True, 'channel_id': 7}),
+        ('typing_state', {
+            'channel_id': 7,
+            'users': [{'user_id': i, 'display_name': f'user{i}'} for i in range(3)],
+            'worker': 'a1b2c3d4'
+        }),
+        ('presence_delta', {'seq': 1024, 'joined': [online_user(1), online_user(2)], 'left': [3, 4, 5]}),
+    ]
+    for count in user_counts:
+        payloads.append((f'online_users[{count}]', [online_user(i) for i in range(count)]))
+    return payloads
+
+
+def encode_json(event, payload):
+    return [packet.Packet(packet.EVENT, data=[event, payload]).encode()]
+
+
+def encode_msgpack_raw(event, payload):
+    data = msgpack.packb(payload, use_bin_type=True)
+    return packet.Packet(packet.EVENT, data=[event, data]).encode()
+
+
+def encode_msgpack(event, payload):
+    return packet.Packet(packet.EVENT, data=[event, wire_format.encode(payload)]).encode()
+
+
+def wire_size(encoded):
+    return sum(len(part.encode() if isinstance(part, str) else part) for part in encoded)
+
+
+def measure(encoder, event, payload, ops):
+    start = time.perf_counter()
+    for _ in range(ops):
+        encoded = encoder(event, payload)
+    elapsed = time.perf_counter() - start
+    return elapsed * 1_000_000 / ops, wire_size(encoded)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--ops', type=int, default=20000, help='每種 payload 的編碼次數')
+    parser.add_argument('--users', default='50,500', help='online_users 的使用者數（逗號分隔）')
+    args = parser.parse_args()
+
+    encoders = (('json', encode_json), ('msgpack', encode_msgpack_raw), ('msgpack+短鍵', encode_msgpack))
+    print(f"{'payload':>20} | {'format':>12} | {'encode µs':>10} | {'bytes':>8} | {'vs json':>8}")
+    print('-' * 72)
+    for name, payload in sample_payloads(int(n) for n in args.users.split(',')):
+        event = name.split('[')[0]
+        ops = max(args.ops // max(len(payload) // 10, 1), 100) if isinstance(payload, list) else args.ops
+        json_size = None
+        for label, encoder in encoders:
+            cost, size = measure(encoder, event, payload, ops)
+            json_size = json_size or size
+            print(f"{name:>20} | {label:>12} | {cost:>10.2f} | {size:>8} | {size / json_size:>7.0%}")
+
+
+if __name__ == '__main__':
+    main()
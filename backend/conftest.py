@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+"""
+測試共用設定：在任何測試匯入 app 之前改用暫存的 SQLite 資料庫（測試結束時刪除），
+測試資料不會寫入開發用的 app.db，也不依賴其中既有的使用者
+"""
+import atexit
+import os
+import secrets
+import shutil
+import tempfile
+
+import pytest
+
+_directory = tempfile.mkdtemp(prefix='chat-test-')
+atexit.register(shutil.rmtree, _directory, ignore_errors=True)
+# config.py 以 load_dotenv(override=True) 載入 .env，須以 CHAT_DATABASE_URI 覆寫資料庫位址
+os.environ['CHAT_DATABASE_URI'] = 'sqlite:///' + os.path.join(_directory, 'test.db')
+
+
+@pytest.fixture(scope='session')
+def users():
+    """暫存資料庫中的兩個使用者（註冊使用者的角色），id、username、email 已載入"""
+    from app import app, appbuilder
+
+    sm = appbuilder.sm
+    with app.app_context():
+        role = sm.find_role(app.config.get('AUTH_USER_REGISTRATION_ROLE', 'Public'))
+        for username in ('test_alice', 'test_bob'):
+            if not sm.find_user(username=username):
+                sm.add_user(username, username, 'test', f'{username}@test.local', role,
+                            password=secrets.token_urlsafe(16))
+        # add_user 提交後屬性會過期，重新查詢並載入欄位，離開 app context 後仍可讀取
+        result = [sm.find_user(username=username) for username in ('test_alice', 'test_bob')]
+        for user in result:
+            user.id, user.username, user.email
+        return result
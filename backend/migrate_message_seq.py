@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+訊息序號資料庫遷移腳本
+新增 chat_messages.channel_seq 與 chat_channels.message_seq，
+並依訊息 id 順序為現有訊息回填頻道內序號
+"""
+import os
+import sys
+
+# 添加專案根目錄到路徑
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import text
+
+from app import app, db
+
+
+def add_column_if_missing(table, column, ddl):
+    existing_columns = [row[1] for row in db.session.execute(text(f"PRAGMA table_info({table})")).fetchall()]
+    if column in existing_columns:
+        print(f"✅ 欄位已存在: {table}.{column}")
+        return
+    print(f"➕ 添加欄位: {table}.{column}")
+    db.session.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+
+
+def main():
+    """執行遷移"""
+    print("🚀 開始訊息序號資料庫遷移...")
+
+    with app.app_context():
+        try:
+            add_column_if_missing('chat_messages', 'channel_seq', 'INTEGER')
+            add_column_if_missing('chat_channels', 'message_seq', 'INTEGER NOT NULL DEFAULT 0')
+
+            print("🔢 回填現有訊息的頻道序號...")
+            result = db.session.execute(text("""
+                UPDATE chat_messages
+                SET channel_seq = (
+                    SELECT numbered.seq FROM (
+                        SELECT id, ROW_NUMBER() OVER (PARTITION BY channel_id ORDER BY id) AS seq
+                        FROM chat_messages
+                    ) AS numbered
+                    WHERE numbered.id = chat_messages.id
+                )
+                WHERE channel_seq IS NULL
+            """))
+            print(f"  📝 回填 {result.rowcount} 則訊息")
+
+            db.session.execute(text("""
+                UPDATE chat_channels
+                SET message_seq = COALESCE((
+                    SELECT MAX(channel_seq) FROM chat_messages
+                    WHERE chat_messages.channel_id = chat_channels.id
+                ), 0)
+            """))
+
+            db.session.execute(text(
+                "CREATE INDEX IF NOT EXISTS idx_chat_messages_channel_seq "
+                "ON chat_messages (channel_id, channel_seq)"
+            ))
+            db.session.commit()
+            print("🎉 資料庫遷移完成!")
+        except Exception as e:
+            print(f"❌ 遷移失敗: {str(e)}")
+            db.session.rollback()
+            import traceback
+            traceback.print_exc()
+            return False
+
+    return True
+
+
+if __name__ == '__main__':
+    success = main()
+    sys.exit(0 if success else 1)
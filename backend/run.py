@@ -1,11 +1,33 @@
+import os
+from dotenv import load_dotenv
+
+# eventlet/gevent 模式必須在匯入 app 之前修補標準函式庫
+load_dotenv(override=True)
+async_mode = os.getenv("SOCKETIO_ASYNC_MODE", "threading")
+if async_mode == "eventlet":
+    import eventlet
+    eventlet.monkey_patch()
+elif async_mode == "gevent":
+    from gevent import monkey
+    monkey.patch_all()
+
 from app import app
 from app.socketio_server import socketio, init_socketio
 
 if __name__ == "__main__":
-    print("正在啟動服務器，監聽端口 8080...")
-    
+    # 多 worker 部署時由 run_workers.py 指定各 worker 的端口
+    port = int(os.getenv("PORT", "8080"))
+    # 多 worker 時 reloader 會讓每個 worker 再多一個程序，因此關閉
+    use_reloader = app.config.get("SOCKETIO_WORKER_COUNT", 1) == 1
+    print(f"正在啟動服務器，監聽端口 {port} (async_mode={socketio.async_mode})...")
+
     # 暫時跳過重置功能
     # print("重置所有使用者線上狀態...")
     # init_socketio()
-    
-    socketio.run(app, host="127.0.0.1", port=8080, debug=True, allow_unsafe_werkzeug=True)
+
+    if socketio.async_mode == "threading":
+        socketio.run(app, host="127.0.0.1", port=port, debug=True, use_reloader=use_reloader,
+                     allow_unsafe_werkzeug=True)
+    else:
+        # eventlet/gevent 使用各自的 WSGI 伺服器，reloader 會重複 monkey patch，因此關閉
+        socketio.run(app, host="127.0.0.1", port=port, debug=True, use_reloader=False)
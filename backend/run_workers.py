@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+以多個 worker 程序啟動 Socket.IO 服務
+每個 worker 各自監聽一個端口（PORT, PORT+1, ...），透過 SOCKETIO_MESSAGE_QUEUE 共享房間、廣播與線上列表
+
+前方需要 sticky 負載平衡器，讓同一個客戶端的 polling 請求與 websocket 都落在同一個 worker，例如 nginx:
+
+    upstream chat_workers {
+        ip_hash;
+        server 127.0.0.1:8080;
+        server 127.0.0.1:8081;
+    }
+
+    location / {
+        proxy_pass http://chat_workers;
+        proxy_set_header X-Forwarded-For $proxy_add_x_forwarded_for;
+        proxy_set_header X-Forwarded-Proto $scheme;
+        proxy_http_version 1.1;
+        proxy_set_header Upgrade $http_upgrade;
+        proxy_set_header Connection "upgrade";
+    }
+
+並以 TRUSTED_PROXIES=1 啟動 worker，請求的客戶端位址（例如每個 IP 的密碼雜湊上限）才會是實際的客戶端，
+而不是 nginx 的 127.0.0.1
+
+使用方式:
+    python run_workers.py --workers 4
+    python run_workers.py --workers 4 --queue redis://localhost:6379/0
+"""
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import time
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='以多個 worker 程序啟動 Socket.IO 服務')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 2, help='worker 程序數')
+    parser.add_argument('--port', type=int, default=8080, help='第一個 worker 的端口')
+    parser.add_argument('--queue', default=os.getenv('SOCKETIO_MESSAGE_QUEUE') or
+                        'sqlite:///' + os.path.join(BASE_DIR, 'socketio_queue.db'),
+                        help='訊息佇列 URL（預設為內建的 SQLite pub/sub）')
+    args = parser.parse_args()
+
+    processes = []
+    for index in range(args.workers):
+        env = dict(os.environ)
+        env.update({
+            'PORT': str(args.port + index),
+            'SOCKETIO_MESSAGE_QUEUE': args.queue,
+            'SOCKETIO_WORKER_INDEX': str(index),
+            'SOCKETIO_WORKER_COUNT': str(args.workers),
+        })
+        processes.append(subprocess.Popen([sys.executable, os.path.join(BASE_DIR, 'run.py')], env=env))
+        print(f"worker {index} 已啟動，端口 {args.port + index} (PID: {processes[-1].pid})")
+
+    print(f"共 {args.workers} 個 worker，訊息佇列: {args.queue}")
+
+    def shutdown(signum=None, frame=None):
+        for process in processes:
+            if process.poll() is None:
+                process.terminate()
+        for process in processes:
+            process.wait()
+        sys.exit(0)
+
+    signal.signal(signal.SIGTERM, shutdown)
+    try:
+        # 任一 worker 異常結束時一併停止，交給外部的程序管理器重新啟動
+        while all(process.poll() is None for process in processes):
+            time.sleep(1)
+        print("有 worker 已結束，停止所有 worker")
+    except KeyboardInterrupt:
+        pass
+    shutdown()
+
+
+if __name__ == '__main__':
+    main()
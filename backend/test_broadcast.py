@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+預先編碼廣播測試
+"""
+import socketio
+
+from app.broadcast import EncodedFrame, FrameBroadcaster
+
+
+def make_server(sids):
+    server = socketio.Server(async_mode='threading')
+    sent = []
+    server._send_eio_packet = lambda eio_sid, pkt: sent.append((eio_sid, pkt))
+    participants = [server.manager.connect(f'eio-{i}', '/') for i in range(sids)]
+    for sid in participants:
+        server.manager.enter_room(sid, '/', 'channel:1')
+    return server, participants, sent
+
+
+def test_frame_is_encoded_once_for_all_recipients():
+    """房間內所有收件者共用同一個封包物件，skip_sid 不會收到"""
+    server, sids, sent = make_server(5)
+    broadcaster = FrameBroadcaster(server)
+
+    assert broadcaster.broadcast('new_message', {'id': 1}, 'channel:1', skip_sid=sids[0]) == 4
+    assert len({id(pkt) for _, pkt in sent}) == 1
+    assert sent[0][1].encode() == '42["new_message",{"id":1}]'
+    assert 'eio-0' not in {eio_sid for eio_sid, _ in sent}
+    assert broadcaster.stats.snapshot()['recipients'] == 4
+
+
+def test_relayed_binary_frame_is_sent_as_is():
+    """其他 worker 轉送的 frame 不重新編碼；二進位附件分別提供 websocket 與 polling 的編碼"""
+    frame = EncodedFrame.encode('typing_state', b'\x81\xa1h\x01')
+    server, sids, sent = make_server(2)
+    FrameBroadcaster(server).handle_relay({
+        'event': 'typing_state', 'parts': frame.to_message(), 'room': 'channel:1'
+    })
+
+    header, attachment = (pkt for _, pkt in sent[:2])
+    assert header.encode() == '4' + frame.parts[0]
+    assert attachment.encode(b64=True) == 'bgaFoAQ=='
+    assert attachment.encode() == b'\x81\xa1h\x01'
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+日誌設定測試（取樣、結構化欄位、非同步輸出）
+"""
+import json
+import logging
+
+from app import app
+from app.logging_config import (
+    LogSampler, configure_logging, flush_logging, get_logger, logging_stats
+)
+
+
+def test_sampler_limits_rate_and_reports_suppressed():
+    sampler = LogSampler({'socket.send_message': (1, 2)})
+    results = [sampler.acquire('socket.send_message', now=0.0) for _ in range(5)]
+    assert results == [0, 0, None, None, None]
+    # 一秒後補充一筆，並回報期間略過的 3 筆
+    assert sampler.acquire('socket.send_message', now=1.0) == 3
+    assert sampler.acquire('socket.send_message', now=1.0) is None
+    assert sampler.suppressed_total == 4
+
+
+def test_structured_async_output_respects_module_levels(tmp_path):
+    log_file = tmp_path / 'app.log'
+    configure_logging({
+        'LOG_LEVEL': 'INFO',
+        'LOG_LEVELS': {'test.quiet': 'WARNING'},
+        'LOG_FORMAT': 'json',
+        'LOG_FILE': str(log_file),
+        'LOG_ASYNC': True,
+        'LOG_SAMPLING': {'test.sampled': (0.001, 1)}
+    })
+    try:
+        logger = get_logger('test.loud')
+        logger.info('使用者已連接', user_id=1, username='alice')
+        get_logger('test.quiet').info('不應輸出')
+        for i in range(3):
+            logger.info('取樣', sample='test.sampled', i=i)
+        flush_logging()
+        lines = [json.loads(line) for line in log_file.read_text(encoding='utf-8').splitlines()]
+        assert [line['msg'] for line in lines] == ['使用者已連接', '取樣']
+        assert lines[0]['user_id'] == 1 and lines[0]['username'] == 'alice'
+        assert lines[1]['i'] == 0
+        assert logging_stats()['sampled_out'] == 2
+    finally:
+        logging.getLogger('test.quiet').setLevel(logging.NOTSET)
+        configure_logging(app.config)
@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""
+訊息合併廣播測試
+"""
+from app.message_batcher import MessageBatcher
+
+
+def make_batcher(**kwargs):
+    sent = []
+    batcher = MessageBatcher(
+        emit_single=lambda key, message: sent.append(('single', key, message)),
+        emit_batch=lambda key, messages: sent.append(('batch', key, messages)),
+        **kwargs
+    )
+    return batcher, sent
+
+
+def test_quiet_rooms_emit_immediately_and_busy_rooms_batch():
+    """低於門檻時立即送出；超過門檻後累積到 flush，並量測增加的延遲"""
+    batcher, sent = make_batcher(window=0.02, threshold=5)
+    for i in range(4):
+        assert batcher.submit('room', i, now=0.1 * i) is False
+    assert [kind for kind, _, _ in sent] == ['single'] * 4
+
+    for i in range(4, 10):
+        batcher.submit('room', i, now=0.5 + 0.001 * i)
+    assert batcher.flush(now=0.52) == 1
+    assert sent[4:] == [('batch', 'room', [4, 5, 6, 7, 8, 9])]
+
+    stats = batcher.stats()
+    assert stats['batches'] == 1 and stats['batched_messages'] == 6
+    assert 0 < stats['added_latency_max_ms'] <= 20
+
+
+def test_batch_is_flushed_at_max_size_and_rate_decays():
+    """達到單批上限時立即送出；流量下降後回到單筆廣播"""
+    batcher, sent = make_batcher(window=0.02, threshold=2, max_batch=3)
+    for i in range(4):
+        batcher.submit('room', i, now=0.0)
+    assert sent == [('single', 'room', 0), ('batch', 'room', [1, 2, 3])]
+
+    batcher.submit('room', 4, now=5.0)
+    assert sent[-1] == ('single', 'room', 4)
+    assert batcher.flush(now=5.1) == 0
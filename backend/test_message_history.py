@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+訊息歷史 API 的查詢次數測試：每頁的查詢次數固定，與每頁筆數和發送者數無關
+"""
+import datetime
+
+import pytest
+from flask import g
+from sqlalchemy import event
+
+from app import app, db
+from app.auth import create_jwt_token
+from app.models import ChatChannel, ChatMessage
+
+
+@pytest.fixture
+def history(users):
+    """在測試專用的頻道寫入兩個發送者交錯的訊息，回傳 (Authorization header, 頻道 id, 訊息)"""
+    with app.app_context():
+        g.user = users[0]  # AuditMixin 以 g.user 填入 created_by
+        channel = ChatChannel(name='history-test', creator_id=users[0].id, is_private=False)
+        db.session.add(channel)
+        db.session.commit()
+        channel_id = channel.id
+        now = datetime.datetime.utcnow()
+        rows = [
+            {
+                'content': f'history {index}', 'sender_id': users[index % len(users)].id,
+                'message_type': 'text', 'is_deleted': False, 'channel_id': channel_id, 'channel_seq': index + 1,
+                'created_on': now + datetime.timedelta(seconds=index), 'changed_on': now,
+                'created_by_fk': users[0].id, 'changed_by_fk': users[0].id
+            }
+            for index in range(60)
+        ]
+        db.session.execute(ChatMessage.__table__.insert(), rows)
+        db.session.commit()
+        token = create_jwt_token(users[0], app)
+        messages = db.session.query(ChatMessage).filter_by(channel_id=channel_id).order_by(ChatMessage.id).all()
+        expected = [message.to_dict() for message in messages]
+    yield {'Authorization': f'Bearer {token}'}, channel_id, expected
+    with app.app_context():
+        db.session.query(ChatMessage).filter_by(channel_id=channel_id).delete()
+        db.session.query(ChatChannel).filter_by(id=channel_id).delete()
+        db.session.commit()
+
+
+def count_queries(client, path, headers):
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        response = client.get(path, headers=headers)
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+    assert response.status_code == 200
+    return len(statements), response.get_json()
+
+
+def test_constant_queries_per_page(history):
+    headers, channel_id, expected = history
+    client = app.test_client(use_cookies=False)
+    # 第一個請求驗證 token 並快取
+    client.get('/api/v1/userprofileapi/me', headers=headers)
+
+    small, page = count_queries(client, f'/api/v1/chatmessageapi/history?channel_id={channel_id}&per_page=5', headers)
+    large, page = count_queries(client, f'/api/v1/chatmessageapi/history?channel_id={channel_id}&per_page=50', headers)
+    assert small == large == 1
+    # 與 ChatMessage.to_dict() 的格式相同
+    assert page['result'] == expected[-50:]
+
+    small, _ = count_queries(client, f'/api/v1/chatmessageapi/recent/5?channel_id={channel_id}', headers)
+    large, page = count_queries(client, f'/api/v1/chatmessageapi/recent/60?channel_id={channel_id}', headers)
+    assert small == large == 1
+    assert page['result'] == expected
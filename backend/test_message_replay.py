@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+"""
+訊息補送緩衝測試
+"""
+from app.message_replay import RecentMessageBuffer
+
+
+def make_message(seq, channel_id=1):
+    return {'id': seq * 10, 'seq': seq, 'channel_id': channel_id, 'content': f'm{seq}'}
+
+
+def test_buffer_serves_contiguous_range():
+    """緩衝完整涵蓋缺口時直接補送，已刪除的訊息略過"""
+    buffer = RecentMessageBuffer(size=10)
+    for seq in (1, 2, 4, 3, 5):
+        buffer.add(make_message(seq))
+    buffer.mark_deleted(1, 40)
+
+    missed = buffer.since(1, after_seq=2, head_seq=5, limit=100)
+    assert [m['seq'] for m in missed] == [3, 5]
+    assert buffer.since(1, after_seq=5, head_seq=5, limit=100) == []
+
+
+def test_buffer_miss_falls_back_to_database():
+    """缺口超出緩衝範圍、序號不連續或超過上限時回傳 None"""
+    buffer = RecentMessageBuffer(size=3)
+    for seq in range(1, 6):
+        buffer.add(make_message(seq))
+
+    assert buffer.since(1, after_seq=1, head_seq=5, limit=100) is None
+    # 其他 worker 寫入的序號 6 不在緩衝中
+    assert buffer.since(1, after_seq=3, head_seq=6, limit=100) is None
+    assert buffer.since(1, after_seq=2, head_seq=5, limit=2) is None
+    assert buffer.since(2, after_seq=0, head_seq=1, limit=100) is None
+    assert buffer.stats()['misses'] == 4
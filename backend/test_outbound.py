@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+發送佇列背壓測試
+"""
+import queue
+
+from engineio import packet
+from socketio import packet as sio_packet
+
+from app import wire_format
+from app.outbound import OutboundQueue, OutboundStats
+
+
+def event_packet(event, payload):
+    return packet.Packet(packet.MESSAGE, f'2["{event}",{payload}]')
+
+
+def binary_event_packets(event, payload):
+    """msgpack 連線收到的二進位事件：事件封包加上附件封包"""
+    encoded = sio_packet.Packet(sio_packet.EVENT, data=[event, wire_format.encode(payload)]).encode()
+    return [packet.Packet(packet.MESSAGE, data) for data in encoded]
+
+
+def make_queue(overflowed):
+    return OutboundQueue(
+        queue.Queue(), soft_limit=2, hard_limit=4,
+        policies={'typing_state': 'coalesce', 'presence_delta': 'drop'},
+        overflow='disconnect', stats=OutboundStats(),
+        on_overflow=overflowed.append
+    )
+
+
+def test_low_priority_events_are_dropped_or_coalesced():
+    """佇列壅塞時丟棄/合併低優先事件，一般訊息照常放入"""
+    overflowed = []
+    q = make_queue(overflowed)
+    q.put(event_packet('new_message', '{"id": 1}'))
+    q.put(event_packet('new_message', '{"id": 2}'))
+
+    q.put(event_packet('presence_delta', '{"seq": 1}'))
+    q.put(event_packet('typing_state', '{"channel_id": 1, "users": []}'))
+    q.put(event_packet('typing_state', '{"channel_id": 1, "users": [1]}'))
+    q.put(event_packet('new_message', '{"id": 3}'))
+    assert q.depth == 3
+    assert q.stats.dropped == {'presence_delta': 1}
+    assert q.stats.coalesced == 1
+
+    # 消化後送出合併後最新的 typing_state
+    received = [q.get().data for _ in range(4)]
+    assert received[-1] == '2["typing_state",{"channel_id": 1, "users": [1]}]'
+    assert overflowed == []
+
+
+def test_slow_consumer_is_disconnected():
+    """超過 hard limit 時丟棄封包並只觸發一次中斷"""
+    overflowed = []
+    q = make_queue(overflowed)
+    for i in range(6):
+        q.put(event_packet('new_message', f'{{"id": {i}}}'))
+    q.put(None)
+    assert q.depth == 5
+    assert overflowed == [q]
+    assert q.stats.overflows == 1
+
+
+if __name__ == "__main__":
+    test_low_priority_events_are_dropped_or_coalesced()
+    test_slow_consumer_is_disconnected()
+    print("✅ 發送佇列背壓測試通過")
+
+
+def test_binary_events_keep_attachments_together():
+    """二進位事件的附件跟隨事件封包一起丟棄或合併，合併時以頻道區分"""
+    overflowed = []
+    q = make_queue(overflowed)
+    q.put(event_packet('new_message', '{"id": 1}'))
+    q.put(event_packet('new_message', '{"id": 2}'))
+
+    for pkt in binary_event_packets('presence_delta', {'seq': 1, 'joined': [], 'left': []}):
+        q.put(pkt)
+    for users in ([], [1], [2]):
+        for pkt in binary_event_packets('typing_state', {'channel_id': 1, 'users': users}):
+            q.put(pkt)
+    for pkt in binary_event_packets('typing_state', {'channel_id': 2, 'users': [3]}):
+        q.put(pkt)
+    assert q.depth == 2
+    assert q.stats.dropped == {'presence_delta': 1}
+    assert q.stats.coalesced == 2
+
+    received = [q.get() for _ in range(6)]
+    headers = received[2::2]
+    attachments = [wire_format.decode(pkt.data) for pkt in received[3::2]]
+    assert all(pkt.data.startswith('51-["typing_state"') for pkt in headers)
+    assert attachments == [{'channel_id': 1, 'users': [2]}, {'channel_id': 2, 'users': [3]}]
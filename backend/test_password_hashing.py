@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+密碼雜湊服務測試：工作上限與重新雜湊
+"""
+import threading
+
+import pytest
+from flask import Flask
+
+from app.password_hashing import PasswordHasher, PasswordHashingBusy, HAS_BCRYPT
+
+
+def test_per_client_and_pending_limits():
+    hasher = PasswordHasher(max_workers=1, max_pending=1, per_client=1)
+    started = threading.Event()
+    release = threading.Event()
+
+    def blocking():
+        started.set()
+        release.wait(5)
+        return True
+
+    app = Flask(__name__)
+
+    def call(addr):
+        with app.test_request_context(environ_base={'REMOTE_ADDR': addr}):
+            return hasher._run(blocking)
+
+    worker = threading.Thread(target=call, args=('10.0.0.1',))
+    worker.start()
+    assert started.wait(5)
+    try:
+        # 同一來源已有一個進行中的工作
+        with pytest.raises(PasswordHashingBusy):
+            call('10.0.0.1')
+        assert hasher.stats()['rejected_client'] == 1
+
+        # 其他來源可以排隊；佇列滿了之後整體拒絕
+        waiting = threading.Thread(target=call, args=('10.0.0.2',))
+        waiting.start()
+        while hasher.stats()['in_flight'] < 2:
+            pass
+        with pytest.raises(PasswordHashingBusy) as error:
+            call('10.0.0.3')
+        assert error.value.retry_after >= 1
+        assert hasher.stats()['rejected'] == 1
+    finally:
+        release.set()
+        worker.join()
+        waiting.join()
+    assert hasher.stats()['in_flight'] == 0
+    assert hasher.stats()['clients'] == 0
+
+
+def test_rehash_when_parameters_change():
+    old = PasswordHasher(method='pbkdf2:sha256:1000')
+    pwhash = old.hash_password('secret')
+    assert old.verify_password(pwhash, 'secret')
+    assert old.rehash_password(pwhash, 'secret') is None
+
+    new = PasswordHasher(method='pbkdf2:sha256:2000')
+    rehashed = new.rehash_password(pwhash, 'secret')
+    assert rehashed.startswith('pbkdf2:sha256:2000$')
+    assert new.verify_password(rehashed, 'secret')
+
+
+@pytest.mark.skipif(not HAS_BCRYPT, reason='bcrypt 未安裝')
+def test_channel_password_rounds():
+    hasher = PasswordHasher(bcrypt_rounds=4)
+    pwhash = hasher.hash_channel_password('join')
+    assert hasher.is_channel_hash(pwhash) and not hasher.is_channel_hash('join')
+    assert hasher.verify_channel_password(pwhash, 'join')
+    assert not hasher.verify_channel_password(pwhash, 'wrong')
+
+    hasher.bcrypt_rounds = 5
+    assert hasher.rehash_channel_password(pwhash, 'join').startswith('$2b$05$')
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+角色權限索引測試
+"""
+from app.permission_index import PermissionIndex
+
+
+class Rows:
+    """模擬資料庫的 (role_id, role_name, permission_name, view_name) 列，記錄載入次數"""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.loads = 0
+
+    def __call__(self):
+        self.loads += 1
+        return list(self.rows)
+
+
+def test_lookups_without_reloading():
+    rows = Rows([
+        (1, 'Admin', 'can_list', 'ChatChannelView'),
+        (1, 'Admin', 'menu_access', 'Chat'),
+        (2, 'User', 'menu_access', 'Chat'),
+        (2, 'User', 'menu_access', 'Profile'),
+        (3, 'Empty', None, None)
+    ])
+    index = PermissionIndex(rows)
+    assert index.has([1], 'can_list', 'ChatChannelView')
+    assert not index.has([2, 3], 'can_list', 'ChatChannelView')
+    assert index.view_menus([1, 2], 'menu_access') == {'Chat', 'Profile'}
+    assert index.is_admin([3, 1]) and not index.is_admin([2, 3])
+    assert not index.has([99], 'can_list', 'ChatChannelView')
+    assert rows.loads == 1
+    assert index.stats()['roles'] == 3
+
+
+def test_invalidate_reloads_on_next_lookup():
+    rows = Rows([(2, 'User', 'menu_access', 'Chat')])
+    index = PermissionIndex(rows)
+    assert not index.has([2], 'can_show', 'ChatChannelView')
+
+    rows.rows.append((2, 'User', 'can_show', 'ChatChannelView'))
+    assert not index.has([2], 'can_show', 'ChatChannelView')
+    index.invalidate()
+    assert rows.loads == 1
+    assert index.has([2], 'can_show', 'ChatChannelView')
+    assert rows.loads == 2
+
+    # 角色改名為管理員
+    rows.rows = [(2, 'Admin', 'menu_access', 'Chat')]
+    index.invalidate()
+    assert index.is_admin([2])
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+線上使用者註冊表測試
+"""
+from sqlalchemy import create_engine, select
+
+from app.presence import PresenceRegistry
+from app.presence_flusher import PresenceFlusher
+
+
+def test_multiple_connections_per_user():
+    """同一使用者多個連線時，只有最後一個斷線才算離線"""
+    registry = PresenceRegistry()
+
+    _, is_first = registry.add('sid-1', 1, 'jerry', 'jerry')
+    assert is_first
+    _, is_first = registry.add('sid-2', 1, 'jerry', 'jerry')
+    assert not is_first
+    registry.add('sid-3', 2, 'tom', 'tom')
+
+    assert registry.connection_count == 3
+    assert registry.user_count == 2
+    assert registry.sids_for_user(1) == {'sid-1', 'sid-2'}
+
+    connection, is_last = registry.remove('sid-2')
+    assert connection.user_id == 1
+    assert not is_last
+    assert registry.is_online(1)
+
+    _, is_last = registry.remove('sid-1')
+    assert is_last
+    assert not registry.is_online(1)
+
+    assert registry.remove('unknown') == (None, False)
+
+
+def test_snapshot_is_deduplicated():
+    """線上列表依使用者去重，並在連線變更後更新"""
+    registry = PresenceRegistry()
+    registry.add('sid-1', 1, 'jerry', 'jerry')
+    registry.add('sid-2', 1, 'jerry', 'jerry')
+    registry.add('sid-3', 2, 'tom', 'tom')
+
+    snapshot = registry.snapshot()
+    assert sorted(u['user_id'] for u in snapshot) == [1, 2]
+    assert registry.snapshot() is snapshot
+
+    registry.remove('sid-3')
+    assert [u['user_id'] for u in registry.snapshot()] == [1]
+
+
+def test_presence_delta_coalescing():
+    """時間窗內的變更合併為一筆增量，序號連續遞增"""
+    registry = PresenceRegistry()
+    registry.add('sid-1', 1, 'jerry', 'jerry')
+    registry.add('sid-2', 2, 'tom', 'tom')
+    registry.add('sid-3', 1, 'jerry', 'jerry')
+
+    delta = registry.drain_delta()
+    assert delta['seq'] == 1
+    assert sorted(u['user_id'] for u in delta['joined']) == [1, 2]
+    assert delta['left'] == []
+    assert registry.drain_delta() is None
+
+    # 非最後一個連線斷線不產生變更
+    registry.remove('sid-1')
+    assert registry.drain_delta() is None
+
+    registry.remove('sid-3')
+    registry.add('sid-4', 3, 'amy', 'amy')
+    registry.remove('sid-4')
+    delta = registry.drain_delta()
+    assert delta['seq'] == 2
+    assert delta['joined'] == []
+    assert sorted(delta['left']) == [1, 3]
+
+    state = registry.snapshot_state()
+    assert state['seq'] == 2
+    assert [u['user_id'] for u in state['users']] == [2]
+
+
+def test_remote_workers_are_merged():
+    """其他 worker 的線上使用者併入全域列表，使用者在所有 worker 都離線才算離線"""
+    registry = PresenceRegistry()
+    registry.track_local_changes = True
+    registry.add('sid-1', 1, 'jerry', 'jerry')
+    registry.drain_delta()
+
+    registry.apply_remote('worker-b', [{'user_id': 1, 'username': 'jerry'}, {'user_id': 2, 'username': 'tom'}], [])
+    assert registry.user_count == 2
+    assert registry.connection_count == 1
+    assert [u['user_id'] for u in registry.drain_delta()['joined']] == [2]
+
+    # 本機最後一個連線斷線，但仍在 worker-b 上線
+    _, is_last = registry.remove('sid-1')
+    assert not is_last
+    assert registry.is_online(1)
+    assert registry.drain_delta() is None
+    assert registry.drain_local_changes() == ([], [1])
+
+    # 完整狀態取代：tom 已不在 worker-b
+    registry.replace_remote('worker-b', [{'user_id': 1, 'username': 'jerry'}])
+    assert registry.drain_delta()['left'] == [2]
+
+    registry.drop_remote('worker-b')
+    assert registry.user_count == 0
+    assert registry.drain_delta()['left'] == [1]
+
+
+def test_presence_flusher_batches_changes():
+    """一個間隔內的變更以集合式 UPDATE 寫入，缺少的 UserProfile 直接新增"""
+    from app.models import UserProfile
+
+    table = UserProfile.__table__
+    engine = create_engine('sqlite://')
+    table.create(engine)
+    flusher = PresenceFlusher(table)
+    flusher._engine = engine
+
+    flusher.mark_online(1, 'jerry')
+    flusher.mark_online(2, 'tom')
+    assert flusher.flush() == 2
+    assert flusher.inserted == 2
+
+    # 最後的狀態為準
+    flusher.mark_offline(1)
+    flusher.mark_online(1, 'jerry')
+    flusher.mark_offline(2)
+    assert flusher.flush() == 2
+    with engine.connect() as conn:
+        rows = dict(conn.execute(select(table.c.user_id, table.c.is_online)).all())
+    assert rows == {1: True, 2: False}
+    assert flusher.flush() == 0
+
+    # 同一批離線的使用者各自保留自己的 last_seen
+    flusher.mark_online(1, 'jerry')
+    flusher.flush()
+    flusher.mark_offline(1)
+    flusher.mark_offline(2)
+    expected = {uid: change[1].replace(tzinfo=None) for uid, change in flusher._pending.items()}
+    assert expected[1] < expected[2]
+    flusher.flush()
+    with engine.connect() as conn:
+        rows = dict(conn.execute(select(table.c.user_id, table.c.last_seen)).all())
+    assert rows == expected
+
+
+if __name__ == "__main__":
+    test_multiple_connections_per_user()
+    test_snapshot_is_deduplicated()
+    test_presence_delta_coalescing()
+    test_remote_workers_are_merged()
+    test_presence_flusher_batches_changes()
+    print("✅ 線上使用者註冊表測試通過")
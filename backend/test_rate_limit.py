@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Socket 事件限流測試
+"""
+from app.rate_limit import TokenBucketLimiter
+
+LIMITS = {'send_message': {'sid': (2, 3), 'user': (4, 5)}}
+
+
+def test_burst_then_limited_and_refill():
+    """突發額度用完後拒絕並回傳重試秒數，時間經過後補充"""
+    limiter = TokenBucketLimiter(LIMITS, clock=lambda: 0.0)
+    assert [limiter.allow('send_message', 'sid-a', 1, now=0.0) for _ in range(4)] == [True, True, True, False]
+    assert limiter.check('send_message', 'sid-a', 1, now=0.0) == 0.5
+    assert limiter.allow('send_message', 'sid-a', 1, now=0.5)
+    assert not limiter.allow('send_message', 'sid-a', 1, now=0.5)
+    # 未設定的事件不限流
+    assert all(limiter.allow('typing', 'sid-a', 1, now=0.5) for _ in range(100))
+
+    stats = limiter.stats()
+    assert stats['allowed'] == {'send_message': 4}
+    assert stats['limited'] == {'send_message': 3}
+    assert stats['top_limited_users'] == [{'user_id': 1, 'limited': 3}]
+
+
+def test_user_budget_is_shared_across_connections():
+    """同一使用者的多個連線共用 user 桶；被拒絕的事件不扣除任何桶"""
+    limiter = TokenBucketLimiter(LIMITS, clock=lambda: 0.0)
+    assert all(limiter.allow('send_message', 'sid-a', 1, now=0.0) for _ in range(3))
+    assert all(limiter.allow('send_message', 'sid-b', 1, now=0.0) for _ in range(2))
+    # user 桶已空：sid-c 自己的桶仍是滿的，但事件被拒絕
+    assert not limiter.allow('send_message', 'sid-c', 1, now=0.0)
+    # 其他使用者不受影響
+    assert limiter.allow('send_message', 'sid-d', 2, now=0.0)
+
+    # sid-a 的桶空了而 user 桶補充後仍有額度：拒絕時 user 桶不應被扣除
+    assert not limiter.allow('send_message', 'sid-a', 1, now=0.25)
+    assert limiter.allow('send_message', 'sid-c', 1, now=0.25)
+
+    limiter.forget_sid('sid-a')
+    assert limiter.stats()['buckets'] == 5
+
+
+def test_zero_rate_disables_scope_and_offenders_are_bounded():
+    """rate <= 0 的範圍不限流；被拒絕使用者的統計不會無限成長"""
+    limiter = TokenBucketLimiter({'send_message': {'sid': (0, 1), 'user': (1, 1)}, 'typing': {'sid': (-1, 1)}},
+                                 clock=lambda: 0.0, max_tracked_users=4)
+    assert 'typing' not in limiter.limits
+    assert all(limiter.allow('typing', 'sid-a', 1, now=0.0) for _ in range(10))
+    # 只剩 user 桶：重試秒數為有限值
+    assert limiter.allow('send_message', 'sid-a', 1, now=0.0)
+    assert limiter.check('send_message', 'sid-a', 1, now=0.0) == 1.0
+
+    for user_id in range(2, 12):
+        limiter.allow('send_message', 'sid-a', user_id, now=0.0)
+        limiter.allow('send_message', 'sid-a', user_id, now=0.0)
+    assert len(limiter.limited_users) <= 4
+    assert len(limiter.stats()['top_limited_users']) <= 4
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+Socket 事件延遲統計測試
+"""
+import pytest
+
+from app.socket_metrics import SocketMetrics, LatencyHistogram, PHASE_DB, PHASE_EMIT
+
+
+def test_histogram_buckets_and_percentiles():
+    histogram = LatencyHistogram()
+    for ms in (0.05, 0.8, 0.9, 3, 20000):
+        histogram.record(ms / 1000)
+    snapshot = histogram.snapshot()
+    assert snapshot['count'] == 5
+    assert snapshot['buckets'] == {'0.1': 1, '1': 2, '5': 1, '+Inf': 1}
+    assert snapshot['p50_ms'] == 1
+    assert snapshot['p99_ms'] == 20000
+    assert snapshot['max_ms'] == 20000
+
+
+def test_handler_phases_and_errors_are_recorded_per_event():
+    """資料庫 / 送出耗時歸屬到目前的事件，巢狀同類階段只計一次，handler 外的呼叫略過"""
+    metrics = SocketMetrics()
+    metrics.add(PHASE_DB, 1.0)
+
+    def send(fail=False):
+        metrics.add(PHASE_DB, 0.002)
+        with metrics.phase(PHASE_EMIT):
+            with metrics.phase(PHASE_EMIT):
+                metrics.add(PHASE_EMIT, 5.0)
+        if fail == 'handled':
+            metrics.mark_error()
+        elif fail:
+            raise RuntimeError('boom')
+
+    handler = metrics.instrument('send_message', send)
+    handler()
+    handler(fail='handled')
+    with pytest.raises(RuntimeError):
+        handler(fail=True)
+    metrics.instrument('typing', lambda: None)()
+
+    events = metrics.snapshot()['events']
+    send_stats = events['send_message']
+    assert (send_stats['calls'], send_stats['errors'], send_stats['exceptions']) == (3, 2, 1)
+    assert send_stats['db']['count'] == 3
+    assert send_stats['db']['max_ms'] == 2.0
+    assert send_stats['emit']['count'] == 3
+    assert send_stats['emit']['max_ms'] < 1000
+    assert events['typing']['calls'] == 1
+    assert events['typing']['db']['count'] == 0
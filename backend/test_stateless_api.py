@@ -0,0 +1,29 @@
+#!/usr/bin/env python3
+"""
+無狀態 JWT API 測試：Bearer token 請求不寫入 session
+"""
+import pytest
+
+from app import app
+from app.auth import create_jwt_token
+
+
+@pytest.fixture
+def bearer(users):
+    with app.app_context():
+        token = create_jwt_token(users[0], app)
+    return {'Authorization': f'Bearer {token}'}
+
+
+def test_api_responses_do_not_set_cookie(bearer):
+    client = app.test_client(use_cookies=False)
+    response = client.get('/api/v1/userprofileapi/me', headers=bearer)
+    assert response.status_code == 200
+    assert 'Set-Cookie' not in response.headers
+
+    response = client.post('/api/v1/auth/logout', headers=bearer)
+    assert response.status_code == 200
+    assert 'Set-Cookie' not in response.headers
+
+    # 沒有 token 時仍然拒絕
+    assert client.get('/api/v1/userprofileapi/me').status_code == 401
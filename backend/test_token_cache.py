@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+已驗證 JWT 快取測試
+"""
+import time
+
+from app.token_cache import VerifiedTokenCache, UserSnapshot, RoleSnapshot
+
+
+def make_user(user_id, *role_names):
+    return UserSnapshot(user_id, f'user{user_id}',
+                        roles=[RoleSnapshot(index, name) for index, name in enumerate(role_names, 1)])
+
+
+def test_hit_expiry_and_token_exp():
+    """ttl 與 token 的 exp 取較早者失效"""
+    cache = VerifiedTokenCache(maxsize=10, ttl=60)
+    alice = make_user(1, 'User')
+    cache.put('h.p.sig-a', {'user_id': 1}, alice, now=0.0)
+    assert cache.get('h.p.sig-a', now=59.0) == ({'user_id': 1}, alice)
+    assert cache.get('h.p.sig-a', now=60.0) is None
+
+    # 10 秒後到期的 token 只保存 10 秒
+    cache.put('h.p.sig-b', {'user_id': 1, 'exp': time.time() + 10}, alice, now=0.0)
+    assert cache.get('h.p.sig-b', now=9.0) is not None
+    assert cache.get('h.p.sig-b', now=11.0) is None
+    assert cache.stats()['size'] == 0
+
+
+def test_lru_eviction_and_invalidate_user():
+    cache = VerifiedTokenCache(maxsize=2, ttl=60)
+    cache.put('a', {}, make_user(1), now=0.0)
+    cache.put('b', {}, make_user(1), now=0.0)
+    cache.get('a', now=0.0)
+    cache.put('c', {}, make_user(2), now=0.0)
+    # b 最久未使用，被淘汰
+    assert cache.get('b', now=0.0) is None
+    assert cache.stats()['evictions'] == 1
+
+    assert cache.invalidate_user(1) == 1
+    assert cache.get('a', now=0.0) is None
+    assert cache.get('c', now=0.0) is not None
+    cache.invalidate_token('c')
+    assert cache.stats()['size'] == 0
+    assert cache.stats()['invalidations'] == 2
+
+
+def test_snapshot_works_as_login_user():
+    """快照提供 Flask-Login 與 Flask-AppBuilder 權限檢查需要的介面"""
+    admin = make_user(7, 'Admin')
+    assert admin.is_active and admin.is_authenticated and not admin.is_anonymous
+    assert admin.get_id() == '7'
+    assert admin.has_role('Admin') and not admin.has_role('User')
+    # FAB 以 user.roles + 群組角色合併計算權限
+    assert [role.name for role in admin.roles + [r for group in admin.groups for r in group.roles]] == ['Admin']
+
+
+def test_disabled_cache_and_stats():
+    cache = VerifiedTokenCache(maxsize=0)
+    cache.put('a', {}, make_user(1))
+    assert cache.get('a') is None
+
+    cache = VerifiedTokenCache()
+    cache.record(0.000002, True)
+    cache.record(0.000004, True)
+    cache.record(0.001, False)
+    stats = cache.stats()
+    assert stats['hits'] == 2 and stats['misses'] == 1
+    assert stats['hit_rate'] == round(2 / 3, 4)
+    assert stats['hit_auth_us'] == 3.0
+    assert stats['miss_auth_us'] == 1000.0
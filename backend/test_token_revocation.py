@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+token 撤銷測試：撤銷清單、登出與 refresh token 換發
+"""
+import pytest
+
+from app import app
+from app.auth import create_jwt_token, create_refresh_token
+from app.token_revocation import RevocationList
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_revocation_list_expiry_and_load():
+    clock = Clock()
+    revoked = RevocationList(lambda: [('a', 1100.0), ('expired', 900.0)], prune_interval=10, clock=clock)
+    assert revoked.load() == 1
+    assert revoked.is_revoked('a') and not revoked.is_revoked('expired')
+    assert not revoked.is_revoked(None)
+
+    revoked.add('b', 1050.0)
+    revoked.add('already-expired', 999.0)
+    assert revoked.is_revoked('b') and not revoked.is_revoked('already-expired')
+
+    # 到期的 jti 在下次加入時移除
+    clock.now = 1060.0
+    revoked.add('c', 1200.0)
+    assert not revoked.is_revoked('b')
+    assert len(revoked) == 2
+    assert revoked.stats()['pruned'] == 1
+
+
+@pytest.fixture
+def user(users):
+    return users[0]
+
+
+def test_logout_revokes_cached_token(user):
+    with app.app_context():
+        token = create_jwt_token(user, app)
+        refresh_token = create_refresh_token(user, app)
+    client = app.test_client(use_cookies=False)
+    headers = {'Authorization': f'Bearer {token}'}
+    assert client.get('/api/v1/userprofileapi/me', headers=headers).status_code == 200
+
+    response = client.post('/api/v1/auth/logout', headers=headers, json={'refresh_token': refresh_token})
+    assert response.status_code == 200
+    # token 已在驗證快取中，撤銷後仍然拒絕
+    assert client.get('/api/v1/userprofileapi/me', headers=headers).status_code == 401
+    assert client.post('/api/v1/auth/refresh', json={'refresh_token': refresh_token}).status_code == 401
+
+
+def test_logout_rejects_other_users_refresh_token(users):
+    with app.app_context():
+        token = create_jwt_token(users[0], app)
+        other_refresh_token = create_refresh_token(users[1], app)
+    client = app.test_client(use_cookies=False)
+    headers = {'Authorization': f'Bearer {token}'}
+
+    response = client.post('/api/v1/auth/logout', headers=headers, json={'refresh_token': other_refresh_token})
+    assert response.status_code == 403
+    # 兩個 token 都沒有被撤銷
+    assert client.get('/api/v1/userprofileapi/me', headers=headers).status_code == 200
+    # 未登入時也不能撤銷
+    assert client.post('/api/v1/auth/logout', json={'refresh_token': other_refresh_token}).status_code == 403
+    assert client.post('/api/v1/auth/refresh', json={'refresh_token': other_refresh_token}).status_code == 200
+
+
+def test_refresh_token_rotation(user):
+    with app.app_context():
+        refresh_token = create_refresh_token(user, app)
+    client = app.test_client(use_cookies=False)
+
+    # refresh token 不能當作 access token 使用
+    assert client.get('/api/v1/userprofileapi/me',
+                      headers={'Authorization': f'Bearer {refresh_token}'}).status_code == 401
+
+    response = client.post('/api/v1/auth/refresh', json={'refresh_token': refresh_token})
+    assert response.status_code == 200
+    tokens = response.get_json()
+    assert client.get('/api/v1/userprofileapi/me',
+                      headers={'Authorization': f"Bearer {tokens['access_token']}"}).status_code == 200
+
+    # 每個 refresh token 只能使用一次
+    assert client.post('/api/v1/auth/refresh', json={'refresh_token': refresh_token}).status_code == 401
+    assert client.post('/api/v1/auth/refresh', json={'refresh_token': tokens['refresh_token']}).status_code == 200
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+輸入狀態聚合器測試
+"""
+from app.typing_indicator import TypingAggregator
+
+
+def test_repeated_typing_is_coalesced():
+    """重複的 typing 事件只延長存活時間，每個時間間隔每個頻道最多廣播一次"""
+    aggregator = TypingAggregator(ttl=5.0)
+    for _ in range(20):
+        aggregator.update(1, 10, 'jerry', True, now=0)
+    aggregator.update(1, 11, 'tom', True, now=0)
+    aggregator.update(2, 10, 'jerry', True, now=0)
+
+    states = aggregator.drain(now=0.5)
+    assert sorted(states) == [1, 2]
+    assert sorted(u['user_id'] for u in states[1]) == [10, 11]
+
+    # 輸入者沒有增減，不再廣播
+    aggregator.update(1, 10, 'jerry', True, now=1)
+    assert aggregator.drain(now=1.5) == {}
+
+    aggregator.update(1, 11, 'tom', False, now=2)
+    assert aggregator.drain(now=2.5) == {1: [{'user_id': 10, 'display_name': 'jerry'}]}
+
+
+def test_stale_typers_expire():
+    """超過存活時間沒有更新的輸入者自動移除"""
+    aggregator = TypingAggregator(ttl=5.0)
+    aggregator.update(1, 10, 'jerry', True, now=0)
+    aggregator.update(1, 11, 'tom', True, now=3)
+    aggregator.drain(now=3)
+
+    assert aggregator.drain(now=6) == {1: [{'user_id': 11, 'display_name': 'tom'}]}
+    assert aggregator.drain(now=9) == {1: []}
+    assert aggregator.stats()['channels'] == 0
+
+
+if __name__ == "__main__":
+    test_repeated_typing_is_coalesced()
+    test_stale_typers_expire()
+    print("✅ 輸入狀態聚合器測試通過")
@@ -0,0 +1,26 @@
+#!/usr/bin/env python3
+"""
+精簡二進位傳輸格式測試
+"""
+from app import wire_format
+from app.wire_format import WIRE_JSON, WIRE_MSGPACK, WIRE_SCHEMA_VERSION
+
+
+def test_short_keys_round_trip():
+    """短鍵名遞迴套用且可完整還原，未列入的欄位保留原名"""
+    payload = {
+        'channel_id': 1,
+        'messages': [{'id': 5, 'content': 'hi', 'sender_name': 'alice', 'seq': 3, 'extra': None}],
+        'complete': True
+    }
+    encoded = wire_format.encode(payload)
+    assert wire_format.decode(encoded) == payload
+    assert b'sender_name' not in encoded and b'extra' in encoded
+
+
+def test_negotiation_requires_matching_schema():
+    assert wire_format.negotiate({'token': 't'}) == WIRE_JSON
+    assert wire_format.negotiate({'wire': 'msgpack', 'wire_version': WIRE_SCHEMA_VERSION}) == WIRE_MSGPACK
+    assert wire_format.negotiate({'wire': 'msgpack', 'wire_version': WIRE_SCHEMA_VERSION + 1}) == WIRE_JSON
+    assert wire_format.negotiate(None) == WIRE_JSON
+    assert len(set(wire_format.KEY_MAP.values()) & set(wire_format.KEY_MAP)) == 0
@@ -1,11 +1,24 @@
 import { io, Socket } from 'socket.io-client'
 import { useUserStore } from '~/stores/user'
 import { useChannelStore } from '~/stores/channel'
+import { decodePayload, WIRE_FORMAT, WIRE_SCHEMA_VERSION } from '~/utils/wireFormat'
 
 // 創建全局響應式socket引用
 const socket = ref<Socket | null>(null)
 const isSocketConnected = ref(false)
 
+// 線上使用者列表（以 user_id 為鍵），由 presence_snapshot / presence_delta 維護
+interface OnlineUser {
+  user_id: number
+  username: string
+  display_name: string
+  connected_at: string
+}
+const onlineUsers = ref<Map<number, OnlineUser>>(new Map())
+let presenceSeq = -1
+// 是否曾經連線過：重新連線時以各頻道最後收到的訊息序號要求補送
+let hasConnected = false
+
 export const useSocket = () => {
   const config = useRuntimeConfig()
   const userStore = useUserStore()
@@ -28,20 +41,36 @@ export const useSocket = () => {
       transports: ['websocket', 'polling'],
       autoConnect: true,
       withCredentials: true,
-      auth: {
-        token: userStore.accessToken
-      }
+      // 每次（重新）連線時取用目前的 token，access token 換發後重新連線不會被拒絕
+      auth: (cb) => cb({
+        token: userStore.accessToken,
+        // 選用精簡二進位格式；伺服器不支援時仍以 JSON 傳送，decodePayload 兩種都能處理
+        ...(config.public.socketWireFormat === WIRE_FORMAT
+          ? { wire: WIRE_FORMAT, wire_version: WIRE_SCHEMA_VERSION }
+          : {})
+      })
     })
 
     // 連接事件
     socket.value.on('connect', () => {
       console.log('Socket已連接:', socket.value?.id)
       isSocketConnected.value = true
+      // 伺服器連線時只加入有成員紀錄的頻道；正在瀏覽的公開頻道需要重新加入房間，
+      // 先於 resume 送出，補送之後的新訊息才會即時收到
+      if (channelStore.currentChannelId) {
+        socket.value?.emit('join_channel', { channel_id: channelStore.currentChannelId })
+      }
+      if (hasConnected) {
+        resumeChannels()
+      }
+      hasConnected = true
     })
 
     socket.value.on('disconnect', (reason) => {
       console.log('Socket已斷線:', reason)
       isSocketConnected.value = false
+      // 重新連線時會收到新的快照
+      presenceSeq = -1
     })
 
     socket.value.on('connect_error', (error) => {
@@ -57,33 +86,83 @@ export const useSocket = () => {
     })
 
     // 訊息事件
-    socket.value.on('new_message', (messageData) => {
+    socket.value.on('new_message', (payload) => {
+      const messageData = decodePayload(payload)
       console.log('收到新訊息:', messageData)
       channelStore.addMessageToChannel(messageData.channel_id, messageData)
     })
 
-    socket.value.on('message_deleted', (data) => {
+    // 繁忙頻道由伺服器合併廣播的多則訊息（依序號排列）
+    socket.value.on('new_messages', (payload) => {
+      const data = decodePayload<{ channel_id: number, messages: any[] }>(payload)
+      data.messages.forEach((message) => channelStore.addMessageToChannel(data.channel_id, message))
+    })
+
+    // 重新連線後補送的訊息；complete 為 false 時缺口太大，改為重新載入頻道訊息
+    socket.value.on('resume_messages', (payload) => {
+      const data = decodePayload<{ channel_id: number, messages: any[], complete: boolean }>(payload)
+      console.log('補送訊息:', data.channel_id, data.messages.length, '則')
+      if (!data.complete) {
+        channelStore.fetchChannelMessages(data.channel_id)
+        return
+      }
+      data.messages.forEach((message) => channelStore.addMessageToChannel(data.channel_id, message))
+    })
+
+    socket.value.on('message_deleted', (payload) => {
+      const data = decodePayload(payload)
       console.log('訊息已刪除:', data.message_id)
       channelStore.removeMessageFromChannel(data.channel_id, data.message_id)
     })
 
     // 使用者事件
-    socket.value.on('user_joined', (data) => {
+    socket.value.on('user_joined', (payload) => {
+      const data = decodePayload(payload)
       console.log('使用者加入:', data.display_name)
       // 可以在這裡添加系統通知邏輯
     })
 
-    socket.value.on('user_left', (data) => {
+    socket.value.on('user_left', (payload) => {
+      const data = decodePayload(payload)
       console.log('使用者離開:', data.display_name)
       // 可以在這裡添加系統通知邏輯
     })
 
-    socket.value.on('online_users', (users) => {
+    socket.value.on('online_users', (payload) => {
+      const users = decodePayload<OnlineUser[]>(payload)
       console.log('更新線上使用者:', users.length, '人')
-      // 可以更新線上使用者列表
+      onlineUsers.value = new Map(users.map((u) => [u.user_id, u]))
+    })
+
+    // 線上列表版本化快照
+    socket.value.on('presence_snapshot', (payload) => {
+      const data = decodePayload<{ seq: number, users: OnlineUser[] }>(payload)
+      presenceSeq = data.seq
+      onlineUsers.value = new Map(data.users.map((u) => [u.user_id, u]))
     })
 
-    socket.value.on('user_typing', (data) => {
+    // 線上列表增量：序號不連續時重新要求快照
+    socket.value.on('presence_delta', (payload) => {
+      const delta = decodePayload<{ seq: number, joined: OnlineUser[], left: number[] }>(payload)
+      if (presenceSeq < 0 || delta.seq <= presenceSeq) {
+        return
+      }
+      if (delta.seq !== presenceSeq + 1) {
+        console.warn('線上列表序號缺口，重新取得快照:', presenceSeq, '->', delta.seq)
+        // 快照回來前忽略後續增量，避免重複要求
+        presenceSeq = -1
+        socket.value?.emit('get_presence_snapshot')
+        return
+      }
+      const users = new Map(onlineUsers.value)
+      delta.left.forEach((userId) => users.delete(userId))
+      delta.joined.forEach((u) => users.set(u.user_id, u))
+      onlineUsers.value = users
+      presenceSeq = delta.seq
+    })
+
+    socket.value.on('user_typing', (payload) => {
+      const data = decodePayload(payload)
       console.log('使用者輸入狀態:', data.display_name, data.is_typing)
       // 可以在這裡添加輸入狀態邏輯
     })
@@ -97,12 +176,27 @@ export const useSocket = () => {
     return socket.value
   }
 
+  // 以各頻道已收到的最大序號要求伺服器補送斷線期間的訊息
+  const resumeChannels = () => {
+    const channels: Record<number, number> = {}
+    Object.entries(channelStore.channelMessages).forEach(([channelId, messages]) => {
+      const lastSeq = messages.reduce((max, m) => Math.max(max, m.seq ?? 0), 0)
+      if (lastSeq > 0) {
+        channels[Number(channelId)] = lastSeq
+      }
+    })
+    if (Object.keys(channels).length > 0) {
+      socket.value?.emit('resume', { channels })
+    }
+  }
+
   const disconnect = () => {
     if (socket.value) {
       console.log('正在斷開Socket連接...')
       socket.value.disconnect()
       socket.value = null
       isSocketConnected.value = false
+      hasConnected = false
     }
   }
 
@@ -134,7 +228,10 @@ export const useSocket = () => {
       return
     }
 
-    socket.value.emit('typing', { is_typing: isTyping })
+    socket.value.emit('typing', {
+      is_typing: isTyping,
+      channel_id: channelStore.currentChannelId
+    })
   }
 
   const joinRoom = (room: string = 'general') => {
@@ -176,6 +273,7 @@ export const useSocket = () => {
     getOnlineUsers,
     isConnected,
     isSocketConnected,
+    onlineUsers,
     socket
   }
 }
\ No newline at end of file
@@ -75,6 +75,8 @@ export default defineNuxtConfig({
   runtimeConfig: {
     public: {
       apiBase: process.env.API_BASE || "http://localhost:8080",
+      // Socket.IO 傳輸格式：'json' 或 'msgpack'（精簡二進位格式，需後端安裝 msgpack）
+      socketWireFormat: process.env.SOCKET_WIRE_FORMAT || "json",
     },
   },
 });
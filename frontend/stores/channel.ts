@@ -29,6 +29,7 @@ interface ChannelMessage {
   message_type: string;
   channel_id: number;
   created_on: string;
+  seq?: number | null;
 }
 
 interface ChannelMember {
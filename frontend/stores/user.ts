@@ -32,9 +32,21 @@ interface LoginCredentials {
 
 interface LoginResponse {
   access_token?: string;
+  refresh_token?: string;
+  expires_in?: number;
   message?: string;
 }
 
+// access token 到期前多久換發（秒）
+const REFRESH_MARGIN = 60;
+let refreshTimer: ReturnType<typeof setTimeout> | null = null;
+
+function tokenExpiry(token: string): number | null {
+  const payload = token.split(".")[1];
+  if (!payload) return null;
+  return JSON.parse(atob(payload)).exp ?? null;
+}
+
 interface RegisterResponse {
   success?: boolean;
   user?: User;
@@ -59,6 +71,7 @@ export const useUserStore = defineStore("user", {
     currentUser: null as User | null,
     userProfile: null as UserProfile | null,
     accessToken: null as string | null,
+    refreshToken: null as string | null,
     isAuthenticated: false,
     loading: false,
     error: null as string | null,
@@ -101,14 +114,9 @@ export const useUserStore = defineStore("user", {
         );
 
         if (response.access_token) {
-          this.accessToken = response.access_token;
+          this.setTokens(response);
           this.isAuthenticated = true;
 
-          // 儲存到localStorage
-          if (import.meta.client) {
-            localStorage.setItem("access_token", response.access_token);
-          }
-
           // 獲取使用者資料
           await this.fetchUserProfile();
 
@@ -124,6 +132,63 @@ export const useUserStore = defineStore("user", {
       }
     },
 
+    setTokens(response: LoginResponse) {
+      this.accessToken = response.access_token ?? null;
+      this.refreshToken = response.refresh_token ?? null;
+
+      // 儲存到localStorage
+      if (import.meta.client) {
+        localStorage.setItem("access_token", this.accessToken ?? "");
+        if (this.refreshToken) {
+          localStorage.setItem("refresh_token", this.refreshToken);
+        }
+        this.scheduleRefresh();
+      }
+    },
+
+    // access token 到期前以 refresh token 換發
+    scheduleRefresh() {
+      if (refreshTimer) clearTimeout(refreshTimer);
+      refreshTimer = null;
+      if (!this.accessToken || !this.refreshToken) return;
+
+      const exp = tokenExpiry(this.accessToken);
+      if (!exp) return;
+      const delay = Math.max(0, exp - REFRESH_MARGIN - Date.now() / 1000);
+      refreshTimer = setTimeout(() => this.refreshAccessToken(), delay * 1000);
+    },
+
+    async refreshAccessToken() {
+      if (!this.refreshToken) return false;
+
+      try {
+        const config = useRuntimeConfig();
+
+        const response = await $fetch<LoginResponse>(
+          `${config.public.apiBase}/api/v1/auth/refresh`,
+          {
+            method: "POST",
+            headers: {
+              "Content-Type": "application/json",
+            },
+            body: { refresh_token: this.refreshToken },
+          }
+        );
+
+        if (!response.access_token) {
+          throw new Error("換發失敗");
+        }
+        this.setTokens(response);
+        return true;
+      } catch (error) {
+        // refresh token 已過期或已撤銷，需要重新登入
+        console.warn("Token換發失敗，請重新登入:", error);
+        this.refreshToken = null;
+        await this.logout();
+        return false;
+      }
+    },
+
     async register(userData: {
       username: string;
       first_name: string;
@@ -189,15 +254,30 @@ export const useUserStore = defineStore("user", {
       const { disconnect } = useSocket();
       disconnect();
 
+      if (refreshTimer) clearTimeout(refreshTimer);
+      refreshTimer = null;
+
+      // 通知後端撤銷此 token 與 refresh token（失敗不影響登出）
+      if (this.accessToken) {
+        const config = useRuntimeConfig();
+        await $fetch(`${config.public.apiBase}/api/v1/auth/logout`, {
+          method: "POST",
+          headers: { Authorization: `Bearer ${this.accessToken}` },
+          body: this.refreshToken ? { refresh_token: this.refreshToken } : {},
+        }).catch(() => {});
+      }
+
       this.currentUser = null;
       this.userProfile = null;
       this.accessToken = null;
+      this.refreshToken = null;
       this.isAuthenticated = false;
       this.error = null;
 
       // 清除localStorage
       if (import.meta.client) {
         localStorage.removeItem("access_token");
+        localStorage.removeItem("refresh_token");
       }
 
       // 導向登出頁面
@@ -293,6 +373,7 @@ export const useUserStore = defineStore("user", {
     initAuth() {
       if (import.meta.client) {
         const token = localStorage.getItem("access_token");
+        const refreshToken = localStorage.getItem("refresh_token");
         if (token) {
           // 檢查token是否過期
           try {
@@ -307,8 +388,17 @@ export const useUserStore = defineStore("user", {
             if (payload.exp && payload.exp > currentTime) {
               // Token未過期
               this.accessToken = token;
+              this.refreshToken = refreshToken;
               this.isAuthenticated = true;
+              this.scheduleRefresh();
               this.fetchUserProfile();
+            } else if (refreshToken) {
+              // Access token已過期，以 refresh token 換發
+              this.refreshToken = refreshToken;
+              this.isAuthenticated = true;
+              this.refreshAccessToken().then((ok) => {
+                if (ok) this.fetchUserProfile();
+              });
             } else {
               // Token已過期，清除並導向登入
               console.warn("Token已過期，請重新登入");
@@ -0,0 +1,149 @@
+/**
+ * Socket.IO 精簡二進位格式（MessagePack + 短鍵名）
+ * 對應後端 app/wire_format.py，連線時以 auth 的 wire / wire_version 選用；
+ * 伺服器對選用的連線以 bytes 送出高頻事件，其他事件仍為 JSON
+ * 修改 KEY_MAP 時必須與後端同步並遞增 WIRE_SCHEMA_VERSION
+ */
+
+export const WIRE_FORMAT = 'msgpack'
+export const WIRE_SCHEMA_VERSION = 1
+
+// 欄位名稱 -> 短鍵名（與後端 KEY_MAP 相同）
+const KEY_MAP: Record<string, string> = {
+  id: 'i',
+  content: 'c',
+  sender_id: 's',
+  sender_name: 'n',
+  created_on: 't',
+  channel_id: 'h',
+  seq: 'q',
+  message_id: 'm',
+  message_type: 'mt',
+  user_id: 'u',
+  username: 'un',
+  display_name: 'd',
+  connected_at: 'a',
+  is_typing: 'y',
+  users: 'us',
+  joined: 'j',
+  left: 'l',
+  worker: 'w',
+  messages: 'ms',
+  complete: 'k',
+  message: 'g'
+}
+const REVERSE_KEY_MAP: Record<string, string> = Object.fromEntries(
+  Object.entries(KEY_MAP).map(([key, short]) => [short, key])
+)
+
+const textDecoder = new TextDecoder()
+
+/**
+ * MessagePack 解碼（只實作伺服器會送出的型別：nil/bool/int/float/str/bin/array/map）
+ */
+export function decodeMsgpack(bytes: Uint8Array): unknown {
+  const view = new DataView(bytes.buffer, bytes.byteOffset, bytes.byteLength)
+  let offset = 0
+
+  const readStr = (length: number) => {
+    const value = textDecoder.decode(bytes.subarray(offset, offset + length))
+    offset += length
+    return value
+  }
+  const readBin = (length: number) => {
+    const value = bytes.slice(offset, offset + length)
+    offset += length
+    return value
+  }
+  const readArray = (length: number) => {
+    const value: unknown[] = []
+    for (let i = 0; i < length; i++) value.push(read())
+    return value
+  }
+  const readMap = (length: number) => {
+    const value: Record<string, unknown> = {}
+    for (let i = 0; i < length; i++) {
+      const key = String(read())
+      value[key] = read()
+    }
+    return value
+  }
+
+  const read = (): unknown => {
+    const type = view.getUint8(offset++)
+    if (type <= 0x7f) return type
+    if (type >= 0xe0) return type - 0x100
+    if (type >= 0x80 && type <= 0x8f) return readMap(type & 0x0f)
+    if (type >= 0x90 && type <= 0x9f) return readArray(type & 0x0f)
+    if (type >= 0xa0 && type <= 0xbf) return readStr(type & 0x1f)
+
+    let value: unknown
+    switch (type) {
+      case 0xc0: return null
+      case 0xc2: return false
+      case 0xc3: return true
+      case 0xca: value = view.getFloat32(offset); offset += 4; return value
+      case 0xcb: value = view.getFloat64(offset); offset += 8; return value
+      case 0xcc: value = view.getUint8(offset); offset += 1; return value
+      case 0xcd: value = view.getUint16(offset); offset += 2; return value
+      case 0xce: value = view.getUint32(offset); offset += 4; return value
+      case 0xcf: value = Number(view.getBigUint64(offset)); offset += 8; return value
+      case 0xd0: value = view.getInt8(offset); offset += 1; return value
+      case 0xd1: value = view.getInt16(offset); offset += 2; return value
+      case 0xd2: value = view.getInt32(offset); offset += 4; return value
+      case 0xd3: value = Number(view.getBigInt64(offset)); offset += 8; return value
+    }
+
+    // 長度前綴型別：先讀長度再讀內容
+    let length: number
+    switch (type) {
+      case 0xd9: case 0xdc: case 0xde: case 0xc4:
+        length = type === 0xdc || type === 0xde ? view.getUint16(offset) : view.getUint8(offset)
+        offset += type === 0xdc || type === 0xde ? 2 : 1
+        break
+      case 0xda: case 0xc5:
+        length = view.getUint16(offset); offset += 2
+        break
+      case 0xdb: case 0xc6: case 0xdd: case 0xdf:
+        length = view.getUint32(offset); offset += 4
+        break
+      default:
+        throw new Error(`不支援的 MessagePack 型別: 0x${type.toString(16)}`)
+    }
+    switch (type) {
+      case 0xd9: case 0xda: case 0xdb: return readStr(length)
+      case 0xc4: case 0xc5: case 0xc6: return readBin(length)
+      case 0xdc: case 0xdd: return readArray(length)
+      default: return readMap(length)
+    }
+  }
+
+  return read()
+}
+
+/** 遞迴將短鍵名還原為欄位名稱 */
+export function expandKeys(value: unknown): unknown {
+  if (Array.isArray(value)) {
+    return value.map(expandKeys)
+  }
+  if (value && typeof value === 'object' && !(value instanceof Uint8Array)) {
+    return Object.fromEntries(
+      Object.entries(value).map(([key, item]) => [REVERSE_KEY_MAP[key] ?? key, expandKeys(item)])
+    )
+  }
+  return value
+}
+
+/**
+ * 還原事件 payload：二進位格式解碼並還原鍵名，JSON 格式原樣回傳
+ * 事件處理函式一律先經過此函式，兩種格式的連線都能使用同一份處理邏輯
+ */
+export function decodePayload<T = any>(data: unknown): T {
+  if (data instanceof ArrayBuffer) {
+    return expandKeys(decodeMsgpack(new Uint8Array(data))) as T
+  }
+  if (ArrayBuffer.isView(data)) {
+    return expandKeys(decodeMsgpack(new Uint8Array(data.buffer, data.byteOffset, data.byteLength))) as T
+  }
+  return data as T
+}